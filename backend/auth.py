@@ -1,22 +1,22 @@
 from datetime import datetime, timedelta
+from functools import lru_cache
 from typing import Optional
-from jose import JWTError, jwt
-from passlib.context import CryptContext
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from sqlalchemy.orm import Session
 import database, models
-from authlib.integrations.starlette_client import OAuth
-from starlette.config import Config
-import httpx
 import uuid
 
 import os
 from dotenv import load_dotenv
 
-# Load environment variables
+# Load environment variables. This stays eager because other modules read
+# their settings from the environment at import time.
 load_dotenv()
 
+# jose, passlib, authlib and httpx are imported on first use: together they
+# account for most of the import time of this module
+
 # # Get SECRET_KEY from environment variable or use a default if not set
 # # In production, always use environment variable
 # SECRET_KEY = os.getenv("SECRET_KEY")
@@ -35,33 +35,44 @@ GOOGLE_CLIENT_ID = os.getenv("GOOGLE_CLIENT_ID")  # Get from environment variabl
 GOOGLE_CLIENT_SECRET = os.getenv("GOOGLE_CLIENT_SECRET")  # Get from environment variable
 GOOGLE_DISCOVERY_URL = "https://accounts.google.com/.well-known/openid-configuration"
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
-# Initialize OAuth
-config = Config()
-config.__setattr__("GOOGLE_CLIENT_ID", GOOGLE_CLIENT_ID)
-config.__setattr__("GOOGLE_CLIENT_SECRET", GOOGLE_CLIENT_SECRET)
-
-oauth = OAuth(config)
-oauth.register(
-    name="google",
-    server_metadata_url=GOOGLE_DISCOVERY_URL,
-    client_kwargs={
-        "scope": "openid email profile",
-        "redirect_uri": "http://localhost:5173",  # Update frontend URL (remove trailing slash)
-        "response_type": "code",
-        "grant_type": "authorization_code"
-    }
-)
+@lru_cache(maxsize=None)
+def get_pwd_context():
+    from passlib.context import CryptContext
+    return CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+@lru_cache(maxsize=None)
+def get_oauth():
+    """OAuth registry with the Google client, built on first use"""
+    from authlib.integrations.starlette_client import OAuth
+    from starlette.config import Config
+
+    config = Config()
+    config.__setattr__("GOOGLE_CLIENT_ID", GOOGLE_CLIENT_ID)
+    config.__setattr__("GOOGLE_CLIENT_SECRET", GOOGLE_CLIENT_SECRET)
+
+    oauth = OAuth(config)
+    oauth.register(
+        name="google",
+        server_metadata_url=GOOGLE_DISCOVERY_URL,
+        client_kwargs={
+            "scope": "openid email profile",
+            "redirect_uri": "http://localhost:5173",  # Update frontend URL (remove trailing slash)
+            "response_type": "code",
+            "grant_type": "authorization_code"
+        }
+    )
+    return oauth
 
 def verify_password(plain_password, hashed_password):
-    return pwd_context.verify(plain_password, hashed_password)
+    return get_pwd_context().verify(plain_password, hashed_password)
 
 def get_password_hash(password):
-    return pwd_context.hash(password)
+    return get_pwd_context().hash(password)
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
+    from jose import jwt
     to_encode = data.copy()
     if expires_delta:
         expire = datetime.utcnow() + expires_delta
@@ -71,18 +82,22 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
+def decode_user_id(token: str):
+    """User id from a valid access token, None if it is invalid or expired"""
+    from jose import JWTError, jwt
+    try:
+        return jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM]).get("sub")
+    except JWTError:
+        return None
+
 async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(database.get_db)):
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        user_id: str = payload.get("sub")
-        if user_id is None:
-            raise credentials_exception
-    except JWTError:
+    user_id = decode_user_id(token)
+    if user_id is None:
         raise credentials_exception
     
     user = db.query(models.User).filter(models.User.id == user_id).first()
@@ -92,6 +107,7 @@ async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = De
 
 async def verify_google_token(token: str, db: Session):
     """Verify Google ID token and return or create user"""
+    import httpx
     try:
         # Verify the token with Google
         async with httpx.AsyncClient() as client:
@@ -146,7 +162,7 @@ async def verify_google_token(token: str, db: Session):
                 expires_delta=timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
             )
             
-            return {"access_token": access_token, "token_type": "bearer", "role": user.role}
+            return {"access_token": access_token, "token_type": "bearer", "role": user.role, "user_id": user.id}
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -0,0 +1,92 @@
+"""Course listing serialization: ORM objects + jsonable_encoder vs typed rows + orjson
+
+Run from the backend directory:
+
+    python benchmarks/bench_serialization.py [courses] [repeats]
+
+Measures query-to-bytes time for GET /courses/ on a temporary SQLite
+database, using the route's own response field for the new path.
+"""
+import asyncio
+import os
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+# database.py opens ./lms.db relative to the working directory
+os.chdir(tempfile.mkdtemp(prefix="bench-serialization-"))
+
+from fastapi.encoders import jsonable_encoder  # noqa: E402
+from fastapi.responses import JSONResponse, ORJSONResponse  # noqa: E402
+from fastapi.routing import serialize_response  # noqa: E402
+
+import database, main, migrate, models, schemas  # noqa: E402
+
+
+def seed(n: int):
+    db = database.SessionLocal()
+    db.bulk_insert_mappings(models.Course, [
+        {
+            "id": str(uuid.uuid4()),
+            "title": f"Course {i}",
+            "description": "An introduction to the fundamentals, with weekly exercises and projects. " * 3,
+            "image_url": f"https://example.com/images/{i}.png",
+            "duration": "12 weeks",
+            "level": ("Beginner", "Intermediate", "Advanced")[i % 3],
+            "created_at": datetime.utcnow(),
+            "admin_id": "admin",
+        }
+        for i in range(n)
+    ])
+    db.commit()
+    db.close()
+
+
+def orm_path():
+    db = database.SessionLocal()
+    courses = db.query(models.Course).all()
+    body = JSONResponse(jsonable_encoder(courses)).body
+    db.close()
+    return body
+
+
+def typed_path(field):
+    db = database.SessionLocal()
+    content = schemas.from_rows(schemas.CourseResponse, db.query(*main.COURSE_COLUMNS).all())
+    body = ORJSONResponse(asyncio.run(serialize_response(field=field, response_content=content))).body
+    db.close()
+    return body
+
+
+def best_of(fn, repeats):
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        body = fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings), len(body)
+
+
+def run():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 10_000
+    repeats = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    migrate.migrate()
+    seed(n)
+
+    route = next(r for r in main.app.routes if getattr(r, "path", None) == "/courses/" and "GET" in r.methods)
+    field = route.secure_cloned_response_field or route.response_field
+
+    old, old_size = best_of(orm_path, repeats)
+    new, new_size = best_of(lambda: typed_path(field), repeats)
+    print(f"ORM + jsonable_encoder: {old * 1000:7.1f} ms  {n / old:10,.0f} courses/s  {old_size:,} bytes")
+    print(f"rows + pydantic/orjson: {new * 1000:7.1f} ms  {n / new:10,.0f} courses/s  {new_size:,} bytes")
+    print(f"speedup: {old / new:.1f}x")
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,95 @@
+"""Cold start: import time of main and time to the first served request
+
+Run from the backend directory:
+
+    python benchmarks/bench_startup.py [runs]
+
+Imports main under -X importtime and lists the slowest modules, then starts
+uvicorn against a fresh SQLite database and polls GET /courses/ until the
+first 200. Each run uses a new temporary directory.
+"""
+import os
+import re
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TOP_IMPORTS = 10
+
+
+def import_profile():
+    """(total seconds, [(cumulative seconds, module)]) for importing main"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import main"],
+        cwd=BACKEND_DIR,
+        env={**os.environ, "PYTHONPATH": BACKEND_DIR},
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    entries = []
+    for line in result.stderr.splitlines():
+        match = re.match(r"import time:\s+\d+ \|\s+(\d+) \|( *)(\S+)", line)
+        if match:
+            entries.append((len(match.group(2)) // 2, int(match.group(1)) / 1e6, match.group(3)))
+    # Children are reported before their parent: walk back from main to the
+    # previous top-level import, keeping the modules main imports directly
+    position = next(i for i, (depth, _, name) in enumerate(entries) if depth == 0 and name == "main")
+    children = []
+    for depth, seconds, name in reversed(entries[:position]):
+        if depth == 0:
+            break
+        if depth == 1:
+            children.append((seconds, name))
+    return entries[position][1], sorted(children, reverse=True)[:TOP_IMPORTS]
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def first_request():
+    """Seconds from spawning uvicorn to the first successful GET /courses/"""
+    port = free_port()
+    workdir = tempfile.mkdtemp(prefix="bench-startup-")
+    started = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=workdir,
+        env={**os.environ, "PYTHONPATH": BACKEND_DIR},
+    )
+    try:
+        while True:
+            try:
+                with urllib.request.urlopen(f"http://127.0.0.1:{port}/courses/", timeout=1) as response:
+                    if response.status == 200:
+                        return time.perf_counter() - started
+            except OSError:
+                if server.poll() is not None:
+                    raise RuntimeError("uvicorn exited before serving a request")
+                time.sleep(0.01)
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def run():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 3
+
+    total, slowest = import_profile()
+    print(f"import main: {total * 1000:7.1f} ms")
+    for seconds, name in slowest:
+        print(f"  {seconds * 1000:7.1f} ms  {name}")
+
+    timings = [first_request() for _ in range(runs)]
+    print(f"first request: {min(timings) * 1000:7.1f} ms best of {runs}")
+
+
+if __name__ == "__main__":
+    run()
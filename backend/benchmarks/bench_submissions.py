@@ -0,0 +1,96 @@
+"""Submission write throughput: per-request commit vs the group-commit log
+
+Run from the backend directory:
+
+    python benchmarks/bench_submissions.py [submissions] [concurrency]
+
+Each path writes into its own temporary SQLite database.
+"""
+import asyncio
+import os
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+# database.py opens ./lms.db relative to the working directory
+os.chdir(tempfile.mkdtemp(prefix="bench-submissions-"))
+
+import database, models, submission_log  # noqa: E402
+
+
+def submission(i: int):
+    return {
+        "id": str(uuid.uuid4()),
+        "assignment_id": f"assignment-{i % 10}",
+        "student_id": f"student-{i}",
+        "submitted_at": datetime.utcnow().isoformat(),
+        "content_ref": uuid.uuid4().hex,
+        "content_size": 1024,
+        "content_encoding": None,
+        "content_type": "text/plain; charset=utf-8",
+    }
+
+
+def reset():
+    models.Base.metadata.drop_all(bind=database.engine)
+    models.Base.metadata.create_all(bind=database.engine)
+
+
+def direct_path(n: int):
+    """What submit_assignment used to do: add, commit, refresh per request"""
+    reset()
+    db = database.SessionLocal()
+    start = time.perf_counter()
+    for i in range(n):
+        record = submission(i)
+        row = models.AssignmentSubmission(
+            **dict(record, submitted_at=datetime.fromisoformat(record["submitted_at"]))
+        )
+        db.add(row)
+        db.commit()
+        db.refresh(row)
+    elapsed = time.perf_counter() - start
+    db.close()
+    return elapsed, n
+
+
+async def group_commit_path(n: int, concurrency: int):
+    reset()
+    log = submission_log.SubmissionLog(directory=tempfile.mkdtemp(prefix="log-"))
+    await log.start()
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def submit(i):
+        async with semaphore:
+            await log.append(submission(i))
+
+    start = time.perf_counter()
+    await asyncio.gather(*(submit(i) for i in range(n)))
+    acknowledged = time.perf_counter() - start
+    await log.stop()
+    stored = time.perf_counter() - start
+    return acknowledged, stored, log.commits
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    concurrency = int(sys.argv[2]) if len(sys.argv) > 2 else 64
+
+    elapsed, commits = direct_path(n)
+    print(f"direct:       {n} submissions, {commits} commits in {elapsed:.2f}s "
+          f"-> {n / elapsed:,.0f} submissions/s, {commits / elapsed:,.0f} commits/s")
+
+    acknowledged, stored, commits = asyncio.run(group_commit_path(n, concurrency))
+    print(f"group commit: {n} submissions acknowledged in {acknowledged:.2f}s "
+          f"-> {n / acknowledged:,.0f} submissions/s")
+    print(f"              stored with {commits} DB commits in {stored:.2f}s "
+          f"-> {n / stored:,.0f} submissions/s")
+
+
+if __name__ == "__main__":
+    main()
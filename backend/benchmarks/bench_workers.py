@@ -0,0 +1,158 @@
+"""Read throughput from 1 to N worker processes
+
+Run from the backend directory:
+
+    python benchmarks/bench_workers.py [max_workers] [seconds] [clients]
+
+Seeds a temporary database with courses and a student's assignments,
+starts serve.py with 1, 2, 4, ... max_workers workers (default: the core
+count) and drives GET /courses/ and GET /assignments/student from
+`clients` keep-alive client processes. The clients share the machine with
+the server, so scaling flattens before the core count is reached.
+"""
+import http.client
+import multiprocessing
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime, timedelta
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+# database.py opens ./lms.db relative to the working directory
+WORKDIR = tempfile.mkdtemp(prefix="bench-workers-")
+os.chdir(WORKDIR)
+
+import auth, database, migrate, models  # noqa: E402
+
+COURSES = 200
+ASSIGNMENTS_PER_COURSE = 5
+ENROLLED = 20
+PATHS = ("/courses/", "/assignments/student")
+
+
+def seed():
+    migrate.migrate()
+    db = database.SessionLocal()
+    student_id = str(uuid.uuid4())
+    db.add(models.User(
+        id=student_id, email="student@example.com", password="", role=models.UserRole.STUDENT,
+        first_name="Bench", last_name="Student",
+    ))
+    course_ids = [str(uuid.uuid4()) for _ in range(COURSES)]
+    db.bulk_insert_mappings(models.Course, [
+        {"id": course_id, "title": f"Course {i}", "description": "Weekly exercises and projects. " * 4,
+         "level": "Beginner", "duration": "8 weeks", "created_at": datetime.utcnow(), "admin_id": "admin"}
+        for i, course_id in enumerate(course_ids)
+    ])
+    db.bulk_insert_mappings(models.Assignment, [
+        {"id": str(uuid.uuid4()), "course_id": course_id, "title": f"Assignment {j}",
+         "description": "Hand in a short report.", "total_points": 10,
+         "due_date": datetime.utcnow() + timedelta(days=j)}
+        for course_id in course_ids for j in range(ASSIGNMENTS_PER_COURSE)
+    ])
+    db.bulk_insert_mappings(models.Enrollment, [
+        {"id": str(uuid.uuid4()), "student_id": student_id, "course_id": course_id,
+         "enrolled_at": datetime.utcnow(), "progress": 0.0}
+        for course_id in course_ids[:ENROLLED]
+    ])
+    db.commit()
+    db.close()
+    database.engine.dispose()
+    return auth.create_access_token({"sub": student_id}, expires_delta=timedelta(hours=1))
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def client(port, token, path, deadline, counts):
+    conn = http.client.HTTPConnection("127.0.0.1", port)
+    headers = {"Authorization": f"Bearer {token}", "Accept-Encoding": "identity"}
+    done = 0
+    while time.time() < deadline:
+        conn.request("GET", path, headers=headers)
+        response = conn.getresponse()
+        response.read()
+        if response.status != 200:
+            raise RuntimeError(f"{path} returned {response.status}")
+        done += 1
+    conn.close()
+    counts.put(done)
+
+
+def wait_until_serving(port, server):
+    while True:
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=1):
+                return
+        except OSError:
+            if server.poll() is not None:
+                raise RuntimeError("serve.py exited before accepting connections")
+            time.sleep(0.05)
+
+
+def measure(workers, token, seconds, clients):
+    port = free_port()
+    server = subprocess.Popen(
+        [sys.executable, os.path.join(BACKEND_DIR, "serve.py"),
+         "--workers", str(workers), "--port", str(port), "--log-level", "warning"],
+        cwd=WORKDIR,
+    )
+    try:
+        wait_until_serving(port, server)
+        results = {}
+        for path in PATHS:
+            # Warm up every worker before measuring
+            warmup = multiprocessing.Queue()
+            client(port, token, path, time.time() + 0.5, warmup)
+
+            counts = multiprocessing.Queue()
+            deadline = time.time() + seconds
+            procs = [
+                multiprocessing.Process(target=client, args=(port, token, path, deadline, counts))
+                for _ in range(clients)
+            ]
+            for proc in procs:
+                proc.start()
+            for proc in procs:
+                proc.join()
+            results[path] = sum(counts.get() for _ in procs) / seconds
+        return results
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def run():
+    cores = os.cpu_count() or 1
+    max_workers = int(sys.argv[1]) if len(sys.argv) > 1 else cores
+    seconds = float(sys.argv[2]) if len(sys.argv) > 2 else 5.0
+    clients = int(sys.argv[3]) if len(sys.argv) > 3 else max(4, 2 * max_workers)
+    token = seed()
+
+    counts = [1]
+    while counts[-1] * 2 <= max_workers:
+        counts.append(counts[-1] * 2)
+    if counts[-1] != max_workers:
+        counts.append(max_workers)
+
+    print(f"{cores} cores, {clients} client processes, {seconds:.0f} s per run")
+    baseline = None
+    for workers in counts:
+        results = measure(workers, token, seconds, clients)
+        baseline = baseline or results
+        print(f"{workers:3d} workers  " + "  ".join(
+            f"{path} {rps:8,.0f} req/s ({rps / baseline[path]:.2f}x)" for path, rps in results.items()
+        ))
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,149 @@
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import defaultdict
+
+from starlette.concurrency import run_in_threadpool
+
+logger = logging.getLogger(__name__)
+
+# Worker identity, set by serve.py in each forked worker. A plain
+# `uvicorn main:app` is a cluster of one with index 0.
+WORKERS = 1
+WORKER_INDEX = 0
+
+NOTIFY_DB = os.getenv("NOTIFY_DB", "./notifications.db")
+NOTIFY_INTERVAL = float(os.getenv("NOTIFY_INTERVAL", "0.1"))
+NOTIFY_RETENTION_SECONDS = 60.0
+
+
+def set_worker(index: int, workers: int):
+    global WORKER_INDEX, WORKERS
+    WORKER_INDEX = index
+    WORKERS = workers
+
+
+def is_primary():
+    """True in exactly one worker, which runs the cluster-wide background jobs"""
+    return WORKER_INDEX == 0
+
+
+class Notifier:
+    """Cross-worker cache invalidation over a shared SQLite table
+
+    publish() only queues the message; a background loop writes the queue
+    in one transaction and reads messages from other workers every
+    interval, handing each subscriber the payloads for its channel as a
+    batch. Until start() is called publish() is a no-op, so single-process
+    deployments pay nothing for it.
+    """
+
+    def __init__(self, path: str = NOTIFY_DB, interval: float = NOTIFY_INTERVAL):
+        self.path = path
+        self.interval = interval
+        self.origin = None
+        self._handlers = defaultdict(list)
+        self._outbox = []
+        self._outbox_lock = threading.Lock()
+        self._local = threading.local()
+        self._last_id = 0
+        self._last_prune = 0.0
+        self._task = None
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=1.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def subscribe(self, channel: str, handler):
+        """handler receives the list of payloads published on channel by other workers"""
+        self._handlers[channel].append(handler)
+
+    def publish(self, channel: str, payload):
+        if self._task is None:
+            return
+        with self._outbox_lock:
+            self._outbox.append((channel, json.dumps(payload, separators=(",", ":"))))
+
+    def _open(self):
+        conn = self._connect()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS notifications ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, origin TEXT NOT NULL, "
+            "channel TEXT NOT NULL, payload TEXT NOT NULL, created REAL NOT NULL)"
+        )
+        # Only messages published from now on concern this worker
+        self._last_id = conn.execute("SELECT COALESCE(MAX(id), 0) FROM notifications").fetchone()[0]
+
+    def _exchange(self):
+        with self._outbox_lock:
+            outbox, self._outbox = self._outbox, []
+        conn = self._connect()
+        now = time.time()
+        if outbox:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.executemany(
+                    "INSERT INTO notifications (origin, channel, payload, created) VALUES (?, ?, ?, ?)",
+                    [(self.origin, channel, payload, now) for channel, payload in outbox],
+                )
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                with self._outbox_lock:
+                    self._outbox[:0] = outbox
+                raise
+        if now - self._last_prune > NOTIFY_RETENTION_SECONDS:
+            conn.execute("DELETE FROM notifications WHERE created < ?", (now - NOTIFY_RETENTION_SECONDS,))
+            self._last_prune = now
+
+        rows = conn.execute(
+            "SELECT id, origin, channel, payload FROM notifications WHERE id > ? ORDER BY id",
+            (self._last_id,),
+        ).fetchall()
+        if not rows:
+            return
+        self._last_id = rows[-1][0]
+
+        batches = defaultdict(list)
+        for _, origin, channel, payload in rows:
+            if origin != self.origin and channel in self._handlers:
+                batches[channel].append(json.loads(payload))
+        for channel, payloads in batches.items():
+            for handler in self._handlers[channel]:
+                try:
+                    handler(payloads)
+                except Exception:
+                    logger.exception("Notification handler for %s failed", channel)
+
+    async def _loop(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await run_in_threadpool(self._exchange)
+            except Exception:
+                logger.exception("Notification exchange failed")
+
+    async def start(self):
+        # The pid is only final after the fork
+        self.origin = f"{WORKER_INDEX}:{os.getpid()}"
+        await run_in_threadpool(self._open)
+        self._task = asyncio.create_task(self._loop())
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        self._task = None
+        await run_in_threadpool(self._exchange)
+
+
+notifier = Notifier()
@@ -0,0 +1,213 @@
+import gzip
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict, defaultdict
+
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import Headers, MutableHeaders
+
+# Brotli is in requirements.txt; an install without it only offers gzip
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSION_MINIMUM_SIZE = int(os.getenv("COMPRESSION_MINIMUM_SIZE", "1024"))
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+# Bodies above this are compressed in the threadpool instead of on the event loop
+OFFLOAD_SIZE = 256 * 1024
+CACHE_ENTRIES = 64
+
+COMPRESSIBLE_TYPES = ("text/", "application/json", "application/javascript", "application/xml")
+
+
+def accepted_encodings(accept_encoding: str):
+    """Parse an Accept-Encoding header into {coding: quality}"""
+    accepted = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        if name:
+            accepted[name.lower()] = quality
+    return accepted
+
+
+def accepts(accept_encoding: str, encoding: str):
+    """Whether the client accepts `encoding`, honouring q=0 and *"""
+    accepted = accepted_encodings(accept_encoding)
+    return accepted.get(encoding, accepted.get("*", 0.0)) > 0
+
+
+def negotiate(accept_encoding: str):
+    """Pick br or gzip from an Accept-Encoding header
+
+    The client's highest quality wins, q=0 refuses a coding, and br is
+    preferred between equals.
+    """
+    accepted = accepted_encodings(accept_encoding)
+    wildcard = accepted.get("*", 0.0)
+    offered = ("br", "gzip") if brotli is not None else ("gzip",)
+    # max() keeps the first of equals, so br wins ties
+    quality, encoding = max(((accepted.get(coding, wildcard), coding) for coding in offered), key=lambda item: item[0])
+    return encoding if quality > 0 else None
+
+
+def compress(body: bytes, encoding: str):
+    if encoding == "br":
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+
+
+class CompressionStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.routes = defaultdict(lambda: {
+            "responses": 0,
+            "compressed": 0,
+            "cache_hits": 0,
+            "bytes_in": 0,
+            "bytes_out": 0,
+            "cpu_ns": 0,
+        })
+
+    def record(self, route, bytes_in, bytes_out, cpu_ns=0, compressed=False, cache_hit=False):
+        with self._lock:
+            stats = self.routes[route]
+            stats["responses"] += 1
+            stats["compressed"] += compressed
+            stats["cache_hits"] += cache_hit
+            stats["bytes_in"] += bytes_in
+            stats["bytes_out"] += bytes_out
+            stats["cpu_ns"] += cpu_ns
+
+    def report(self):
+        with self._lock:
+            report = []
+            for route, s in sorted(self.routes.items()):
+                misses = s["compressed"] - s["cache_hits"]
+                report.append({
+                    "route": route,
+                    "responses": s["responses"],
+                    "compressed": s["compressed"],
+                    "cache_hits": s["cache_hits"],
+                    "bytes_in": s["bytes_in"],
+                    "bytes_out": s["bytes_out"],
+                    "bytes_saved": s["bytes_in"] - s["bytes_out"],
+                    "ratio": round(s["bytes_out"] / s["bytes_in"], 4) if s["bytes_in"] else 1.0,
+                    "cpu_ms": round(s["cpu_ns"] / 1e6, 3),
+                    "cpu_us_per_compression": round(s["cpu_ns"] / 1e3 / misses, 1) if misses else 0.0,
+                })
+            return report
+
+
+stats = CompressionStats()
+
+
+class CompressionMiddleware:
+    """Compress complete response bodies with br or gzip
+
+    Streaming responses, bodies below minimum_size, non-text content and
+    responses that already carry a Content-Encoding are passed through.
+    For GET routes in cacheable_paths the compressed bytes are kept in a
+    small LRU keyed by a digest of the body, so an unchanged payload such
+    as the course catalog is only compressed once per encoding.
+    """
+
+    def __init__(self, app, minimum_size: int = COMPRESSION_MINIMUM_SIZE, cacheable_paths=()):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.cacheable_paths = set(cacheable_paths)
+        self._cache = OrderedDict()
+        self._cache_lock = threading.Lock()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = negotiate(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start_message = None
+        passthrough = False
+
+        async def send_wrapper(message):
+            nonlocal start_message, passthrough
+            if message["type"] == "http.response.start":
+                start_message = message
+                return
+            if passthrough or message["type"] != "http.response.body":
+                await send(message)
+                return
+
+            headers = MutableHeaders(scope=start_message)
+            body = message.get("body", b"")
+            if (
+                message.get("more_body", False)
+                or "content-encoding" in headers
+                or not headers.get("content-type", "").startswith(COMPRESSIBLE_TYPES)
+            ):
+                passthrough = True
+                await send(start_message)
+                await send(message)
+                return
+
+            headers.add_vary_header("Accept-Encoding")
+            route = self._route(scope)
+            if len(body) < self.minimum_size:
+                stats.record(route, len(body), len(body))
+                await send(start_message)
+                await send(message)
+                return
+
+            compressed, cpu_ns, cache_hit = await self._compress(scope, route, body, encoding)
+            stats.record(route, len(body), len(compressed), cpu_ns, compressed=True, cache_hit=cache_hit)
+            headers["Content-Encoding"] = encoding
+            headers["Content-Length"] = str(len(compressed))
+            await send(start_message)
+            await send({"type": "http.response.body", "body": compressed})
+
+        await self.app(scope, receive, send_wrapper)
+
+    def _route(self, scope):
+        route = scope.get("route")
+        return getattr(route, "path", None) or "<unmatched>"
+
+    async def _compress(self, scope, route, body, encoding):
+        cache_key = None
+        if scope["method"] == "GET" and route in self.cacheable_paths:
+            cache_key = (route, encoding, hashlib.blake2b(body, digest_size=16).digest())
+            with self._cache_lock:
+                cached = self._cache.get(cache_key)
+                if cached is not None:
+                    self._cache.move_to_end(cache_key)
+                    return cached, 0, True
+
+        if len(body) > OFFLOAD_SIZE:
+            compressed, cpu_ns = await run_in_threadpool(self._timed_compress, body, encoding)
+        else:
+            compressed, cpu_ns = self._timed_compress(body, encoding)
+
+        if cache_key is not None:
+            with self._cache_lock:
+                self._cache[cache_key] = compressed
+                if len(self._cache) > CACHE_ENTRIES:
+                    self._cache.popitem(last=False)
+        return compressed, cpu_ns, False
+
+    @staticmethod
+    def _timed_compress(body, encoding):
+        started = time.thread_time_ns()
+        compressed = compress(body, encoding)
+        return compressed, time.thread_time_ns() - started
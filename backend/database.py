@@ -1,20 +1,128 @@
-from sqlalchemy import create_engine
+import hashlib
+import os
+import time
+from functools import lru_cache
+
+from fastapi import Request
+from sqlalchemy import create_engine, event, inspect, text
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 
 SQLALCHEMY_DATABASE_URL = "sqlite:///./lms.db"
 
+# Read-only engine for GET handlers: a replica, or by default a second
+# connection pool opening the primary SQLite file in read-only mode
+SQLALCHEMY_READ_DATABASE_URL = os.getenv(
+    "SQLALCHEMY_READ_DATABASE_URL", "sqlite:///file:./lms.db?mode=ro&uri=true"
+)
+
+# After a client writes, its reads go to the primary for this long so it
+# never sees a replica that hasn't caught up with its own write
+READ_YOUR_WRITES_SECONDS = float(os.getenv("READ_YOUR_WRITES_SECONDS", "5"))
+
+READ_METHODS = {"GET", "HEAD"}
+
 engine = create_engine(
     SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}
 )
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+read_engine = create_engine(
+    SQLALCHEMY_READ_DATABASE_URL, connect_args={"check_same_thread": False}
+)
+ReadSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=read_engine)
+
 Base = declarative_base()
 
-# Dependency to get DB session
-def get_db():
+# Last commit time per client, for the read-your-writes window
+_last_write = {}
+_MAX_TRACKED_CLIENTS = 100_000
+
+# Set by share_writes when other worker processes must hear about writes
+_notifier = None
+
+def client_key(user_id: str):
+    return _hash(f"user:{user_id}")
+
+def _hash(identity: str):
+    # Hashed so addresses are not kept around or shared with other workers
+    return hashlib.blake2b(identity.encode(), digest_size=16).hexdigest()
+
+@lru_cache(maxsize=4096)
+def _token_user(token: str):
+    import auth
+    return auth.decode_user_id(token)
+
+def _client_key(request: Request):
+    # Keyed by user rather than by token or address, so a write made before
+    # logging in, or with an earlier token, still counts for later requests
+    scheme, _, token = request.headers.get("authorization", "").partition(" ")
+    user_id = _token_user(token) if scheme.lower() == "bearer" and token else None
+    if user_id is not None:
+        return client_key(user_id)
+    return _hash(f"ip:{request.client.host if request.client else ''}")
+
+@event.listens_for(SessionLocal, "after_commit")
+def _record_write(session):
+    key = session.info.get("client_key")
+    if key is not None:
+        note_write(key)
+
+def note_write(key: str):
+    """Open the read-your-writes window for a client, in every worker"""
+    mark_written(key)
+    if _notifier is not None:
+        _notifier.publish("client_write", key)
+
+def mark_written(key: str):
+    now = time.monotonic()
+    if len(_last_write) >= _MAX_TRACKED_CLIENTS:
+        for stale in [k for k, t in _last_write.items() if now - t > READ_YOUR_WRITES_SECONDS]:
+            del _last_write[stale]
+    _last_write[key] = now
+
+def share_writes(notifier):
+    """Extend the read-your-writes window to every worker process"""
+    global _notifier
+
+    def receive(keys):
+        for key in keys:
+            mark_written(key)
+
+    _notifier = notifier
+    notifier.subscribe("client_write", receive)
+
+def _recently_wrote(key: str):
+    written = _last_write.get(key)
+    return written is not None and time.monotonic() - written < READ_YOUR_WRITES_SECONDS
+
+# Dependency to get DB session: read-only for GET requests, primary otherwise
+def get_db(request: Request):
+    key = _client_key(request)
+    if request.method in READ_METHODS and not _recently_wrote(key):
+        db = ReadSessionLocal()
+    else:
+        db = SessionLocal()
+        db.info["client_key"] = key
+    try:
+        yield db
+    finally:
+        db.close()
+
+# Dependency for GET handlers that also write
+def get_write_db(request: Request):
     db = SessionLocal()
+    db.info["client_key"] = _client_key(request)
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+def add_missing_columns(table):
+    """Add columns declared on the model but missing from an existing table"""
+    existing = {column["name"] for column in inspect(engine).get_columns(table.name)}
+    with engine.begin() as conn:
+        for column in table.columns:
+            if column.name not in existing:
+                column_type = column.type.compile(dialect=engine.dialect)
+                conn.execute(text(f'ALTER TABLE {table.name} ADD COLUMN "{column.name}" {column_type}'))
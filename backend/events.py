@@ -0,0 +1,223 @@
+"""Append-only event stream for analytics
+
+Write handlers emit structured events, which are buffered in memory and
+appended to rotating JSONL segments by a background writer, so emitting
+costs a dict and a list append on the request path. Events still in the
+buffer when the process dies are lost; the stream is for analytics, not
+the record of truth.
+
+Each worker writes its own segments. Consumers read all of them merged by
+timestamp and resume from a saved cursor:
+
+    python events.py --consumer funnel --type enrollment.created
+"""
+import argparse
+import asyncio
+import heapq
+import json
+import logging
+import os
+import sys
+import threading
+from datetime import datetime
+
+from starlette.concurrency import run_in_threadpool
+
+logger = logging.getLogger(__name__)
+
+EVENT_LOG_DIR = os.getenv("EVENT_LOG_DIR", "./event_log")
+EVENT_SEGMENT_BYTES = int(os.getenv("EVENT_SEGMENT_BYTES", str(64 * 1024 * 1024)))
+EVENT_FLUSH_INTERVAL = float(os.getenv("EVENT_FLUSH_INTERVAL", "0.5"))
+MAX_BUFFERED_EVENTS = 100_000
+
+CURSOR_DIR = "cursors"
+
+
+def _segment_name(number: int):
+    return f"events-{number:08d}.jsonl"
+
+
+def _segment_numbers(directory: str):
+    if not os.path.isdir(directory):
+        return []
+    return sorted(
+        int(name[len("events-"):-len(".jsonl")])
+        for name in os.listdir(directory)
+        if name.startswith("events-") and name.endswith(".jsonl")
+    )
+
+
+class EventLog:
+    def __init__(self, directory=EVENT_LOG_DIR, segment_bytes=EVENT_SEGMENT_BYTES,
+                 flush_interval=EVENT_FLUSH_INTERVAL):
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.flush_interval = flush_interval
+        self.dropped = 0
+        self._buffer = []
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._file = None
+        self._segment = 0
+        self._task = None
+
+    def emit(self, type: str, **fields):
+        event = {"ts": datetime.utcnow().isoformat(), "type": type, **fields}
+        with self._lock:
+            if len(self._buffer) >= MAX_BUFFERED_EVENTS:
+                self.dropped += 1
+                return
+            self._buffer.append(event)
+
+    def _open_segment(self, number: int):
+        if self._file:
+            self._file.close()
+        self._segment = number
+        self._file = open(os.path.join(self.directory, _segment_name(number)), "ab")
+
+    def open(self):
+        """Start a new segment; segments from earlier runs are never appended to"""
+        os.makedirs(self.directory, exist_ok=True)
+        self._open_segment(max(_segment_numbers(self.directory), default=-1) + 1)
+
+    def write(self):
+        """Append buffered events to the current segment"""
+        with self._write_lock:
+            with self._lock:
+                batch, self._buffer = self._buffer, []
+            if not batch or self._file is None:
+                return 0
+            if self._file.tell() >= self.segment_bytes:
+                self._open_segment(self._segment + 1)
+            self._file.write(b"".join(
+                (json.dumps(event, separators=(",", ":"), default=str) + "\n").encode("utf-8")
+                for event in batch
+            ))
+            self._file.flush()
+            return len(batch)
+
+    async def _write_loop(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await run_in_threadpool(self.write)
+            except Exception:
+                logger.exception("Event log write failed")
+
+    async def start(self):
+        await run_in_threadpool(self.open)
+        self._task = asyncio.create_task(self._write_loop())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            self._task = None
+        await run_in_threadpool(self.close)
+
+    def close(self):
+        self.write()
+        if self._file:
+            self._file.close()
+            self._file = None
+
+
+log = EventLog()
+
+
+# Consuming
+
+def segment_paths(directory: str = EVENT_LOG_DIR):
+    """Segments grouped per writer: the directory itself and each worker-N below it"""
+    writers = [directory]
+    if os.path.isdir(directory):
+        writers += [
+            os.path.join(directory, name) for name in sorted(os.listdir(directory))
+            if name.startswith("worker-")
+        ]
+    return {
+        os.path.relpath(writer, directory): [
+            os.path.join(writer, _segment_name(number)) for number in _segment_numbers(writer)
+        ]
+        for writer in writers
+    }
+
+
+class Consumer:
+    """Replays the event stream, resuming from a named cursor
+
+    events() yields every complete event after the cursor, ordered by
+    timestamp across workers. commit() saves the position of the last
+    event yielded, so a consumer that stops part-way resumes there.
+    Without a name the stream is replayed from the start and nothing is
+    saved.
+    """
+
+    def __init__(self, name: str = None, directory: str = EVENT_LOG_DIR):
+        self.name = name
+        self.directory = directory
+        self.positions = self._load()
+
+    def _cursor_path(self):
+        return os.path.join(self.directory, CURSOR_DIR, f"{self.name}.json")
+
+    def _load(self):
+        if self.name is None:
+            return {}
+        try:
+            with open(self._cursor_path()) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+
+    def commit(self):
+        if self.name is None:
+            return
+        path = self._cursor_path()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path + ".tmp", "w") as f:
+            json.dump(self.positions, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(path + ".tmp", path)
+
+    def _read_writer(self, paths):
+        for path in paths:
+            key = os.path.relpath(path, self.directory)
+            offset = self.positions.get(key, 0)
+            with open(path, "rb") as f:
+                f.seek(offset)
+                data = f.read()
+            # The active segment may end in a partly written line
+            for line in data[:data.rfind(b"\n") + 1].splitlines(keepends=True):
+                offset += len(line)
+                event = json.loads(line)
+                yield event["ts"], key, offset, event
+
+    def events(self, types=None):
+        streams = [self._read_writer(paths) for paths in segment_paths(self.directory).values()]
+        for _, key, offset, event in heapq.merge(*streams, key=lambda item: item[0]):
+            self.positions[key] = offset
+            if types is None or event["type"] in types:
+                yield event
+
+
+def replay(directory: str = EVENT_LOG_DIR, types=None):
+    """Every event in the stream from the beginning"""
+    return Consumer(directory=directory).events(types)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Print events as JSONL")
+    parser.add_argument("--directory", default=EVENT_LOG_DIR)
+    parser.add_argument("--consumer", help="resume from and advance this named cursor")
+    parser.add_argument("--type", action="append", dest="types", help="only events of this type")
+    args = parser.parse_args()
+
+    consumer = Consumer(args.consumer, args.directory)
+    for event in consumer.events(set(args.types) if args.types else None):
+        sys.stdout.write(json.dumps(event, separators=(",", ":")) + "\n")
+    consumer.commit()
+
+
+if __name__ == "__main__":
+    main()
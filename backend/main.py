@@ -1,65 +1,108 @@
-from fastapi import FastAPI, Depends, HTTPException, status
+from contextlib import asynccontextmanager
+from fastapi import APIRouter, FastAPI, Depends, HTTPException, status, BackgroundTasks, File, Form, Header, Request, UploadFile
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import Response, FileResponse, PlainTextResponse, StreamingResponse, ORJSONResponse
 from fastapi.security import OAuth2PasswordRequestForm
 # from fastapi.middleware.cors import CORSMiddleware
 from starlette.middleware.cors import CORSMiddleware
+from sqlalchemy import func
 from sqlalchemy.orm import Session
-import models, database, auth
-from typing import List
+import models, database, auth, recommendations, risk, schedule, storage, similarity, ratelimit, submission_log, schemas, compression, migrate, cluster, rollups, events, profiling
+import io
+import asyncio
+from typing import List, Union
 import uuid
 from datetime import datetime, timedelta
 
-# Create database tables
-models.Base.metadata.create_all(bind=database.engine)
+router = APIRouter(default_response_class=ORJSONResponse, route_class=profiling.TracedRoute)
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Schema creation runs here rather than at import, and before anything
+    # opens the read-only engine, which needs the database file to exist
+    if migrate.AUTO_CREATE_SCHEMA:
+        await run_in_threadpool(migrate.migrate)
+    await submission_log.log.start()
+    await events.log.start()
+    if cluster.WORKERS > 1:
+        cluster.notifier.subscribe("enrollment", recommendations.apply_enrollments)
+        cluster.notifier.subscribe("profiler", profiling.apply_runs)
+        database.share_writes(cluster.notifier)
+        await cluster.notifier.start()
+    tasks = []
+    if cluster.is_primary():
+        tasks.append(asyncio.create_task(risk.scoring_loop()))
+        tasks.append(asyncio.create_task(rollups.compaction_loop()))
+    # The index is loaded off the event loop; until it is ready
+    # /recommendations returns an empty list instead of holding up startup.
+    # Every worker keeps its own index; one of them persists it
+    primary = cluster.is_primary()
+    tasks.append(asyncio.create_task(run_in_threadpool(recommendations.build_index, primary)))
+    tasks.append(asyncio.create_task(recommendations.rebuild_loop(primary)))
+    try:
+        yield
+    finally:
+        for task in tasks:
+            task.cancel()
+        await cluster.notifier.stop()
+        await submission_log.log.stop()
+        await events.log.stop()
 
-# Configure CORS
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["e-mentoring.com", "a-novel-personalized-learning-framework-w-vemu-project-b4a5aba8.vercel.app", "http://localhost:5173", "http://localhost:5175", "https://a-novel-personalized-learning-git-5db0d2-vemu-project-b4a5aba8.vercel.app", "a-novel-personalized-learning-git-5db0d2-vemu-project-b4a5aba8.vercel.app"],  # Frontend URL
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-    expose_headers=["*"],
+# Admission control for the bcrypt and write-heavy endpoints
+def login_username(request: Request, form_data: OAuth2PasswordRequestForm = Depends()):
+    # Keyed on the client as well as the account, so guessing at someone
+    # else's password from one address cannot lock them out everywhere;
+    # the per-IP bucket is the main throttle
+    return f"{ratelimit.client_ip(request)}:{form_data.username.lower()}"
+
+login_admission = ratelimit.Admission(
+    "login",
+    per_ip=ratelimit.Rate(20, 60),
+    per_user=ratelimit.Rate(5, 60),
+    max_concurrent=8
+)
+registration_admission = ratelimit.Admission(
+    "register",
+    per_ip=ratelimit.Rate(5, 60),
+    max_concurrent=4
+)
+submission_admission = ratelimit.Admission(
+    "submit",
+    per_ip=ratelimit.Rate(120, 60),
+    per_user=ratelimit.Rate(10, 60),
+    max_concurrent=32
 )
 
 # Authentication endpoints
-@app.post("/token")
+@router.post("/token", response_model=schemas.TokenResponse, dependencies=[Depends(login_admission.dependency(login_username))])
 async def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(database.get_db)):
     user = db.query(models.User).filter(models.User.email == form_data.username).first()
     if not user or not auth.verify_password(form_data.password, user.password):
+        events.log.emit("auth.login", method="password", success=False, user_id=user.id if user else None)
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password",
             headers={"WWW-Authenticate": "Bearer"},
         )
     access_token = auth.create_access_token(data={"sub": user.id})
+    events.log.emit("auth.login", method="password", success=True, user_id=user.id)
     return {"access_token": access_token, "token_type": "bearer", "role": user.role}
 
-@app.post("/google-login")
+@router.post("/google-login", response_model=schemas.TokenResponse)
 async def google_login(token: str, db: Session = Depends(database.get_db)):
-    return await auth.verify_google_token(token, db)
+    try:
+        result = await auth.verify_google_token(token, db)
+    except HTTPException:
+        events.log.emit("auth.login", method="google", success=False, user_id=None)
+        raise
+    # Signing in may have created or linked the account
+    database.note_write(database.client_key(result["user_id"]))
+    events.log.emit("auth.login", method="google", success=True, user_id=result["user_id"])
+    return result
 
 # User management endpoints
-from pydantic import BaseModel
-
-class UserCreate(BaseModel):
-    email: str
-    password: str
-    role: models.UserRole
-    first_name: str
-    last_name: str
-
-class UserResponse(BaseModel):
-    id: str
-    email: str
-    role: models.UserRole
-    first_name: str
-    last_name: str
-    created_at: datetime
-
-@app.post("/users/", response_model=UserResponse)
-async def create_user(user: UserCreate, db: Session = Depends(database.get_db)):
+@router.post("/users/", response_model=schemas.UserResponse, dependencies=[Depends(registration_admission.dependency())])
+async def create_user(user: schemas.UserCreate, db: Session = Depends(database.get_db)):
     db_user = db.query(models.User).filter(models.User.email == user.email).first()
     if db_user:
         raise HTTPException(status_code=400, detail="Email already registered")
@@ -77,11 +120,13 @@ async def create_user(user: UserCreate, db: Session = Depends(database.get_db)):
         last_name=user.last_name
     )
     db.add(db_user)
+    # The registration was made without a token; count it for the new user
+    db.info["client_key"] = database.client_key(db_user.id)
     db.commit()
     db.refresh(db_user)
     return db_user
 
-@app.get("/users/me")
+@router.get("/users/me", response_model=schemas.UserResponse)
 async def get_current_user(current_user: str = Depends(auth.get_current_user), db: Session = Depends(database.get_db)):
     user = db.query(models.User).filter(models.User.id == current_user).first()
     if not user:
@@ -89,7 +134,18 @@ async def get_current_user(current_user: str = Depends(auth.get_current_user), d
     return user
 
 # Course management endpoints (Admin only)
-@app.post("/courses/")
+COURSE_COLUMNS = (
+    models.Course.id,
+    models.Course.title,
+    models.Course.description,
+    models.Course.image_url,
+    models.Course.duration,
+    models.Course.level,
+    models.Course.created_at,
+    models.Course.admin_id
+)
+
+@router.post("/courses/", response_model=schemas.CourseResponse)
 async def create_course(
     title: str,
     description: str,
@@ -115,24 +171,25 @@ async def create_course(
     db.add(course)
     db.commit()
     db.refresh(course)
+    events.log.emit("course.created", course_id=course.id, admin_id=current_user)
     return course
 
-@app.get("/courses/")
+@router.get("/courses/", response_model=List[schemas.CourseResponse])
 async def get_courses(db: Session = Depends(database.get_db)):
-    return db.query(models.Course).all()
+    return schemas.from_rows(schemas.CourseResponse, db.query(*COURSE_COLUMNS).all())
 
-@app.get("/courses/{course_id}")
+@router.get("/courses/{course_id}", response_model=schemas.CourseResponse)
 async def get_course(course_id: str, db: Session = Depends(database.get_db)):
     if not course_id or course_id == "undefined":
         raise HTTPException(status_code=400, detail="Course ID is required and cannot be undefined")
     if not isinstance(course_id, str) or not course_id.strip():
         raise HTTPException(status_code=400, detail="Invalid course ID format")
-    course = db.query(models.Course).filter(models.Course.id == course_id).first()
+    course = db.query(*COURSE_COLUMNS).filter(models.Course.id == course_id).first()
     if not course:
         raise HTTPException(status_code=404, detail="Course not found")
-    return course
+    return schemas.CourseResponse(**course._mapping)
 
-@app.get("/assignments/admin")
+@router.get("/assignments/admin", response_model=List[schemas.AdminAssignmentStats])
 async def get_admin_assignments(
     current_user: str = Depends(auth.get_current_user),
     db: Session = Depends(database.get_db)
@@ -141,35 +198,32 @@ async def get_admin_assignments(
     if user.role != models.UserRole.ADMIN:
         raise HTTPException(status_code=403, detail="Not authorized")
     
-    assignments = db.query(models.Assignment).all()
-    assignments_with_stats = []
+    # One grouped query instead of a submissions query per assignment
+    rows = db.query(
+        models.Assignment.id,
+        models.Assignment.title,
+        models.Assignment.description,
+        models.Assignment.due_date,
+        models.Assignment.total_points,
+        models.Assignment.course_id,
+        models.Course.title.label("course_title"),
+        func.count(models.AssignmentSubmission.id).label("total_submissions"),
+        func.count(models.AssignmentSubmission.grade).label("graded_submissions"),
+        func.coalesce(func.avg(models.AssignmentSubmission.grade), 0).label("average_grade")
+    ).join(
+        models.Course, models.Course.id == models.Assignment.course_id
+    ).outerjoin(
+        models.AssignmentSubmission, models.AssignmentSubmission.assignment_id == models.Assignment.id
+    ).group_by(models.Assignment.id).all()
     
-    for assignment in assignments:
-        submissions = db.query(models.AssignmentSubmission).filter(
-            models.AssignmentSubmission.assignment_id == assignment.id
-        ).all()
-        
-        total_submissions = len(submissions)
-        graded_submissions = len([s for s in submissions if s.grade is not None])
-        average_grade = sum([s.grade for s in submissions if s.grade is not None]) / graded_submissions if graded_submissions > 0 else 0
-        
-        assignment_dict = {
-            "id": assignment.id,
-            "title": assignment.title,
-            "description": assignment.description,
-            "due_date": assignment.due_date,
-            "total_points": assignment.total_points,
-            "course_id": assignment.course_id,
-            "course_title": assignment.course.title,
-            "total_submissions": total_submissions,
-            "graded_submissions": graded_submissions,
-            "average_grade": round(average_grade, 2)
-        }
-        assignments_with_stats.append(assignment_dict)
-    
-    return assignments_with_stats
-
-@app.put("/courses/{course_id}")
+    return [
+        schemas.AdminAssignmentStats(
+            **dict(row._mapping, average_grade=round(row.average_grade, 2))
+        )
+        for row in rows
+    ]
+
+@router.put("/courses/{course_id}", response_model=schemas.CourseResponse)
 async def update_course(
     course_id: str,
     title: str = None,
@@ -203,7 +257,7 @@ async def update_course(
     db.refresh(course)
     return course
 
-@app.delete("/courses/{course_id}")
+@router.delete("/courses/{course_id}", response_model=schemas.MessageResponse)
 async def delete_course(
     course_id: str,
     current_user: str = Depends(auth.get_current_user),
@@ -238,19 +292,16 @@ async def delete_course(
     for lesson in lessons:
         db.delete(lesson)
     
+    db.query(models.CourseActivity).filter(models.CourseActivity.course_id == course_id).delete()
     db.delete(course)
     db.commit()
     return {"message": "Course deleted successfully"}
 
 # Enrollment endpoints (Student)
-# Add this with your other Pydantic models at the top
-class EnrollmentCreate(BaseModel):
-    course_id: str
-
-# Update the enrollment endpoint
-@app.post("/enrollments/")
+@router.post("/enrollments/", response_model=schemas.EnrollmentResponse)
 async def create_enrollment(
-    enrollment: EnrollmentCreate,
+    enrollment: schemas.EnrollmentCreate,
+    background_tasks: BackgroundTasks,
     current_user: str = Depends(auth.get_current_user),
     db: Session = Depends(database.get_db)
 ):
@@ -272,12 +323,60 @@ async def create_enrollment(
         course_id=enrollment.course_id
     )
     db.add(new_enrollment)
+    rollups.record(db, enrollment.course_id, enrollments=1)
     db.commit()
     db.refresh(new_enrollment)
+
+    recommendations.index.record_enrollment(current_user, enrollment.course_id)
+    cluster.notifier.publish("enrollment", {"student_id": current_user, "course_id": enrollment.course_id})
+    events.log.emit(
+        "enrollment.created",
+        enrollment_id=new_enrollment.id,
+        student_id=current_user,
+        course_id=enrollment.course_id
+    )
+    background_tasks.add_task(recommendations.refresh_index)
     return new_enrollment
 
+@router.get("/recommendations", response_model=List[schemas.RecommendedCourse])
+async def get_recommendations(
+    limit: int = 10,
+    current_user: str = Depends(auth.get_current_user),
+    db: Session = Depends(database.get_db)
+):
+    user = db.query(models.User).filter(models.User.id == current_user).first()
+    if user.role != models.UserRole.STUDENT:
+        raise HTTPException(status_code=403, detail="Only students can get course recommendations")
+    
+    ranked = recommendations.index.recommend(current_user, limit=max(1, min(limit, 50)))
+    courses = {
+        row.id: row
+        for row in db.query(
+            models.Course.id,
+            models.Course.title,
+            models.Course.description,
+            models.Course.image_url,
+            models.Course.duration,
+            models.Course.level
+        ).filter(models.Course.id.in_([course_id for course_id, _ in ranked]))
+    }
+    
+    return [
+        schemas.RecommendedCourse(
+            course_id=course_id,
+            title=courses[course_id].title,
+            description=courses[course_id].description,
+            image_url=courses[course_id].image_url,
+            duration=courses[course_id].duration,
+            level=courses[course_id].level,
+            score=round(score, 4)
+        )
+        for course_id, score in ranked
+        if course_id in courses
+    ]
+
 # Assignment endpoints
-@app.post("/assignments/")
+@router.post("/assignments/", response_model=schemas.AssignmentResponse)
 async def create_assignment(
     course_id: str,
     title: str,
@@ -300,14 +399,16 @@ async def create_assignment(
         total_points=total_points
     )
     db.add(assignment)
+    rollups.record(db, course_id, at=due_date, assignments_due=1)
     db.commit()
     db.refresh(assignment)
     return assignment
 
-@app.post("/assignments/{assignment_id}/submit")
+@router.post("/assignments/{assignment_id}/submit", response_model=schemas.SubmissionReceipt, dependencies=[Depends(submission_admission.dependency(auth.get_current_user))])
 async def submit_assignment(
     assignment_id: str,
-    content: str,
+    content: str = Form(None),
+    file: UploadFile = File(None),
     current_user: str = Depends(auth.get_current_user),
     db: Session = Depends(database.get_db)
 ):
@@ -315,18 +416,93 @@ async def submit_assignment(
     if user.role != models.UserRole.STUDENT:
         raise HTTPException(status_code=403, detail="Only students can submit assignments")
     
-    submission = models.AssignmentSubmission(
-        id=str(uuid.uuid4()),
+    already_submitted = submission_log.log.is_pending(assignment_id, current_user) or db.query(
+        models.AssignmentSubmission.id
+    ).filter(
+        models.AssignmentSubmission.assignment_id == assignment_id,
+        models.AssignmentSubmission.student_id == current_user
+    ).first()
+    if already_submitted:
+        raise HTTPException(status_code=409, detail="Assignment already submitted")
+    
+    if file is not None:
+        stream, content_type = file.file, file.content_type or "application/octet-stream"
+    elif content is not None:
+        stream, content_type = io.BytesIO(content.encode("utf-8")), "text/plain; charset=utf-8"
+    else:
+        raise HTTPException(status_code=400, detail="Submission must include content or a file")
+    
+    # Hashing, compression and disk writes stay off the event loop
+    try:
+        digest, size, encoding = await run_in_threadpool(storage.blobs.put, stream, content_type)
+    except storage.BlobTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    
+    # Acknowledged once durable in the submission log; the row is written
+    # to assignment_submissions by the log's batched background writer
+    submission = {
+        "id": str(uuid.uuid4()),
+        "assignment_id": assignment_id,
+        "student_id": current_user,
+        "submitted_at": datetime.utcnow().isoformat(),
+        "content_ref": digest,
+        "content_size": size,
+        "content_encoding": encoding,
+        "content_type": content_type
+    }
+    try:
+        await submission_log.log.append(submission)
+    except submission_log.DuplicateSubmission:
+        raise HTTPException(status_code=409, detail="Assignment already submitted")
+    # The row is committed by the log writer, not on this request's session
+    database.note_write(database.client_key(current_user))
+    events.log.emit(
+        "submission.created",
+        submission_id=submission["id"],
         assignment_id=assignment_id,
         student_id=current_user,
-        content=content
+        content_size=size,
+        content_type=content_type
     )
-    db.add(submission)
-    db.commit()
-    db.refresh(submission)
     return submission
 
-@app.post("/assignments/{assignment_id}/grade")
+@router.get("/submissions/{submission_id}/content")
+async def download_submission_content(
+    submission_id: str,
+    accept_encoding: str = Header(""),
+    current_user: str = Depends(auth.get_current_user),
+    db: Session = Depends(database.get_db)
+):
+    user = db.query(models.User).filter(models.User.id == current_user).first()
+    submission = db.query(models.AssignmentSubmission).filter(
+        models.AssignmentSubmission.id == submission_id
+    ).first()
+    
+    if not submission:
+        raise HTTPException(status_code=404, detail="Submission not found")
+    if user.role != models.UserRole.ADMIN and submission.student_id != current_user:
+        raise HTTPException(status_code=403, detail="Not authorized")
+    
+    # Rows written before the blob store keep their content inline
+    if submission.content_ref is None:
+        return Response(content=submission.content or "", media_type="text/plain; charset=utf-8")
+    
+    digest, encoding = submission.content_ref, submission.content_encoding
+    if encoding == "gzip" and compression.accepts(accept_encoding, "gzip"):
+        return FileResponse(
+            storage.blobs.path(digest, encoding),
+            media_type=submission.content_type,
+            headers={"Content-Encoding": "gzip", "Vary": "Accept-Encoding"}
+        )
+    if encoding is None:
+        return FileResponse(storage.blobs.path(digest), media_type=submission.content_type)
+    return StreamingResponse(
+        storage.blobs.iter_decoded(digest, encoding),
+        media_type=submission.content_type,
+        headers={"Content-Length": str(submission.content_size), "Vary": "Accept-Encoding"}
+    )
+
+@router.post("/assignments/{assignment_id}/grade", response_model=schemas.SubmissionResponse)
 async def grade_assignment(
     assignment_id: str,
     submission_id: str,
@@ -347,13 +523,33 @@ async def grade_assignment(
     if not submission:
         raise HTTPException(status_code=404, detail="Submission not found")
     
+    course_id = db.query(models.Assignment.course_id).filter(models.Assignment.id == assignment_id).scalar()
+    previous_grade = submission.grade
+    # Counted in the hour of the first grading, as rollups.rebuild does;
+    # grades from before graded_at existed were counted at submission time
+    if submission.graded_at is None:
+        submission.graded_at = datetime.utcnow() if submission.grade is None else submission.submitted_at
+    if submission.grade is None:
+        rollups.record(db, course_id, at=submission.graded_at, graded=1, grade_total=grade)
+    else:
+        rollups.record(db, course_id, at=submission.graded_at, grade_total=grade - submission.grade)
     submission.grade = grade
     submission.feedback = feedback
     db.commit()
     db.refresh(submission)
+    events.log.emit(
+        "submission.graded",
+        submission_id=submission.id,
+        assignment_id=assignment_id,
+        student_id=submission.student_id,
+        course_id=course_id,
+        grade=grade,
+        previous_grade=previous_grade,
+        grader_id=current_user
+    )
     return submission
 
-@app.get("/enrollments/student")
+@router.get("/enrollments/student", response_model=List[schemas.EnrolledCourse])
 async def get_student_enrollments(
     current_user: str = Depends(auth.get_current_user),
     db: Session = Depends(database.get_db)
@@ -362,29 +558,61 @@ async def get_student_enrollments(
     if user.role != models.UserRole.STUDENT:
         raise HTTPException(status_code=403, detail="Only students can view their enrollments")
     
-    enrollments = db.query(models.Enrollment).filter(
+    # Enrollments joined with their course details in one query
+    rows = db.query(
+        models.Enrollment.id.label("enrollment_id"),
+        models.Course.id.label("course_id"),
+        models.Course.title,
+        models.Course.description,
+        models.Course.image_url,
+        models.Course.duration,
+        models.Course.level,
+        models.Enrollment.enrolled_at
+    ).join(
+        models.Course, models.Course.id == models.Enrollment.course_id
+    ).filter(
         models.Enrollment.student_id == current_user
     ).all()
     
-    # Get the course details for each enrollment
-    enrolled_courses = []
-    for enrollment in enrollments:
-        course = db.query(models.Course).filter(models.Course.id == enrollment.course_id).first()
-        if course:
-            enrolled_courses.append({
-                "enrollment_id": enrollment.id,
-                "course_id": course.id,
-                "title": course.title,
-                "description": course.description,
-                "image_url": course.image_url,
-                "duration": course.duration,
-                "level": course.level,
-                "enrolled_at": enrollment.enrolled_at
-            })
-    
-    return enrolled_courses
-
-@app.get("/assignments/student")
+    return schemas.from_rows(schemas.EnrolledCourse, rows)
+
+ASSIGNMENT_COLUMNS = (
+    models.Assignment.id.label("assignment_id"),
+    models.Assignment.title,
+    models.Assignment.description,
+    models.Assignment.due_date,
+    models.Assignment.total_points,
+    models.Course.id.label("course_id"),
+    models.Course.title.label("course_title")
+)
+
+def _student_submissions(db: Session, student_id: str, assignment_ids):
+    """The student's submission per assignment, fetched in one query"""
+    submissions = {}
+    rows = db.query(
+        models.AssignmentSubmission.assignment_id,
+        models.AssignmentSubmission.id,
+        models.AssignmentSubmission.grade,
+        models.AssignmentSubmission.feedback
+    ).filter(
+        models.AssignmentSubmission.student_id == student_id,
+        models.AssignmentSubmission.assignment_id.in_(assignment_ids)
+    )
+    for row in rows:
+        submissions.setdefault(row.assignment_id, row)
+    return submissions
+
+def _enrolled_assignments(db: Session, student_id: str, *criteria):
+    # Semi-join, so duplicate enrollment rows cannot repeat an assignment
+    enrolled = db.query(models.Enrollment.course_id).filter(models.Enrollment.student_id == student_id)
+    return db.query(*ASSIGNMENT_COLUMNS).join(
+        models.Course, models.Course.id == models.Assignment.course_id
+    ).filter(
+        models.Assignment.course_id.in_(enrolled),
+        *criteria
+    ).order_by(models.Assignment.due_date).all()
+
+@router.get("/assignments/student", response_model=List[schemas.StudentAssignment])
 async def get_student_assignments(
     current_user: str = Depends(auth.get_current_user),
     db: Session = Depends(database.get_db)
@@ -393,47 +621,28 @@ async def get_student_assignments(
     if user.role != models.UserRole.STUDENT:
         raise HTTPException(status_code=403, detail="Only students can view their assignments")
     
-    # Get student's enrolled courses
-    enrollments = db.query(models.Enrollment).filter(
-        models.Enrollment.student_id == current_user
-    ).all()
+    # All assignments from enrolled courses with course information
+    assignments = _enrolled_assignments(db, current_user)
+    submissions = _student_submissions(db, current_user, [a.assignment_id for a in assignments])
     
-    enrolled_course_ids = [enrollment.course_id for enrollment in enrollments]
-    
-    # Get all assignments from enrolled courses
-    assignments = db.query(models.Assignment).filter(
-        models.Assignment.course_id.in_(enrolled_course_ids)
-    ).all()
-    
-    # Format response with additional course information
+    now = datetime.utcnow()
     assignments_with_details = []
     for assignment in assignments:
-        course = db.query(models.Course).filter(models.Course.id == assignment.course_id).first()
-        submission = db.query(models.AssignmentSubmission).filter(
-            models.AssignmentSubmission.assignment_id == assignment.id,
-            models.AssignmentSubmission.student_id == current_user
-        ).first()
-        
-        assignments_with_details.append({
-            "assignment_id": assignment.id,
-            "title": assignment.title,
-            "description": assignment.description,
-            "due_date": assignment.due_date,
-            "total_points": assignment.total_points,
-            "course_id": course.id,
-            "course_title": course.title,
-            "status": "overdue" if assignment.due_date < datetime.utcnow() and not submission else
-                     "submitted" if submission else
-                     "upcoming",
-            "submitted": submission is not None,
-            "submission_id": submission.id if submission else None,
-            "grade": submission.grade if submission and submission.grade is not None else None,
-            "feedback": submission.feedback if submission and submission.feedback is not None else None
-        })
-    
-    return sorted(assignments_with_details, key=lambda x: x["due_date"])
-
-@app.get("/assignments/student/upcoming")
+        submission = submissions.get(assignment.assignment_id)
+        assignments_with_details.append(schemas.StudentAssignment(
+            **assignment._mapping,
+            status="overdue" if assignment.due_date < now and not submission else
+                   "submitted" if submission else
+                   "upcoming",
+            submitted=submission is not None,
+            submission_id=submission.id if submission else None,
+            grade=submission.grade if submission else None,
+            feedback=submission.feedback if submission else None
+        ))
+    
+    return assignments_with_details
+
+@router.get("/assignments/student/upcoming", response_model=List[schemas.UpcomingAssignment])
 async def get_student_upcoming_assignments(
     current_user: str = Depends(auth.get_current_user),
     db: Session = Depends(database.get_db)
@@ -442,46 +651,24 @@ async def get_student_upcoming_assignments(
     if user.role != models.UserRole.STUDENT:
         raise HTTPException(status_code=403, detail="Only students can view their assignments")
     
-    # Get student's enrolled courses
-    enrollments = db.query(models.Enrollment).filter(
-        models.Enrollment.student_id == current_user
-    ).all()
-    
-    enrolled_course_ids = [enrollment.course_id for enrollment in enrollments]
-    
-    # Get upcoming assignments from enrolled courses
-    upcoming_assignments = db.query(models.Assignment).filter(
-        models.Assignment.course_id.in_(enrolled_course_ids),
-        models.Assignment.due_date > datetime.utcnow()
-    ).all()
+    # Upcoming assignments from enrolled courses with course information
+    assignments = _enrolled_assignments(db, current_user, models.Assignment.due_date > datetime.utcnow())
+    submissions = _student_submissions(db, current_user, [a.assignment_id for a in assignments])
     
-    # Format response with additional course information
     assignments_with_details = []
-    for assignment in upcoming_assignments:
-        course = db.query(models.Course).filter(models.Course.id == assignment.course_id).first()
-        # Check if the student has already submitted this assignment
-        submission = db.query(models.AssignmentSubmission).filter(
-            models.AssignmentSubmission.assignment_id == assignment.id,
-            models.AssignmentSubmission.student_id == current_user
-        ).first()
-        
-        assignments_with_details.append({
-            "assignment_id": assignment.id,
-            "title": assignment.title,
-            "description": assignment.description,
-            "due_date": assignment.due_date,
-            "total_points": assignment.total_points,
-            "course_id": course.id,
-            "course_title": course.title,
-            "submitted": submission is not None,
-            "submission_id": submission.id if submission else None,
-            "grade": submission.grade if submission and submission.grade is not None else None
-        })
-    
-    return sorted(assignments_with_details, key=lambda x: x["due_date"])
-
-
-@app.get("/assignments/{assignment_id}")
+    for assignment in assignments:
+        submission = submissions.get(assignment.assignment_id)
+        assignments_with_details.append(schemas.UpcomingAssignment(
+            **assignment._mapping,
+            submitted=submission is not None,
+            submission_id=submission.id if submission else None,
+            grade=submission.grade if submission else None
+        ))
+    
+    return assignments_with_details
+
+
+@router.get("/assignments/{assignment_id}", response_model=schemas.StudentAssignment)
 async def get_assignment_details(
     assignment_id: str,
     current_user: str = Depends(auth.get_current_user),
@@ -489,22 +676,21 @@ async def get_assignment_details(
 ):
     user = db.query(models.User).filter(models.User.id == current_user).first()
     
-    # Get the assignment
-    assignment = db.query(models.Assignment).filter(
+    # Get the assignment with its course
+    assignment = db.query(*ASSIGNMENT_COLUMNS).join(
+        models.Course, models.Course.id == models.Assignment.course_id
+    ).filter(
         models.Assignment.id == assignment_id
     ).first()
     
     if not assignment:
         raise HTTPException(status_code=404, detail="Assignment not found")
     
-    # Get the course
-    course = db.query(models.Course).filter(models.Course.id == assignment.course_id).first()
-    
     # For students, check if they're enrolled in the course
     if user.role == models.UserRole.STUDENT:
-        enrollment = db.query(models.Enrollment).filter(
+        enrollment = db.query(models.Enrollment.id).filter(
             models.Enrollment.student_id == current_user,
-            models.Enrollment.course_id == course.id
+            models.Enrollment.course_id == assignment.course_id
         ).first()
         if not enrollment:
             raise HTTPException(status_code=403, detail="Not enrolled in this course")
@@ -512,29 +698,20 @@ async def get_assignment_details(
     # Get submission if it exists (for students)
     submission = None
     if user.role == models.UserRole.STUDENT:
-        submission = db.query(models.AssignmentSubmission).filter(
-            models.AssignmentSubmission.assignment_id == assignment_id,
-            models.AssignmentSubmission.student_id == current_user
-        ).first()
+        submission = _student_submissions(db, current_user, [assignment_id]).get(assignment_id)
     
-    return {
-        "assignment_id": assignment.id,
-        "title": assignment.title,
-        "description": assignment.description,
-        "due_date": assignment.due_date,
-        "total_points": assignment.total_points,
-        "course_id": course.id,
-        "course_title": course.title,
-        "status": "overdue" if assignment.due_date < datetime.utcnow() and not submission else
-                 "submitted" if submission else
-                 "upcoming",
-        "submitted": submission is not None if user.role == models.UserRole.STUDENT else None,
-        "submission_id": submission.id if submission else None,
-        "grade": submission.grade if submission and submission.grade is not None else None,
-        "feedback": submission.feedback if submission and submission.feedback is not None else None
-    }
+    return schemas.StudentAssignment(
+        **assignment._mapping,
+        status="overdue" if assignment.due_date < datetime.utcnow() and not submission else
+               "submitted" if submission else
+               "upcoming",
+        submitted=submission is not None if user.role == models.UserRole.STUDENT else None,
+        submission_id=submission.id if submission else None,
+        grade=submission.grade if submission else None,
+        feedback=submission.feedback if submission else None
+    )
 
-@app.get("/assignments/admin")
+@router.get("/assignments/admin", response_model=List[schemas.AdminAssignmentSummary])
 async def get_admin_assignments(
     current_user: str = Depends(auth.get_current_user),
     db: Session = Depends(database.get_db)
@@ -543,40 +720,27 @@ async def get_admin_assignments(
     if user.role != models.UserRole.ADMIN:
         raise HTTPException(status_code=403, detail="Not authorized")
     
-    # Get all assignments
-    assignments = db.query(models.Assignment).all()
+    # All assignments with course information and submission counts
+    rows = db.query(
+        *ASSIGNMENT_COLUMNS,
+        func.count(models.AssignmentSubmission.id).label("submission_count"),
+        func.count(models.AssignmentSubmission.grade).label("graded_count")
+    ).join(
+        models.Course, models.Course.id == models.Assignment.course_id
+    ).outerjoin(
+        models.AssignmentSubmission, models.AssignmentSubmission.assignment_id == models.Assignment.id
+    ).group_by(models.Assignment.id).order_by(models.Assignment.due_date).all()
     
-    # Format response with additional course information
-    assignments_with_details = []
-    for assignment in assignments:
-        course = db.query(models.Course).filter(models.Course.id == assignment.course_id).first()
-        # Count submissions for this assignment
-        submission_count = db.query(models.AssignmentSubmission).filter(
-            models.AssignmentSubmission.assignment_id == assignment.id
-        ).count()
-        
-        # Count graded submissions
-        graded_count = db.query(models.AssignmentSubmission).filter(
-            models.AssignmentSubmission.assignment_id == assignment.id,
-            models.AssignmentSubmission.grade != None
-        ).count()
-        
-        assignments_with_details.append({
-            "assignment_id": assignment.id,
-            "title": assignment.title,
-            "description": assignment.description,
-            "due_date": assignment.due_date,
-            "total_points": assignment.total_points,
-            "course_id": course.id,
-            "course_title": course.title,
-            "submission_count": submission_count,
-            "graded_count": graded_count,
-            "status": "past" if assignment.due_date < datetime.utcnow() else "upcoming"
-        })
-    
-    return sorted(assignments_with_details, key=lambda x: x["due_date"])
-
-@app.get("/assignments/{assignment_id}/submissions")
+    now = datetime.utcnow()
+    return [
+        schemas.AdminAssignmentSummary(
+            **row._mapping,
+            status="past" if row.due_date < now else "upcoming"
+        )
+        for row in rows
+    ]
+
+@router.get("/assignments/{assignment_id}/submissions", response_model=List[schemas.SubmissionDetail])
 async def get_assignment_submissions(
     assignment_id: str,
     current_user: str = Depends(auth.get_current_user),
@@ -594,31 +758,98 @@ async def get_assignment_submissions(
     if not assignment:
         raise HTTPException(status_code=404, detail="Assignment not found")
     
-    # Get all submissions for this assignment
-    submissions = db.query(models.AssignmentSubmission).filter(
+    # All submissions for this assignment with student information
+    rows = db.query(
+        models.AssignmentSubmission.id,
+        models.AssignmentSubmission.submitted_at,
+        models.AssignmentSubmission.content,
+        models.AssignmentSubmission.content_size,
+        models.AssignmentSubmission.grade,
+        models.AssignmentSubmission.feedback,
+        models.User.id.label("student_id"),
+        models.User.first_name,
+        models.User.last_name,
+        models.User.email
+    ).join(
+        models.User, models.User.id == models.AssignmentSubmission.student_id
+    ).filter(
         models.AssignmentSubmission.assignment_id == assignment_id
-    ).all()
+    ).order_by(models.AssignmentSubmission.submitted_at.desc()).all()
+    
+    return [
+        schemas.SubmissionDetail(
+            submission_id=row.id,
+            student_id=row.student_id,
+            student_name=f"{row.first_name} {row.last_name}",
+            student_email=row.email,
+            submitted_at=row.submitted_at,
+            content=row.content,
+            content_url=f"/submissions/{row.id}/content",
+            content_size=row.content_size,
+            grade=row.grade,
+            feedback=row.feedback,
+            graded=row.grade is not None
+        )
+        for row in rows
+    ]
+
+@router.get("/assignments/{assignment_id}/similarity", response_model=schemas.SimilarityReport)
+async def get_similar_submissions(
+    assignment_id: str,
+    threshold: float = similarity.DEFAULT_THRESHOLD,
+    current_user: str = Depends(auth.get_current_user),
+    db: Session = Depends(database.get_write_db)
+):
+    user = db.query(models.User).filter(models.User.id == current_user).first()
+    if user.role != models.UserRole.ADMIN:
+        raise HTTPException(status_code=403, detail="Not authorized")
+    
+    if not 0 < threshold <= 1:
+        raise HTTPException(status_code=400, detail="threshold must be in (0, 1]")
+    
+    assignment = db.query(models.Assignment).filter(
+        models.Assignment.id == assignment_id
+    ).first()
     
-    # Format response with student information
-    submissions_with_details = []
-    for submission in submissions:
-        student = db.query(models.User).filter(models.User.id == submission.student_id).first()
-        
-        submissions_with_details.append({
-            "submission_id": submission.id,
-            "student_id": student.id,
-            "student_name": f"{student.first_name} {student.last_name}",
-            "student_email": student.email,
-            "submitted_at": submission.submitted_at,
-            "content": submission.content,
-            "grade": submission.grade,
-            "feedback": submission.feedback,
-            "graded": submission.grade is not None
-        })
-    
-    return sorted(submissions_with_details, key=lambda x: x["submitted_at"], reverse=True)
-
-@app.get("/assignments/{assignment_id}/submission")
+    if not assignment:
+        raise HTTPException(status_code=404, detail="Assignment not found")
+    
+    # Backfilling unsigned legacy rows reads every blob, keep it off the event loop
+    signatures = await run_in_threadpool(similarity.assignment_signatures, db, assignment_id)
+    pairs = await run_in_threadpool(similarity.near_duplicates, signatures, threshold)
+    
+    # Resolve student details for all flagged submissions in one query
+    flagged = {submission_id for a, b, _ in pairs for submission_id in (a, b)}
+    students = {
+        submission_id: student
+        for submission_id, student in db.query(models.AssignmentSubmission.id, models.User)
+        .join(models.User, models.User.id == models.AssignmentSubmission.student_id)
+        .filter(models.AssignmentSubmission.id.in_(flagged))
+    }
+    
+    def describe(submission_id):
+        student = students[submission_id]
+        return schemas.SimilarSubmission(
+            submission_id=submission_id,
+            student_id=student.id,
+            student_name=f"{student.first_name} {student.last_name}",
+            student_email=student.email
+        )
+    
+    return schemas.SimilarityReport(
+        assignment_id=assignment_id,
+        submissions_compared=len(signatures),
+        threshold=threshold,
+        pairs=[
+            schemas.SimilarPair(
+                similarity=round(score, 4),
+                submissions=[describe(a), describe(b)]
+            )
+            for a, b, score in pairs
+        ]
+    )
+
+@router.get("/assignments/{assignment_id}/submission", response_model=Union[schemas.StudentSubmission, schemas.PendingSubmission])
 async def get_student_submission(
     assignment_id: str,
     current_user: str = Depends(auth.get_current_user),
@@ -628,8 +859,10 @@ async def get_student_submission(
     if user.role != models.UserRole.STUDENT:
         raise HTTPException(status_code=403, detail="Not authorized")
     
-    # Get the assignment
-    assignment = db.query(models.Assignment).filter(
+    # Get the assignment with its course
+    assignment = db.query(*ASSIGNMENT_COLUMNS).join(
+        models.Course, models.Course.id == models.Assignment.course_id
+    ).filter(
         models.Assignment.id == assignment_id
     ).first()
     
@@ -637,48 +870,56 @@ async def get_student_submission(
         raise HTTPException(status_code=404, detail="Assignment not found")
     
     # Check if student is enrolled in the course
-    course = db.query(models.Course).filter(models.Course.id == assignment.course_id).first()
-    enrollment = db.query(models.Enrollment).filter(
+    enrollment = db.query(models.Enrollment.id).filter(
         models.Enrollment.student_id == current_user,
-        models.Enrollment.course_id == course.id
+        models.Enrollment.course_id == assignment.course_id
     ).first()
     
     if not enrollment:
         raise HTTPException(status_code=403, detail="Not enrolled in this course")
     
     # Get student's submission
-    submission = db.query(models.AssignmentSubmission).filter(
+    submission = db.query(
+        models.AssignmentSubmission.id,
+        models.AssignmentSubmission.submitted_at,
+        models.AssignmentSubmission.content,
+        models.AssignmentSubmission.content_size,
+        models.AssignmentSubmission.grade,
+        models.AssignmentSubmission.feedback
+    ).filter(
         models.AssignmentSubmission.assignment_id == assignment_id,
         models.AssignmentSubmission.student_id == current_user
     ).first()
     
     if not submission:
-        return {
-            "assignment_id": assignment_id,
-            "submitted": False,
-            "course_title": course.title,
-            "assignment_title": assignment.title,
-            "due_date": assignment.due_date,
-            "total_points": assignment.total_points,
-            "overdue": assignment.due_date < datetime.utcnow()
-        }
-    
-    return {
-        "submission_id": submission.id,
-        "assignment_id": assignment_id,
-        "submitted": True,
-        "submitted_at": submission.submitted_at,
-        "content": submission.content,
-        "grade": submission.grade,
-        "feedback": submission.feedback,
-        "graded": submission.grade is not None,
-        "course_title": course.title,
-        "assignment_title": assignment.title,
-        "due_date": assignment.due_date,
-        "total_points": assignment.total_points
-    }
+        return schemas.PendingSubmission(
+            assignment_id=assignment_id,
+            submitted=False,
+            course_title=assignment.course_title,
+            assignment_title=assignment.title,
+            due_date=assignment.due_date,
+            total_points=assignment.total_points,
+            overdue=assignment.due_date < datetime.utcnow()
+        )
+    
+    return schemas.StudentSubmission(
+        submission_id=submission.id,
+        assignment_id=assignment_id,
+        submitted=True,
+        submitted_at=submission.submitted_at,
+        content=submission.content,
+        content_url=f"/submissions/{submission.id}/content",
+        content_size=submission.content_size,
+        grade=submission.grade,
+        feedback=submission.feedback,
+        graded=submission.grade is not None,
+        course_title=assignment.course_title,
+        assignment_title=assignment.title,
+        due_date=assignment.due_date,
+        total_points=assignment.total_points
+    )
 
-@app.get("/admin/dashboard/stats")
+@router.get("/admin/dashboard/stats", response_model=schemas.DashboardStats)
 async def get_admin_dashboard_stats(
     current_user: str = Depends(auth.get_current_user),
     db: Session = Depends(database.get_db)
@@ -687,50 +928,330 @@ async def get_admin_dashboard_stats(
     if user.role != models.UserRole.ADMIN:
         raise HTTPException(status_code=403, detail="Not authorized")
     
-    # Get counts
+    # Entity counts stay live; activity counts come from the course_activity rollups
     total_students = db.query(models.User).filter(models.User.role == models.UserRole.STUDENT).count()
     total_courses = db.query(models.Course).count()
-    total_enrollments = db.query(models.Enrollment).count()
     total_assignments = db.query(models.Assignment).count()
-    total_submissions = db.query(models.AssignmentSubmission).count()
-    
-    # Get pending submissions (submitted but not graded)
-    pending_submissions = db.query(models.AssignmentSubmission).filter(
-        models.AssignmentSubmission.grade == None
-    ).count()
+
+    Activity = models.CourseActivity
+    total_enrollments, total_submissions, graded_submissions = db.query(
+        func.coalesce(func.sum(Activity.enrollments), 0),
+        func.coalesce(func.sum(Activity.submissions), 0),
+        func.coalesce(func.sum(Activity.graded), 0)
+    ).one()
     
-    # Get upcoming assignments
-    upcoming_assignments = db.query(models.Assignment).filter(
-        models.Assignment.due_date > datetime.utcnow()
-    ).count()
+    # Assignments due from the start of the current hour on
+    now = datetime.utcnow()
+    upcoming_assignments = db.query(func.coalesce(func.sum(Activity.assignments_due), 0)).filter(
+        rollups.since(now)
+    ).scalar()
     
-    # Get recent enrollments (last 30 days)
-    thirty_days_ago = datetime.utcnow() - timedelta(days=30)
-    recent_enrollments = db.query(models.Enrollment).filter(
-        models.Enrollment.enrolled_at > thirty_days_ago
-    ).count()
+    # Get recent enrollments (last 30 days: to the hour within the hourly
+    # retention, to the day before it)
+    recent_enrollments = db.query(func.coalesce(func.sum(Activity.enrollments), 0)).filter(
+        rollups.since(now - timedelta(days=30))
+    ).scalar()
     
     # Get course enrollment distribution
-    course_enrollments = []
-    courses = db.query(models.Course).all()
-    for course in courses:
-        enrollment_count = db.query(models.Enrollment).filter(
-            models.Enrollment.course_id == course.id
-        ).count()
-        course_enrollments.append({
-            "course_id": course.id,
-            "course_title": course.title,
-            "enrollment_count": enrollment_count
-        })
-    
-    return {
-        "total_students": total_students,
-        "total_courses": total_courses,
-        "total_enrollments": total_enrollments,
-        "total_assignments": total_assignments,
-        "total_submissions": total_submissions,
-        "pending_submissions": pending_submissions,
-        "upcoming_assignments": upcoming_assignments,
-        "recent_enrollments": recent_enrollments,
-        "course_enrollments": sorted(course_enrollments, key=lambda x: x["enrollment_count"], reverse=True)
-    }
+    per_course = db.query(
+        Activity.course_id,
+        func.sum(Activity.enrollments).label("enrollments")
+    ).group_by(Activity.course_id).subquery()
+    enrollment_count = func.coalesce(per_course.c.enrollments, 0).label("enrollment_count")
+    course_enrollments = db.query(
+        models.Course.id.label("course_id"),
+        models.Course.title.label("course_title"),
+        enrollment_count
+    ).outerjoin(
+        per_course, per_course.c.course_id == models.Course.id
+    ).order_by(enrollment_count.desc()).all()
+    
+    return schemas.DashboardStats(
+        total_students=total_students,
+        total_courses=total_courses,
+        total_enrollments=total_enrollments,
+        total_assignments=total_assignments,
+        total_submissions=total_submissions,
+        pending_submissions=total_submissions - graded_submissions,
+        upcoming_assignments=upcoming_assignments,
+        recent_enrollments=recent_enrollments,
+        course_enrollments=schemas.from_rows(schemas.CourseEnrollmentCount, course_enrollments)
+    )
+
+ACTIVITY_MAX_DAYS = 366
+
+@router.get("/admin/dashboard/activity", response_model=List[schemas.DailyActivity])
+async def get_admin_dashboard_activity(
+    days: int = 30,
+    course_id: str = None,
+    current_user: str = Depends(auth.get_current_user),
+    db: Session = Depends(database.get_db)
+):
+    user = db.query(models.User).filter(models.User.id == current_user).first()
+    if user.role != models.UserRole.ADMIN:
+        raise HTTPException(status_code=403, detail="Not authorized")
+    if not 1 <= days <= ACTIVITY_MAX_DAYS:
+        raise HTTPException(status_code=400, detail=f"days must be between 1 and {ACTIVITY_MAX_DAYS}")
+    
+    return [
+        schemas.DailyActivity(
+            date=day,
+            enrollments=enrollments,
+            submissions=submissions,
+            graded=graded
+        )
+        for day, enrollments, submissions, graded in rollups.daily(db, days, course_id)
+    ]
+
+
+# Calendar endpoints (Student)
+CALENDAR_DEFAULT_DAYS = 7
+CALENDAR_MAX_DAYS = 366
+
+def _calendar_window(start: datetime = None, end: datetime = None):
+    # Stored times are naive UTC; query parameters may carry an offset
+    start, end = schedule.naive_utc(start), schedule.naive_utc(end)
+    start = start or datetime.utcnow()
+    end = end or start + timedelta(days=CALENDAR_DEFAULT_DAYS)
+    if end <= start:
+        raise HTTPException(status_code=400, detail="end must be after start")
+    if end - start > timedelta(days=CALENDAR_MAX_DAYS):
+        raise HTTPException(status_code=400, detail=f"Calendar window cannot exceed {CALENDAR_MAX_DAYS} days")
+    return start, end
+
+def _student_courses(current_user: str, db: Session):
+    user = db.query(models.User).filter(models.User.id == current_user).first()
+    if user.role != models.UserRole.STUDENT:
+        raise HTTPException(status_code=403, detail="Only students can view their calendar")
+    
+    return dict(
+        db.query(models.Course.id, models.Course.title)
+        .join(models.Enrollment, models.Enrollment.course_id == models.Course.id)
+        .filter(models.Enrollment.student_id == current_user)
+        .all()
+    )
+
+@router.get("/calendar", response_model=List[schemas.CalendarEvent])
+async def get_calendar(
+    start: datetime = None,
+    end: datetime = None,
+    current_user: str = Depends(auth.get_current_user),
+    db: Session = Depends(database.get_db)
+):
+    start, end = _calendar_window(start, end)
+    course_titles = _student_courses(current_user, db)
+    
+    return [
+        schemas.CalendarEvent(
+            type=kind,
+            id=item_id,
+            title=title,
+            course_id=course_id,
+            course_title=course_titles[course_id],
+            time=when
+        )
+        for when, kind, item_id, title, course_id in schedule.iter_events(db, course_titles, start, end)
+    ]
+
+@router.get("/calendar.ics")
+async def get_calendar_feed(
+    start: datetime = None,
+    end: datetime = None,
+    current_user: str = Depends(auth.get_current_user),
+    db: Session = Depends(database.get_db)
+):
+    start, end = _calendar_window(start, end)
+    course_titles = _student_courses(current_user, db)
+    
+    feed = schedule.to_ical(schedule.iter_events(db, course_titles, start, end), course_titles)
+    return Response(
+        content=feed,
+        media_type="text/calendar",
+        headers={"Content-Disposition": 'attachment; filename="calendar.ics"'}
+    )
+
+RISK_SORT_COLUMNS = {
+    "risk_score": models.StudentRiskScore.risk_score,
+    "overdue_assignments": models.StudentRiskScore.overdue_assignments,
+    "average_grade": models.StudentRiskScore.average_grade,
+    "average_progress": models.StudentRiskScore.average_progress,
+    "days_inactive": models.StudentRiskScore.days_inactive,
+}
+
+@router.get("/admin/at-risk", response_model=schemas.AtRiskPage)
+async def get_at_risk_students(
+    page: int = 1,
+    page_size: int = 50,
+    sort_by: str = "risk_score",
+    order: str = "desc",
+    risk_level: str = None,
+    current_user: str = Depends(auth.get_current_user),
+    db: Session = Depends(database.get_db)
+):
+    user = db.query(models.User).filter(models.User.id == current_user).first()
+    if user.role != models.UserRole.ADMIN:
+        raise HTTPException(status_code=403, detail="Not authorized")
+    
+    if sort_by not in RISK_SORT_COLUMNS:
+        raise HTTPException(status_code=400, detail=f"sort_by must be one of {', '.join(RISK_SORT_COLUMNS)}")
+    if order not in ("asc", "desc"):
+        raise HTTPException(status_code=400, detail="order must be 'asc' or 'desc'")
+    page = max(page, 1)
+    page_size = max(1, min(page_size, 200))
+    
+    query = db.query(models.StudentRiskScore, models.User).join(
+        models.User, models.User.id == models.StudentRiskScore.student_id
+    )
+    if risk_level:
+        query = query.filter(models.StudentRiskScore.risk_level == risk_level)
+    
+    total = query.count()
+    column = RISK_SORT_COLUMNS[sort_by]
+    rows = query.order_by(
+        column.desc() if order == "desc" else column.asc(),
+        models.StudentRiskScore.student_id
+    ).offset((page - 1) * page_size).limit(page_size).all()
+    
+    return schemas.AtRiskPage(
+        total=total,
+        page=page,
+        page_size=page_size,
+        items=[
+            schemas.AtRiskStudent(
+                student_id=score.student_id,
+                student_name=f"{student.first_name} {student.last_name}",
+                student_email=student.email,
+                risk_score=round(score.risk_score, 4),
+                risk_level=score.risk_level,
+                enrolled_courses=score.enrolled_courses,
+                due_assignments=score.due_assignments,
+                overdue_assignments=score.overdue_assignments,
+                average_grade=score.average_grade,
+                average_progress=score.average_progress,
+                days_inactive=round(score.days_inactive, 1),
+                scored_at=score.scored_at
+            )
+            for score, student in rows
+        ]
+    )
+
+# Counters are kept per process: under serve.py each call reports the
+# worker that answered it, named in the X-Worker header
+@router.get("/admin/compression/stats", response_model=List[schemas.CompressionRouteStats])
+async def get_compression_stats(
+    response: Response,
+    current_user: str = Depends(auth.get_current_user),
+    db: Session = Depends(database.get_db)
+):
+    user = db.query(models.User).filter(models.User.id == current_user).first()
+    if user.role != models.UserRole.ADMIN:
+        raise HTTPException(status_code=403, detail="Not authorized")
+    
+    response.headers["X-Worker"] = str(cluster.WORKER_INDEX)
+    return compression.stats.report()
+
+@router.get("/admin/submission-log/stats", response_model=schemas.SubmissionLogStats)
+async def get_submission_log_stats(
+    response: Response,
+    current_user: str = Depends(auth.get_current_user),
+    db: Session = Depends(database.get_db)
+):
+    user = db.query(models.User).filter(models.User.id == current_user).first()
+    if user.role != models.UserRole.ADMIN:
+        raise HTTPException(status_code=403, detail="Not authorized")
+    
+    response.headers["X-Worker"] = str(cluster.WORKER_INDEX)
+    return {"worker": cluster.WORKER_INDEX, **submission_log.log.stats()}
+# Profiling (Admin only)
+@router.post("/admin/profiler", response_model=schemas.ProfilerRun)
+async def start_profiler(
+    seconds: float = 10,
+    interval_ms: float = profiling.DEFAULT_SAMPLE_INTERVAL_MS,
+    current_user: str = Depends(auth.get_current_user),
+    db: Session = Depends(database.get_db)
+):
+    user = db.query(models.User).filter(models.User.id == current_user).first()
+    if user.role != models.UserRole.ADMIN:
+        raise HTTPException(status_code=403, detail="Not authorized")
+    if not 0 < seconds <= profiling.MAX_PROFILE_SECONDS:
+        raise HTTPException(status_code=400, detail=f"seconds must be between 0 and {profiling.MAX_PROFILE_SECONDS}")
+    if not 1 <= interval_ms <= 1000:
+        raise HTTPException(status_code=400, detail="interval_ms must be between 1 and 1000")
+    
+    run = await run_in_threadpool(profiling.start_run, seconds, interval_ms)
+    if run is None:
+        raise HTTPException(status_code=409, detail="A profiling run is already in progress")
+    return run
+
+@router.get("/admin/profiler/{run_id}.folded", response_class=PlainTextResponse)
+async def download_profile(
+    run_id: str,
+    current_user: str = Depends(auth.get_current_user),
+    db: Session = Depends(database.get_db)
+):
+    user = db.query(models.User).filter(models.User.id == current_user).first()
+    if user.role != models.UserRole.ADMIN:
+        raise HTTPException(status_code=403, detail="Not authorized")
+    
+    run = profiling.load_run(run_id)
+    if run is None:
+        raise HTTPException(status_code=404, detail="Profiling run not found")
+    remaining = profiling.seconds_remaining(run)
+    if remaining > 0:
+        raise HTTPException(
+            status_code=409,
+            detail="Profiling run still in progress",
+            headers={"Retry-After": str(int(remaining) + 1)}
+        )
+    
+    stacks = await run_in_threadpool(profiling.collapsed_stacks, run_id)
+    return PlainTextResponse(
+        stacks,
+        headers={"Content-Disposition": f'attachment; filename="profile-{run_id}.folded"'}
+    )
+
+@router.get("/admin/traces/{trace_id}", response_model=schemas.RequestTrace)
+async def get_request_trace(
+    trace_id: str,
+    current_user: str = Depends(auth.get_current_user),
+    db: Session = Depends(database.get_db)
+):
+    user = db.query(models.User).filter(models.User.id == current_user).first()
+    if user.role != models.UserRole.ADMIN:
+        raise HTTPException(status_code=403, detail="Not authorized")
+    
+    trace = await run_in_threadpool(profiling.load_trace, trace_id)
+    if trace is None:
+        raise HTTPException(status_code=404, detail="Trace not found")
+    return trace
+
+def create_app():
+    app = FastAPI(default_response_class=ORJSONResponse, lifespan=lifespan)
+
+    # Reject oversized uploads before Starlette spools them to disk; inside
+    # CORS so browsers can read the 413
+    app.add_middleware(storage.UploadLimitMiddleware)
+
+    # Configure CORS
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=["e-mentoring.com", "a-novel-personalized-learning-framework-w-vemu-project-b4a5aba8.vercel.app", "http://localhost:5173", "http://localhost:5175", "https://a-novel-personalized-learning-git-5db0d2-vemu-project-b4a5aba8.vercel.app", "a-novel-personalized-learning-git-5db0d2-vemu-project-b4a5aba8.vercel.app"],  # Frontend URL
+        allow_credentials=True,
+        allow_methods=["*"],
+        allow_headers=["*"],
+        expose_headers=["*"],
+    )
+
+    # Compress large JSON bodies; the course catalog is served from a precompressed cache
+    app.add_middleware(
+        compression.CompressionMiddleware,
+        cacheable_paths={"/courses/"}
+    )
+
+    # Outermost, so traced requests include time spent in the other middleware
+    app.add_middleware(profiling.TraceMiddleware)
+
+    app.include_router(router)
+    return app
+
+app = create_app()
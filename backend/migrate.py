@@ -0,0 +1,112 @@
+"""Create or upgrade the database schema
+
+Run once per deploy, before starting the API:
+
+    python migrate.py
+
+The API also runs this at startup unless AUTO_CREATE_SCHEMA=0, which is
+the setting to use once deploys run the migration themselves.
+
+Submissions are unique per student and assignment. A database that
+already holds several is left alone, and the unique index is not
+created, until the extra copies are removed deliberately:
+
+    python migrate.py --drop-duplicate-submissions
+"""
+import argparse
+import logging
+import os
+
+from sqlalchemy import inspect, text
+
+import database, models, rollups
+
+logger = logging.getLogger(__name__)
+
+AUTO_CREATE_SCHEMA = os.getenv("AUTO_CREATE_SCHEMA", "1") not in ("0", "false", "no")
+
+UNIQUE_SUBMISSION_INDEX = "uq_assignment_submissions_assignment_student"
+
+
+def duplicate_submissions():
+    """(assignment_id, student_id, count) for every pair with more than one submission"""
+    with database.engine.connect() as conn:
+        return conn.execute(text(
+            "SELECT assignment_id, student_id, COUNT(*) FROM assignment_submissions "
+            "GROUP BY assignment_id, student_id HAVING COUNT(*) > 1"
+        )).all()
+
+
+def drop_duplicate_submissions():
+    """Keep one submission per student and assignment: the graded one, else the earliest
+
+    Several workers could log the same submission before it was unique.
+    Returns the number of rows removed.
+    """
+    duplicates = """
+        SELECT id FROM (
+            SELECT id, ROW_NUMBER() OVER (
+                PARTITION BY assignment_id, student_id
+                ORDER BY grade IS NULL, submitted_at, id
+            ) AS n
+            FROM assignment_submissions
+        ) WHERE n > 1
+    """
+    with database.engine.begin() as conn:
+        conn.execute(text(f"DELETE FROM submission_signatures WHERE submission_id IN ({duplicates})"))
+        return conn.execute(text(f"DELETE FROM assignment_submissions WHERE id IN ({duplicates})")).rowcount
+
+
+def migrate(drop_duplicates: bool = False):
+    """Create missing tables, indexes and columns
+
+    Duplicate submissions are only deleted with drop_duplicates; otherwise
+    they are reported and the unique index waits for them to be resolved.
+    """
+    models.Base.metadata.create_all(bind=database.engine)
+
+    submissions = models.AssignmentSubmission.__table__
+    existing = {index["name"] for index in inspect(database.engine).get_indexes(submissions.name)}
+    removed = 0
+    deferred = set()
+    if UNIQUE_SUBMISSION_INDEX not in existing:
+        if drop_duplicates:
+            removed = drop_duplicate_submissions()
+            if removed:
+                print(f"Removed {removed} duplicate submissions")
+        else:
+            duplicates = duplicate_submissions()
+            if duplicates:
+                deferred.add(UNIQUE_SUBMISSION_INDEX)
+                logger.warning(
+                    "%d assignment/student pairs have more than one submission, e.g. %s; not creating %s. "
+                    "Review them, then run `python migrate.py --drop-duplicate-submissions` to keep only "
+                    "the graded or earliest one",
+                    len(duplicates),
+                    ", ".join(f"{a}/{s} ({n})" for a, s, n in duplicates[:5]),
+                    UNIQUE_SUBMISSION_INDEX,
+                )
+
+    # create_all skips indexes on tables that already exist
+    for table in (models.Lesson.__table__, models.Assignment.__table__, submissions):
+        for index in table.indexes:
+            if index.name not in deferred:
+                index.create(bind=database.engine, checkfirst=True)
+    database.add_missing_columns(submissions)
+
+    # Backfill the dashboard rollups the first time they exist
+    db = database.SessionLocal()
+    try:
+        if removed or db.query(models.CourseActivity).first() is None:
+            rollups.rebuild(db)
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Create or upgrade the database schema")
+    parser.add_argument(
+        "--drop-duplicate-submissions", action="store_true",
+        help="delete all but the graded, else earliest, submission per student and assignment",
+    )
+    migrate(drop_duplicates=parser.parse_args().drop_duplicate_submissions)
@@ -1,4 +1,4 @@
-from sqlalchemy import Boolean, Column, String, Integer, ForeignKey, DateTime, Text, Float, Enum
+from sqlalchemy import Boolean, Column, String, Integer, ForeignKey, DateTime, Text, Float, Enum, Index, LargeBinary
 from sqlalchemy.orm import relationship
 from database import Base
 import enum
@@ -70,6 +70,10 @@ class Lesson(Base):
     # Relationships
     course = relationship("Course", back_populates="lessons")
 
+    __table_args__ = (
+        Index("ix_lessons_course_id_scheduled_time", "course_id", "scheduled_time"),
+    )
+
 class Assignment(Base):
     __tablename__ = "assignments"
 
@@ -84,6 +88,10 @@ class Assignment(Base):
     course = relationship("Course", back_populates="assignments")
     submissions = relationship("AssignmentSubmission", back_populates="assignment")
 
+    __table_args__ = (
+        Index("ix_assignments_course_id_due_date", "course_id", "due_date"),
+    )
+
 class AssignmentSubmission(Base):
     __tablename__ = "assignment_submissions"
 
@@ -91,10 +99,63 @@ class AssignmentSubmission(Base):
     assignment_id = Column(String, ForeignKey("assignments.id"))
     student_id = Column(String, ForeignKey("users.id"))
     submitted_at = Column(DateTime, default=datetime.utcnow)
-    content = Column(Text)
+    content = Column(Text)  # Legacy inline content, new submissions use the blob store
+    content_ref = Column(String, nullable=True)  # sha256 of the blob in storage.blobs
+    content_size = Column(Integer, nullable=True)
+    content_encoding = Column(String, nullable=True)  # e.g. "gzip" when compressed at rest
+    content_type = Column(String, nullable=True)
     grade = Column(Float, nullable=True)
     feedback = Column(Text, nullable=True)
+    graded_at = Column(DateTime, nullable=True)  # First grading; regrades keep it
 
     # Relationships
     assignment = relationship("Assignment", back_populates="submissions")
-    student = relationship("User", back_populates="submissions")
\ No newline at end of file
+    student = relationship("User", back_populates="submissions")
+
+    # One submission per student and assignment, enforced across workers
+    __table_args__ = (
+        Index("uq_assignment_submissions_assignment_student", "assignment_id", "student_id", unique=True),
+    )
+
+class CourseNeighbor(Base):
+    __tablename__ = "course_neighbors"
+
+    course_id = Column(String, ForeignKey("courses.id"), primary_key=True)
+    neighbor_id = Column(String, ForeignKey("courses.id"), primary_key=True)
+    score = Column(Float, nullable=False)
+
+class StudentRiskScore(Base):
+    __tablename__ = "student_risk_scores"
+
+    student_id = Column(String, ForeignKey("users.id"), primary_key=True)
+    enrolled_courses = Column(Integer, nullable=False)
+    due_assignments = Column(Integer, nullable=False)
+    overdue_assignments = Column(Integer, nullable=False)
+    average_grade = Column(Float, nullable=True)  # Fraction of total points, None if never graded
+    average_progress = Column(Float, nullable=False)
+    days_inactive = Column(Float, nullable=False)
+    risk_score = Column(Float, nullable=False, index=True)
+    risk_level = Column(String, nullable=False)
+    scored_at = Column(DateTime, nullable=False)
+
+
+class SubmissionSignature(Base):
+    __tablename__ = "submission_signatures"
+
+    submission_id = Column(String, ForeignKey("assignment_submissions.id"), primary_key=True)
+    assignment_id = Column(String, ForeignKey("assignments.id"), index=True, nullable=False)
+    signature = Column(LargeBinary, nullable=False)  # MinHash values as packed uint32
+
+
+class CourseActivity(Base):
+    """Per-course activity counters, hourly and compacted into days once older"""
+    __tablename__ = "course_activity"
+
+    course_id = Column(String, ForeignKey("courses.id"), primary_key=True)
+    period = Column(String, primary_key=True)  # "hour" or "day"
+    bucket = Column(DateTime, primary_key=True, index=True)  # Start of the hour or day (UTC)
+    enrollments = Column(Integer, nullable=False, default=0)
+    submissions = Column(Integer, nullable=False, default=0)
+    graded = Column(Integer, nullable=False, default=0)
+    grade_total = Column(Float, nullable=False, default=0.0)
+    assignments_due = Column(Integer, nullable=False, default=0)  # Bucketed by due date
@@ -0,0 +1,394 @@
+"""On-demand sampling profiler and per-request traces
+
+Both are off until asked for. The sampler is a thread that only exists
+while a run is active. Tracing costs untraced requests a scan of the
+request headers in TraceMiddleware and a context variable lookup per
+route and per SQL statement.
+"""
+import asyncio
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from contextvars import ContextVar
+from datetime import datetime
+from functools import wraps
+
+from fastapi.routing import APIRoute
+from sqlalchemy import event
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import Headers, MutableHeaders
+
+import auth, cluster, database, models
+
+PROFILE_DIR = os.getenv("PROFILE_DIR", "./profiles")
+TRACE_DIR = os.getenv("TRACE_DIR", "./traces")
+MAX_PROFILE_SECONDS = 300
+DEFAULT_SAMPLE_INTERVAL_MS = 5
+MAX_TRACES = 200
+MAX_TRACED_STATEMENT_CHARS = 2000
+
+TRACE_HEADER = b"x-trace"
+
+
+# Sampling profiler
+
+_labels = {}
+
+
+def _frame_label(code):
+    label = _labels.get(code)
+    if label is None:
+        label = _labels[code] = f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+    return label
+
+
+def _collapse(thread_name: str, frame):
+    stack = []
+    while frame is not None:
+        stack.append(_frame_label(frame.f_code))
+        frame = frame.f_back
+    stack.append(thread_name)
+    return ";".join(reversed(stack))
+
+
+class SamplingProfiler:
+    """Samples every thread's stack at a fixed interval for a bounded time
+
+    Each worker writes its samples in collapsed-stack format (one
+    "frame;frame;frame count" line per distinct stack, as read by
+    flamegraph.pl and speedscope) to PROFILE_DIR/<run id>/.
+    """
+
+    def __init__(self, directory=PROFILE_DIR):
+        self.directory = directory
+        self.run_id = None
+        self._thread = None
+
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, run_id: str, seconds: float, interval_ms: float):
+        if self.running():
+            return False
+        self.run_id = run_id
+        self._thread = threading.Thread(
+            target=self._sample, args=(run_id, seconds, interval_ms / 1000),
+            name="sampling-profiler", daemon=True,
+        )
+        self._thread.start()
+        return True
+
+    def _sample(self, run_id, seconds, interval):
+        own = threading.get_ident()
+        counts = Counter()
+        deadline = time.monotonic() + seconds
+        while time.monotonic() < deadline:
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident != own:
+                    counts[_collapse(names.get(ident, str(ident)), frame)] += 1
+            time.sleep(interval)
+
+        directory = os.path.join(self.directory, run_id)
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"worker-{cluster.WORKER_INDEX}-{os.getpid()}.folded")
+        with open(path + ".tmp", "w") as f:
+            f.writelines(f"{stack} {count}\n" for stack, count in counts.most_common())
+        os.replace(path + ".tmp", path)
+
+
+profiler = SamplingProfiler()
+
+
+def start_run(seconds: float, interval_ms: float):
+    """Start a profiling run here and, through the notifier, in every other worker"""
+    run_id = uuid.uuid4().hex[:16]
+    if not profiler.start(run_id, seconds, interval_ms):
+        return None
+    now = time.time()
+    run = {
+        "run_id": run_id,
+        "seconds": seconds,
+        "interval_ms": interval_ms,
+        "workers": cluster.WORKERS,
+        "started_at": now,
+        "ends_at": now + seconds,
+    }
+    directory = os.path.join(profiler.directory, run_id)
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, "run.json"), "w") as f:
+        json.dump(run, f)
+    cluster.notifier.publish("profiler", run)
+    return run
+
+
+def apply_runs(runs):
+    """Notification handler: join profiling runs started in another worker"""
+    for run in runs:
+        remaining = run["ends_at"] - time.time()
+        if remaining > 0:
+            profiler.start(run["run_id"], remaining, run["interval_ms"])
+
+
+def load_run(run_id: str):
+    try:
+        with open(os.path.join(profiler.directory, os.path.basename(run_id), "run.json")) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def seconds_remaining(run):
+    """Time until every worker has written its samples, with a second of slack"""
+    return max(0.0, run["ends_at"] + 1 - time.time())
+
+
+def collapsed_stacks(run_id: str):
+    """Samples from every worker that took part in the run, merged"""
+    directory = os.path.join(profiler.directory, os.path.basename(run_id))
+    counts = Counter()
+    for name in sorted(os.listdir(directory)):
+        if not name.endswith(".folded"):
+            continue
+        with open(os.path.join(directory, name)) as f:
+            for line in f:
+                stack, _, count = line.rstrip("\n").rpartition(" ")
+                counts[stack] += int(count)
+    return "".join(f"{stack} {count}\n" for stack, count in counts.most_common())
+
+
+# Request traces
+
+current_trace = ContextVar("current_trace", default=None)
+
+
+class Trace:
+    def __init__(self, method: str, path: str):
+        self.id = uuid.uuid4().hex
+        self.method = method
+        self.path = path
+        self.started_at = datetime.utcnow()
+        self.status = None
+        self.marks = {"start": time.perf_counter()}
+        self.statements = []
+        self.closed = False
+
+    def mark(self, name: str):
+        self.marks[name] = time.perf_counter()
+
+    def _between(self, start: str, end: str):
+        if start in self.marks and end in self.marks:
+            return round((self.marks[end] - self.marks[start]) * 1000, 3)
+        return None
+
+    def server_timing(self):
+        sql_ms = sum(s["duration_ms"] for s in self.statements)
+        parts = [
+            ("deps", self._between("route_start", "endpoint_start")),
+            ("handler", self._between("endpoint_start", "endpoint_end")),
+            ("serialize", self._between("endpoint_end", "route_end")),
+        ]
+        header = ", ".join(f"{name};dur={ms}" for name, ms in parts if ms is not None)
+        sql = f'sql;dur={round(sql_ms, 3)};desc="{len(self.statements)} statements"'
+        return f"{header}, {sql}" if header else sql
+
+    def report(self):
+        return {
+            "id": self.id,
+            "method": self.method,
+            "path": self.path,
+            "status": self.status,
+            "started_at": self.started_at.isoformat(),
+            "total_ms": self._between("start", "end"),
+            "dependencies_ms": self._between("route_start", "endpoint_start"),
+            "handler_ms": self._between("endpoint_start", "endpoint_end"),
+            "serialization_ms": self._between("endpoint_end", "route_end"),
+            "send_ms": self._between("route_end", "end"),
+            "sql_ms": round(sum(s["duration_ms"] for s in self.statements), 3),
+            "sql": self.statements,
+        }
+
+    def save(self, directory=TRACE_DIR):
+        os.makedirs(directory, exist_ok=True)
+        with open(os.path.join(directory, f"{self.id}.json"), "w") as f:
+            json.dump(self.report(), f)
+        names = [n for n in os.listdir(directory) if n.endswith(".json")]
+        if len(names) > MAX_TRACES:
+            paths = sorted((os.path.join(directory, n) for n in names), key=os.path.getmtime)
+            for path in paths[:len(names) - MAX_TRACES]:
+                try:
+                    os.unlink(path)
+                except FileNotFoundError:
+                    pass
+
+
+def load_trace(trace_id: str, directory=TRACE_DIR):
+    try:
+        with open(os.path.join(directory, f"{os.path.basename(trace_id)}.json")) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+class _CountingCursor:
+    """DB-API cursor proxy counting the rows a traced SELECT returns"""
+
+    def __init__(self, cursor, statement):
+        self._cursor = cursor
+        self._statement = statement
+
+    def fetchone(self):
+        row = self._cursor.fetchone()
+        if row is not None:
+            self._statement["rows"] += 1
+        return row
+
+    def fetchmany(self, *args):
+        rows = self._cursor.fetchmany(*args)
+        self._statement["rows"] += len(rows)
+        return rows
+
+    def fetchall(self):
+        rows = self._cursor.fetchall()
+        self._statement["rows"] += len(rows)
+        return rows
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if current_trace.get() is not None:
+        conn.info.setdefault("trace_started", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    trace = current_trace.get()
+    if trace is None or not conn.info.get("trace_started"):
+        return
+    duration = time.perf_counter() - conn.info["trace_started"].pop()
+    if trace.closed:
+        return
+    entry = {
+        "statement": statement[:MAX_TRACED_STATEMENT_CHARS],
+        "duration_ms": round(duration * 1000, 3),
+        "rows": 0 if cursor.description is not None else cursor.rowcount,
+    }
+    trace.statements.append(entry)
+    if cursor.description is not None and context is not None:
+        context.cursor = _CountingCursor(cursor, entry)
+
+
+for _engine in (database.engine, database.read_engine):
+    event.listen(_engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(_engine, "after_cursor_execute", _after_cursor_execute)
+
+
+def _timed_endpoint(call):
+    """Wrap an endpoint so traced requests record when it starts and returns"""
+    if asyncio.iscoroutinefunction(call):
+        @wraps(call)
+        async def timed(*args, **kwargs):
+            trace = current_trace.get()
+            if trace is None:
+                return await call(*args, **kwargs)
+            trace.mark("endpoint_start")
+            try:
+                return await call(*args, **kwargs)
+            finally:
+                trace.mark("endpoint_end")
+    else:
+        @wraps(call)
+        def timed(*args, **kwargs):
+            trace = current_trace.get()
+            if trace is None:
+                return call(*args, **kwargs)
+            trace.mark("endpoint_start")
+            try:
+                return call(*args, **kwargs)
+            finally:
+                trace.mark("endpoint_end")
+    return timed
+
+
+class TracedRoute(APIRoute):
+    """Route class splitting traced requests into dependency, handler and serialization time"""
+
+    def get_route_handler(self):
+        self.dependant.call = _timed_endpoint(self.dependant.call)
+        handler = super().get_route_handler()
+
+        async def traced_handler(request):
+            trace = current_trace.get()
+            if trace is None:
+                return await handler(request)
+            trace.mark("route_start")
+            response = await handler(request)
+            trace.mark("route_end")
+            return response
+
+        return traced_handler
+
+
+def _is_admin(authorization: str):
+    scheme, _, token = (authorization or "").partition(" ")
+    if scheme.lower() != "bearer":
+        return False
+    user_id = auth.decode_user_id(token)
+    if user_id is None:
+        return False
+    db = database.ReadSessionLocal()
+    try:
+        role = db.query(models.User.role).filter(models.User.id == user_id).scalar()
+    finally:
+        db.close()
+    return role == models.UserRole.ADMIN
+
+
+class TraceMiddleware:
+    """Trace requests from admins that send an X-Trace header
+
+    The response carries a Server-Timing summary and an X-Trace-Id; the
+    full trace, with every SQL statement, is kept in TRACE_DIR and served
+    by GET /admin/traces/{id}. The header is ignored for anyone else.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not any(name == TRACE_HEADER for name, _ in scope["headers"]):
+            await self.app(scope, receive, send)
+            return
+        headers = Headers(scope=scope)
+        if headers.get("x-trace", "0") in ("", "0") or not await run_in_threadpool(_is_admin, headers.get("authorization")):
+            await self.app(scope, receive, send)
+            return
+
+        trace = Trace(scope["method"], scope["path"])
+        token = current_trace.set(trace)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                trace.status = message["status"]
+                response_headers = MutableHeaders(scope=message)
+                response_headers["Server-Timing"] = trace.server_timing()
+                response_headers["X-Trace-Id"] = trace.id
+            elif message["type"] == "http.response.body" and not message.get("more_body", False):
+                # Background tasks run after this and are not part of the request
+                trace.mark("end")
+                trace.closed = True
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            current_trace.reset(token)
+            if not trace.closed:
+                trace.mark("end")
+                trace.closed = True
+            await run_in_threadpool(trace.save)
@@ -0,0 +1,261 @@
+import math
+import os
+import sqlite3
+import threading
+import time
+from contextvars import ContextVar
+
+from fastapi import Depends, HTTPException, Request, status
+from sqlalchemy import event
+from starlette.concurrency import run_in_threadpool
+
+import database
+
+# "memory" keeps buckets per process; a file path shares them between
+# processes through a small SQLite database
+RATE_LIMIT_STORE = os.getenv("RATE_LIMIT_STORE", "memory")
+TRUST_PROXY_HEADERS = os.getenv("TRUST_PROXY_HEADERS", "0") in ("1", "true", "True")
+
+# Shed write traffic while the smoothed DB statement latency is above this
+DB_LATENCY_SHED_MS = float(os.getenv("DB_LATENCY_SHED_MS", "250"))
+# Without new samples the average halves every this many seconds
+DB_LATENCY_HALF_LIFE = float(os.getenv("DB_LATENCY_HALF_LIFE", "5"))
+SHED_RETRY_AFTER = 5
+
+
+class Rate:
+    """Token bucket refilled at `count` tokens per `seconds`, holding up to `burst`"""
+
+    def __init__(self, count: int, seconds: float, burst: int = None):
+        self.per_second = count / seconds
+        self.burst = burst or count
+
+
+class MemoryBucketStore:
+    MAX_KEYS = 100_000
+    blocking = False
+
+    def __init__(self):
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def consume(self, key: str, rate: Rate, cost: float = 1.0):
+        """Take `cost` tokens; returns seconds to wait, 0 when allowed"""
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.get(key, (rate.burst, now))
+            tokens = min(rate.burst, tokens + (now - updated) * rate.per_second)
+            if tokens >= cost:
+                self._buckets[key] = (tokens - cost, now)
+                if len(self._buckets) > self.MAX_KEYS:
+                    self._evict(now, rate)
+                return 0.0
+            self._buckets[key] = (tokens, now)
+            return (cost - tokens) / rate.per_second
+
+    def _evict(self, now, rate):
+        # Buckets that have refilled completely carry no state worth keeping
+        full_after = rate.burst / rate.per_second
+        self._buckets = {
+            key: value for key, value in self._buckets.items()
+            if now - value[1] < full_after
+        }
+
+
+class SQLiteBucketStore:
+    """Buckets shared by every worker process that points at the same file
+
+    consume() may wait on the file lock, so callers on the event loop run
+    it in the threadpool.
+    """
+
+    blocking = True
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        # SQLite connections must not be shared with forked workers
+        os.register_at_fork(after_in_child=self._reset)
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS buckets "
+                "(key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL)"
+            )
+
+    def _reset(self):
+        self._local = threading.local()
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=1.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def consume(self, key: str, rate: Rate, cost: float = 1.0):
+        # Wall clock, since monotonic clocks are not comparable across processes
+        now = time.time()
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT tokens, updated FROM buckets WHERE key = ?", (key,)).fetchone()
+            tokens, updated = row if row else (rate.burst, now)
+            tokens = min(rate.burst, tokens + max(0.0, now - updated) * rate.per_second)
+            wait = 0.0 if tokens >= cost else (cost - tokens) / rate.per_second
+            if not wait:
+                tokens -= cost
+            conn.execute(
+                "INSERT OR REPLACE INTO buckets (key, tokens, updated) VALUES (?, ?, ?)",
+                (key, tokens, now),
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return wait
+
+
+def create_store(spec: str = RATE_LIMIT_STORE):
+    if spec == "memory":
+        return MemoryBucketStore()
+    return SQLiteBucketStore(spec)
+
+
+store = create_store()
+
+
+# Set for requests that went through admission; statements from
+# background jobs (risk scoring, log flushes, compaction) are not sampled
+_request_path = ContextVar("admission_request_path", default=False)
+
+
+class DBLatencyMonitor:
+    """Time-decayed average of request-path statement latency on an engine
+
+    The average decays towards zero between samples, so a burst of slow
+    statements stops shedding load once it is over even when shedding
+    itself has stopped the statements that would have replaced it.
+    """
+
+    def __init__(self, engine, alpha: float = 0.1, half_life: float = DB_LATENCY_HALF_LIFE):
+        self.alpha = alpha
+        self.half_life = half_life
+        self._average_ms = 0.0
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+        event.listen(engine, "before_cursor_execute", self._before)
+        event.listen(engine, "after_cursor_execute", self._after)
+
+    def _decayed(self, now):
+        return self._average_ms * 0.5 ** ((now - self._updated) / self.half_life)
+
+    @property
+    def average_ms(self):
+        return self._decayed(time.monotonic())
+
+    def _before(self, conn, cursor, statement, parameters, context, executemany):
+        if _request_path.get():
+            conn.info["admission_started"] = time.perf_counter()
+
+    def _after(self, conn, cursor, statement, parameters, context, executemany):
+        started = conn.info.pop("admission_started", None)
+        if started is None:
+            return
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        now = time.monotonic()
+        with self._lock:
+            average = self._decayed(now)
+            self._average_ms = average + self.alpha * (elapsed_ms - average)
+            self._updated = now
+
+    def overloaded(self):
+        return self.average_ms > DB_LATENCY_SHED_MS
+
+
+db_latency = DBLatencyMonitor(database.engine)
+
+
+def client_ip(request: Request):
+    if TRUST_PROXY_HEADERS:
+        forwarded = request.headers.get("x-forwarded-for")
+        if forwarded:
+            return forwarded.split(",")[0].strip()
+    return request.client.host if request.client else "unknown"
+
+
+def _reject(status_code: int, detail: str, retry_after: float):
+    raise HTTPException(
+        status_code=status_code,
+        detail=detail,
+        headers={"Retry-After": str(max(1, math.ceil(retry_after)))},
+    )
+
+
+class Admission:
+    """Per-route admission control used as a FastAPI dependency
+
+    Checks, in order: DB load shedding, per-IP and per-user token buckets,
+    and a cap on requests concurrently inside the handler.
+    """
+
+    def __init__(self, name: str, per_ip: Rate = None, per_user: Rate = None,
+                 max_concurrent: int = None, shed_on_db_latency: bool = True):
+        self.name = name
+        self.per_ip = per_ip
+        self.per_user = per_user
+        self.max_concurrent = max_concurrent
+        self.shed_on_db_latency = shed_on_db_latency
+        self.in_flight = 0
+        self._lock = threading.Lock()
+
+    def acquire(self, request: Request, user_key: str = None):
+        if self.shed_on_db_latency and db_latency.overloaded():
+            _reject(status.HTTP_503_SERVICE_UNAVAILABLE, "Server is busy, please retry", SHED_RETRY_AFTER)
+
+        if self.per_ip:
+            wait = store.consume(f"{self.name}:ip:{client_ip(request)}", self.per_ip)
+            if wait:
+                _reject(status.HTTP_429_TOO_MANY_REQUESTS, "Too many requests", wait)
+        if self.per_user and user_key:
+            wait = store.consume(f"{self.name}:user:{user_key}", self.per_user)
+            if wait:
+                _reject(status.HTTP_429_TOO_MANY_REQUESTS, "Too many requests", wait)
+
+        if self.max_concurrent:
+            with self._lock:
+                if self.in_flight >= self.max_concurrent:
+                    _reject(status.HTTP_503_SERVICE_UNAVAILABLE, "Server is busy, please retry", 1)
+                self.in_flight += 1
+
+    def release(self):
+        if self.max_concurrent:
+            with self._lock:
+                self.in_flight -= 1
+
+    async def _admit(self, request: Request, user_key: str = None):
+        # DB latency is sampled from admitted requests only
+        _request_path.set(True)
+        if store.blocking:
+            await run_in_threadpool(self.acquire, request, user_key)
+        else:
+            self.acquire(request, user_key)
+
+    def dependency(self, user_key=None):
+        """Build a dependency; user_key is itself a dependency returning the per-user key"""
+        if user_key is None:
+            async def admit(request: Request):
+                await self._admit(request)
+                try:
+                    yield
+                finally:
+                    self.release()
+        else:
+            async def admit(request: Request, key: str = Depends(user_key)):
+                await self._admit(request, key)
+                try:
+                    yield
+                finally:
+                    self.release()
+        return admit
@@ -0,0 +1,322 @@
+import asyncio
+import heapq
+import logging
+import math
+import os
+import threading
+from collections import defaultdict
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+import database, models
+
+logger = logging.getLogger(__name__)
+
+# Number of neighbours kept per course in the precomputed index
+TOP_K = 20
+
+# Full recompute interval (seconds), catching up the neighbour lists that
+# incremental refreshes leave stale
+RECOMMENDATION_REBUILD_INTERVAL = int(os.getenv("RECOMMENDATION_REBUILD_INTERVAL", "21600"))
+
+# Implicit feedback weights: enrolling counts once, good grades count extra
+ENROLLMENT_WEIGHT = 1.0
+GRADE_WEIGHT = 1.0
+
+
+def load_interactions(db: Session):
+    """Return {(student_id, course_id): weight} from enrollments and graded submissions"""
+    weights = defaultdict(float)
+
+    for student_id, course_id in db.query(
+        models.Enrollment.student_id, models.Enrollment.course_id
+    ):
+        weights[(student_id, course_id)] += ENROLLMENT_WEIGHT
+
+    # Average normalised grade per (student, course), one aggregate query
+    graded = (
+        db.query(
+            models.AssignmentSubmission.student_id,
+            models.Assignment.course_id,
+            func.avg(models.AssignmentSubmission.grade / models.Assignment.total_points),
+        )
+        .join(models.Assignment, models.Assignment.id == models.AssignmentSubmission.assignment_id)
+        .filter(
+            models.AssignmentSubmission.grade != None,
+            models.Assignment.total_points > 0,
+        )
+        .group_by(models.AssignmentSubmission.student_id, models.Assignment.course_id)
+    )
+    for student_id, course_id, score in graded:
+        weights[(student_id, course_id)] += GRADE_WEIGHT * max(0.0, min(float(score or 0), 1.0))
+
+    return weights
+
+
+def top_k_neighbors(matrix, course_ids, columns=None, k=TOP_K):
+    """Cosine item-item similarity for the given course columns of a student x course matrix"""
+    import numpy as np
+    from scipy import sparse
+
+    matrix = matrix.tocsc()
+    norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=0)).ravel())
+    norms[norms == 0] = 1.0
+    normalized = matrix @ sparse.diags(1.0 / norms)
+
+    if columns is None:
+        columns = range(len(course_ids))
+
+    neighbors = {}
+    for col in columns:
+        scores = (normalized.T @ normalized[:, col]).toarray().ravel()
+        scores[col] = 0.0
+        candidates = np.flatnonzero(scores > 0)
+        if len(candidates) > k:
+            candidates = candidates[np.argpartition(-scores[candidates], k)[:k]]
+        candidates = candidates[np.argsort(-scores[candidates])]
+        neighbors[course_ids[col]] = [(course_ids[i], float(scores[i])) for i in candidates]
+    return neighbors
+
+
+class RecommendationIndex:
+    """In-memory top-K course neighbour index, backed by the course_neighbors table
+
+    Interactions are kept per course column so an enrollment only touches
+    the columns it changes. Rebuilds and refreshes are serialised by their
+    own lock and compute outside `_lock`, which recommend() only ever waits
+    on for the swap.
+    """
+
+    def __init__(self, k=TOP_K):
+        self.k = k
+        self.neighbors = {}
+        self.popularity = []
+        self._columns = {}
+        self._squares = {}
+        self._student_courses = defaultdict(set)
+        self._pending = []
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+
+    @staticmethod
+    def _matrix(weights):
+        from scipy import sparse
+
+        students = {s: i for i, s in enumerate(sorted({s for s, _ in weights}))}
+        course_ids = sorted({c for _, c in weights})
+        courses = {c: i for i, c in enumerate(course_ids)}
+        rows, cols, data = [], [], []
+        for (student_id, course_id), weight in weights.items():
+            rows.append(students[student_id])
+            cols.append(courses[course_id])
+            data.append(weight)
+        matrix = sparse.csr_matrix(
+            (data, (rows, cols)), shape=(len(students), len(course_ids))
+        )
+        return matrix, course_ids
+
+    def _popularity(self):
+        return sorted(self._columns, key=lambda c: len(self._columns[c]), reverse=True)
+
+    def _similar(self, course_id):
+        """Cosine neighbours of one course, from the students it shares with others"""
+        dots = defaultdict(float)
+        for student_id, weight in self._columns[course_id].items():
+            for other_id in self._student_courses[student_id]:
+                if other_id != course_id:
+                    dots[other_id] += weight * self._columns[other_id][student_id]
+        norm = math.sqrt(self._squares[course_id]) or 1.0
+        scores = [
+            (other_id, dot / (norm * (math.sqrt(self._squares[other_id]) or 1.0)))
+            for other_id, dot in dots.items() if dot > 0
+        ]
+        return heapq.nlargest(self.k, scores, key=lambda item: item[1])
+
+    def _swap(self, db: Session, neighbors_from):
+        """Load interactions, get neighbours from neighbors_from(weights) and serve them
+
+        The index keeps serving its previous state while this runs; only
+        the swap happens under the lock.
+        """
+        with self._lock:
+            # Already committed, so the load below includes them
+            loaded_pending = len(self._pending)
+        weights = dict(load_interactions(db))
+        columns = defaultdict(dict)
+        squares = defaultdict(float)
+        student_courses = defaultdict(set)
+        for (student_id, course_id), weight in weights.items():
+            columns[course_id][student_id] = weight
+            squares[course_id] += weight * weight
+            student_courses[student_id].add(course_id)
+        neighbors = neighbors_from(weights)
+
+        self._columns = dict(columns)
+        self._squares = dict(squares)
+        popularity = self._popularity()
+        with self._lock:
+            self._student_courses = student_courses
+            self._pending = self._pending[loaded_pending:]
+            self.neighbors = neighbors
+            self.popularity = popularity
+        return neighbors
+
+    def _compute(self, weights):
+        if not weights:
+            return {}
+        matrix, course_ids = self._matrix(weights)
+        return top_k_neighbors(matrix, course_ids, k=self.k)
+
+    def rebuild(self, db: Session, persist: bool = True):
+        """Full batch recompute from the database"""
+        with self._refresh_lock:
+            neighbors = self._swap(db, self._compute)
+            if persist:
+                self._persist(db, neighbors, replace_all=True)
+
+    def load(self, db: Session):
+        """Serve the neighbours persisted by the last rebuild instead of recomputing them
+
+        Interactions are still read, for the students' courses and later
+        refreshes. Returns False, loading nothing, when no neighbours have
+        been persisted yet.
+        """
+        Neighbor = models.CourseNeighbor
+        with self._refresh_lock:
+            rows = db.query(Neighbor.course_id, Neighbor.neighbor_id, Neighbor.score).order_by(
+                Neighbor.course_id, Neighbor.score.desc()
+            ).all()
+            if not rows:
+                return False
+            persisted = defaultdict(list)
+            for course_id, neighbor_id, score in rows:
+                if len(persisted[course_id]) < self.k:
+                    persisted[course_id].append((neighbor_id, score))
+            self._swap(db, lambda weights: dict(persisted))
+            return True
+
+    def record_enrollment(self, student_id: str, course_id: str, remote: bool = False):
+        """Queue a new enrollment for the next incremental refresh"""
+        with self._lock:
+            self._pending.append((student_id, course_id, remote))
+
+    def refresh(self, db: Session):
+        """Apply queued enrollments, recomputing only the affected courses
+
+        Each affected course is rescored from the students it shares with
+        other courses, so the cost follows the size of its neighbourhood
+        rather than the whole interaction set. Only the enrolling student's
+        courses are rescored: other courses whose scores against them
+        changed keep their lists until the next periodic rebuild.
+
+        Neighbours are persisted only when a queued enrollment was made in
+        this process; for the others the originating worker already did it.
+        """
+        with self._refresh_lock:
+            with self._lock:
+                pending, self._pending = self._pending, []
+            if not pending:
+                return
+
+            affected = set()
+            for student_id, course_id, _ in pending:
+                column = self._columns.setdefault(course_id, {})
+                previous = column.get(student_id, 0.0)
+                column[student_id] = previous + ENROLLMENT_WEIGHT
+                self._squares[course_id] = (
+                    self._squares.get(course_id, 0.0) + column[student_id] ** 2 - previous ** 2
+                )
+                with self._lock:
+                    self._student_courses[student_id].add(course_id)
+                # Every course this student co-occurs with changes similarity
+                affected.update(self._student_courses[student_id])
+
+            updated = {course_id: self._similar(course_id) for course_id in affected}
+            popularity = self._popularity()
+            with self._lock:
+                self.neighbors.update(updated)
+                self.popularity = popularity
+            if not all(remote for _, _, remote in pending):
+                self._persist(db, updated)
+
+    def _persist(self, db: Session, neighbors, replace_all=False):
+        query = db.query(models.CourseNeighbor)
+        if not replace_all:
+            query = query.filter(models.CourseNeighbor.course_id.in_(list(neighbors)))
+        query.delete(synchronize_session=False)
+        db.bulk_insert_mappings(models.CourseNeighbor, [
+            {"course_id": course_id, "neighbor_id": neighbor_id, "score": score}
+            for course_id, items in neighbors.items()
+            for neighbor_id, score in items
+        ])
+        db.commit()
+
+    def recommend(self, student_id: str, limit: int = 10):
+        """Score unseen courses by summed similarity to the student's courses"""
+        with self._lock:
+            seen = set(self._student_courses.get(student_id, ()))
+            scores = defaultdict(float)
+            for course_id in seen:
+                for neighbor_id, score in self.neighbors.get(course_id, ()):
+                    if neighbor_id not in seen:
+                        scores[neighbor_id] += score
+            ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:limit]
+
+            # Cold start: top up with the most popular courses
+            if len(ranked) < limit:
+                taken = seen | {c for c, _ in ranked}
+                for course_id in self.popularity:
+                    if len(ranked) >= limit:
+                        break
+                    if course_id not in taken:
+                        ranked.append((course_id, 0.0))
+            return ranked
+
+
+index = RecommendationIndex()
+
+
+def refresh_index():
+    """Background task: fold queued enrollments into the index with its own session"""
+    db = database.SessionLocal()
+    try:
+        index.refresh(db)
+    finally:
+        db.close()
+
+
+def build_index(persist: bool = True):
+    """Startup: serve the persisted neighbours, computing them only if there are none"""
+    db = database.SessionLocal()
+    try:
+        if not index.load(db):
+            index.rebuild(db, persist=persist)
+    finally:
+        db.close()
+
+
+def rebuild_index(persist: bool = True):
+    db = database.SessionLocal()
+    try:
+        index.rebuild(db, persist=persist)
+    finally:
+        db.close()
+
+
+async def rebuild_loop(persist: bool = True, interval: int = RECOMMENDATION_REBUILD_INTERVAL):
+    """Periodically recompute the whole index off the event loop"""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await run_in_threadpool(rebuild_index, persist)
+        except Exception:
+            logger.exception("Recommendation index rebuild failed")
+
+
+def apply_enrollments(enrollments):
+    """Notification handler: fold enrollments made in other workers into this one's index"""
+    for enrollment in enrollments:
+        index.record_enrollment(enrollment["student_id"], enrollment["course_id"], remote=True)
+    refresh_index()
@@ -0,0 +1,44 @@
+"""Stand-in replicator for exercising read/write routing locally
+
+Keeps a replica SQLite file in sync with the primary by copying it with
+the online backup API every few seconds. Run it next to the API:
+
+    python replicator.py lms.db lms_replica.db --interval 1
+    SQLALCHEMY_READ_DATABASE_URL="sqlite:///file:./lms_replica.db?mode=ro&uri=true" uvicorn main:app
+
+Replication lag is up to one interval, which READ_YOUR_WRITES_SECONDS in
+database.py should cover.
+"""
+import argparse
+import sqlite3
+import time
+
+
+def replicate(primary_path: str, replica_path: str):
+    primary = sqlite3.connect(primary_path)
+    replica = sqlite3.connect(replica_path)
+    try:
+        primary.backup(replica)
+    finally:
+        replica.close()
+        primary.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("primary")
+    parser.add_argument("replica")
+    parser.add_argument("--interval", type=float, default=1.0, help="seconds between copies")
+    parser.add_argument("--once", action="store_true", help="copy once and exit")
+    args = parser.parse_args()
+
+    while True:
+        started = time.perf_counter()
+        replicate(args.primary, args.replica)
+        if args.once:
+            break
+        time.sleep(max(0.0, args.interval - (time.perf_counter() - started)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,203 @@
+import asyncio
+import logging
+import os
+from datetime import datetime
+
+from sqlalchemy import and_, func
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+import database, models
+
+logger = logging.getLogger(__name__)
+
+# How often the scheduled batch run fires (seconds)
+RISK_SCORING_INTERVAL = int(os.getenv("RISK_SCORING_INTERVAL", "3600"))
+
+# Feature weights for the linear risk score, summing to 1. Grade and
+# progress only count for students who have them; the score is the
+# weighted mean of the features that are known.
+OVERDUE_WEIGHT = 0.4
+GRADE_WEIGHT = 0.3
+PROGRESS_WEIGHT = 0.15
+INACTIVITY_WEIGHT = 0.15
+
+# Inactivity saturates after this many days without a submission
+INACTIVITY_CAP_DAYS = 30.0
+
+HIGH_RISK_THRESHOLD = 0.6
+MEDIUM_RISK_THRESHOLD = 0.35
+
+
+def compute_features(db: Session, now: datetime):
+    """Per-student risk features with one grouped query per feature"""
+    import numpy as np
+
+    Enrollment = models.Enrollment
+    Assignment = models.Assignment
+    Submission = models.AssignmentSubmission
+
+    students = db.query(
+        Enrollment.student_id,
+        func.count(Enrollment.id),
+        func.avg(Enrollment.progress),
+        func.max(Enrollment.progress),
+        func.min(Enrollment.enrolled_at),
+    ).group_by(Enrollment.student_id).all()
+    if not students:
+        return None
+
+    # Assignments past due in the student's courses, and how many have no submission
+    due = (
+        db.query(
+            Enrollment.student_id,
+            func.count(func.distinct(Assignment.id)),
+            func.count(func.distinct(Assignment.id)) - func.count(func.distinct(Submission.assignment_id)),
+        )
+        .join(Assignment, Assignment.course_id == Enrollment.course_id)
+        .outerjoin(Submission, and_(
+            Submission.assignment_id == Assignment.id,
+            Submission.student_id == Enrollment.student_id,
+        ))
+        .filter(Assignment.due_date < now)
+        .group_by(Enrollment.student_id)
+    )
+    due = {student_id: (total, missing) for student_id, total, missing in due}
+
+    grades = (
+        db.query(Submission.student_id, func.avg(Submission.grade / Assignment.total_points))
+        .join(Assignment, Assignment.id == Submission.assignment_id)
+        .filter(Submission.grade != None, Assignment.total_points > 0)
+        .group_by(Submission.student_id)
+    )
+    grades = dict(grades.all())
+
+    last_submitted = dict(
+        db.query(Submission.student_id, func.max(Submission.submitted_at))
+        .group_by(Submission.student_id)
+        .all()
+    )
+
+    n = len(students)
+    features = {
+        "student_id": [row[0] for row in students],
+        "enrolled_courses": np.fromiter((row[1] for row in students), dtype=np.int64, count=n),
+        "average_progress": np.fromiter((row[2] or 0.0 for row in students), dtype=float, count=n),
+        # Progress defaults to 0 and is not tracked everywhere; all zeros means unknown
+        "progress_recorded": np.fromiter(((row[3] or 0.0) > 0 for row in students), dtype=bool, count=n),
+        "due_assignments": np.zeros(n, dtype=np.int64),
+        "overdue_assignments": np.zeros(n, dtype=np.int64),
+        "average_grade": np.full(n, np.nan),
+        "days_inactive": np.zeros(n),
+    }
+    for i, (student_id, _, _, _, first_enrolled) in enumerate(students):
+        if student_id in due:
+            features["due_assignments"][i], features["overdue_assignments"][i] = due[student_id]
+        if student_id in grades and grades[student_id] is not None:
+            features["average_grade"][i] = grades[student_id]
+        last_active = last_submitted.get(student_id) or first_enrolled or now
+        features["days_inactive"][i] = (now - last_active).total_seconds() / 86400
+    return features
+
+
+def score(features):
+    """Vectorized linear risk score in [0, 1]
+
+    Students without grades or recorded progress are scored on the
+    remaining features, reweighted to sum to 1, rather than being given
+    a neutral or worst-case value for what is missing.
+    """
+    import numpy as np
+
+    due = features["due_assignments"]
+    overdue_ratio = np.divide(
+        features["overdue_assignments"], due,
+        out=np.zeros(len(due)), where=due > 0,
+    )
+    graded = ~np.isnan(features["average_grade"])
+    grade_deficit = 1.0 - np.clip(np.nan_to_num(features["average_grade"], nan=1.0), 0.0, 1.0)
+    progress_recorded = features["progress_recorded"]
+    progress_deficit = np.where(
+        progress_recorded, 1.0 - np.clip(features["average_progress"] / 100.0, 0.0, 1.0), 0.0
+    )
+    inactivity = np.clip(features["days_inactive"] / INACTIVITY_CAP_DAYS, 0.0, 1.0)
+
+    weights = (
+        OVERDUE_WEIGHT + INACTIVITY_WEIGHT
+        + GRADE_WEIGHT * graded
+        + PROGRESS_WEIGHT * progress_recorded
+    )
+    return (
+        OVERDUE_WEIGHT * overdue_ratio
+        + GRADE_WEIGHT * grade_deficit
+        + PROGRESS_WEIGHT * progress_deficit
+        + INACTIVITY_WEIGHT * inactivity
+    ) / weights
+
+
+def risk_levels(scores):
+    import numpy as np
+
+    return np.where(
+        scores >= HIGH_RISK_THRESHOLD, "high",
+        np.where(scores >= MEDIUM_RISK_THRESHOLD, "medium", "low"),
+    )
+
+
+def run_batch(db: Session):
+    """Score every enrolled student and replace the student_risk_scores table"""
+    import numpy as np
+
+    now = datetime.utcnow()
+    features = compute_features(db, now)
+
+    db.query(models.StudentRiskScore).delete(synchronize_session=False)
+    if features is None:
+        db.commit()
+        return 0
+
+    scores = score(features)
+    levels = risk_levels(scores)
+    grades = features["average_grade"]
+    db.bulk_insert_mappings(models.StudentRiskScore, [
+        {
+            "student_id": student_id,
+            "enrolled_courses": int(features["enrolled_courses"][i]),
+            "due_assignments": int(features["due_assignments"][i]),
+            "overdue_assignments": int(features["overdue_assignments"][i]),
+            "average_grade": None if np.isnan(grades[i]) else float(grades[i]),
+            "average_progress": float(features["average_progress"][i]),
+            "days_inactive": float(features["days_inactive"][i]),
+            "risk_score": float(scores[i]),
+            "risk_level": str(levels[i]),
+            "scored_at": now,
+        }
+        for i, student_id in enumerate(features["student_id"])
+    ])
+    db.commit()
+    return len(scores)
+
+
+def run_scheduled_batch():
+    db = database.SessionLocal()
+    try:
+        return run_batch(db)
+    finally:
+        db.close()
+
+
+async def scoring_loop(interval: int = RISK_SCORING_INTERVAL):
+    """Periodically re-run the batch off the event loop"""
+    while True:
+        try:
+            await run_in_threadpool(run_scheduled_batch)
+        except Exception:
+            logger.exception("Risk scoring run failed")
+        await asyncio.sleep(interval)
+
+
+if __name__ == "__main__":
+    import migrate
+
+    migrate.migrate()
+    print(f"Scored {run_scheduled_batch()} students")
@@ -0,0 +1,201 @@
+import asyncio
+import logging
+import os
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import and_, func, or_
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+import database, models
+
+logger = logging.getLogger(__name__)
+
+# Hourly rows older than this are folded into one row per course and day
+HOURLY_RETENTION_DAYS = int(os.getenv("ROLLUP_HOURLY_RETENTION_DAYS", "2"))
+ROLLUP_COMPACTION_INTERVAL = int(os.getenv("ROLLUP_COMPACTION_INTERVAL", "3600"))
+
+COUNTERS = ("enrollments", "submissions", "graded", "grade_total", "assignments_due")
+
+
+def hour_bucket(at: datetime):
+    return at.replace(minute=0, second=0, microsecond=0)
+
+
+def day_bucket(at: datetime):
+    return at.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def since(at: datetime):
+    """Filter for rows from `at` on: hourly rows from its hour, daily rows from its day
+
+    Daily rows cover whole days, so a window reaching past the hourly
+    retention includes all of the day it starts in.
+    """
+    Activity = models.CourseActivity
+    return or_(
+        and_(Activity.period == "hour", Activity.bucket >= hour_bucket(at)),
+        and_(Activity.period == "day", Activity.bucket >= day_bucket(at)),
+    )
+
+
+def _add(db: Session, period: str, changes):
+    """Upsert counter increments keyed by (course_id, bucket)"""
+    if not changes:
+        return
+    Activity = models.CourseActivity
+    stmt = insert(Activity)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[Activity.course_id, Activity.period, Activity.bucket],
+        set_={name: getattr(Activity, name) + getattr(stmt.excluded, name) for name in COUNTERS},
+    )
+    db.execute(stmt, [
+        {"course_id": course_id, "period": period, "bucket": bucket, **counts}
+        for (course_id, bucket), counts in changes.items()
+    ])
+
+
+def record_many(db: Session, events):
+    """Add (course_id, time, counts) events to the hourly rollups
+
+    Runs in the caller's transaction, so the counters commit or roll back
+    together with the write they describe.
+    """
+    changes = defaultdict(lambda: dict.fromkeys(COUNTERS, 0))
+    for course_id, at, counts in events:
+        totals = changes[(course_id, hour_bucket(at))]
+        for name, value in counts.items():
+            totals[name] += value
+    _add(db, "hour", changes)
+
+
+def record(db: Session, course_id: str, at: datetime = None, **counts):
+    record_many(db, [(course_id, at or datetime.utcnow(), counts)])
+
+
+def compact(db: Session, now: datetime = None):
+    """Fold hourly rows from before the retention window into daily rows"""
+    Activity = models.CourseActivity
+    cutoff = day_bucket((now or datetime.utcnow()) - timedelta(days=HOURLY_RETENTION_DAYS))
+    old_hours = [Activity.period == "hour", Activity.bucket < cutoff]
+    rows = db.query(
+        Activity.course_id,
+        func.date(Activity.bucket),
+        *(func.sum(getattr(Activity, name)) for name in COUNTERS)
+    ).filter(*old_hours).group_by(Activity.course_id, func.date(Activity.bucket)).all()
+
+    changes = {
+        (course_id, datetime.fromisoformat(day)): dict(zip(COUNTERS, sums))
+        for course_id, day, *sums in rows
+    }
+    _add(db, "day", changes)
+    db.query(Activity).filter(*old_hours).delete(synchronize_session=False)
+    db.commit()
+    return len(changes)
+
+
+def rebuild(db: Session):
+    """Recompute every rollup from the source tables
+
+    Grades are counted in the hour they were first given. Those given
+    before graded_at existed fall back to the hour of the submission.
+    """
+    Submission = models.AssignmentSubmission
+    Assignment = models.Assignment
+    hour = lambda column: func.strftime("%Y-%m-%d %H:00:00", column)
+
+    events = []
+    enrollments = db.query(
+        models.Enrollment.course_id, hour(models.Enrollment.enrolled_at), func.count()
+    ).filter(models.Enrollment.enrolled_at != None).group_by(
+        models.Enrollment.course_id, hour(models.Enrollment.enrolled_at)
+    )
+    for course_id, bucket, count in enrollments:
+        events.append((course_id, datetime.fromisoformat(bucket), {"enrollments": count}))
+
+    submissions = db.query(
+        Assignment.course_id, hour(Submission.submitted_at), func.count()
+    ).join(Assignment, Assignment.id == Submission.assignment_id).filter(
+        Submission.submitted_at != None
+    ).group_by(Assignment.course_id, hour(Submission.submitted_at))
+    for course_id, bucket, count in submissions:
+        events.append((course_id, datetime.fromisoformat(bucket), {"submissions": count}))
+
+    graded_at = func.coalesce(Submission.graded_at, Submission.submitted_at)
+    grades = db.query(
+        Assignment.course_id, hour(graded_at), func.count(), func.sum(Submission.grade)
+    ).join(Assignment, Assignment.id == Submission.assignment_id).filter(
+        Submission.grade != None, graded_at != None
+    ).group_by(Assignment.course_id, hour(graded_at))
+    for course_id, bucket, graded, grade_total in grades:
+        events.append((course_id, datetime.fromisoformat(bucket), {
+            "graded": graded, "grade_total": grade_total,
+        }))
+
+    due = db.query(
+        Assignment.course_id, hour(Assignment.due_date), func.count()
+    ).filter(Assignment.due_date != None).group_by(Assignment.course_id, hour(Assignment.due_date))
+    for course_id, bucket, count in due:
+        events.append((course_id, datetime.fromisoformat(bucket), {"assignments_due": count}))
+
+    db.query(models.CourseActivity).delete(synchronize_session=False)
+    record_many(db, events)
+    db.commit()
+    return compact(db)
+
+
+def daily(db: Session, days: int, course_id: str = None, today: date = None):
+    """Per-day counters for the last `days` days including today, zero-filled"""
+    Activity = models.CourseActivity
+    today = today or datetime.utcnow().date()
+    start = today - timedelta(days=days - 1)
+    query = db.query(
+        func.date(Activity.bucket),
+        func.sum(Activity.enrollments),
+        func.sum(Activity.submissions),
+        func.sum(Activity.graded),
+    ).filter(
+        Activity.bucket >= datetime.combine(start, datetime.min.time()),
+        Activity.bucket < datetime.combine(today + timedelta(days=1), datetime.min.time()),
+    )
+    if course_id is not None:
+        query = query.filter(Activity.course_id == course_id)
+    totals = {
+        date.fromisoformat(day): (enrollments, submissions, graded)
+        for day, enrollments, submissions, graded in query.group_by(func.date(Activity.bucket))
+    }
+    return [
+        (start + timedelta(days=i),) + totals.get(start + timedelta(days=i), (0, 0, 0))
+        for i in range(days)
+    ]
+
+
+def run_scheduled_compaction():
+    db = database.SessionLocal()
+    try:
+        return compact(db)
+    finally:
+        db.close()
+
+
+async def compaction_loop(interval: int = ROLLUP_COMPACTION_INTERVAL):
+    """Periodically compact old hourly rows off the event loop"""
+    while True:
+        try:
+            await run_in_threadpool(run_scheduled_compaction)
+        except Exception:
+            logger.exception("Rollup compaction failed")
+        await asyncio.sleep(interval)
+
+
+if __name__ == "__main__":
+    import migrate
+
+    migrate.migrate()
+    db = database.SessionLocal()
+    try:
+        print(f"Rebuilt rollups, {rebuild(db)} course-days compacted")
+    finally:
+        db.close()
@@ -0,0 +1,117 @@
+import heapq
+from datetime import datetime, timezone
+
+from sqlalchemy.orm import Session
+
+import models
+
+# Rows fetched per round trip from each per-course stream
+STREAM_BATCH_SIZE = 100
+
+# RFC 5545 3.1: content lines are folded at 75 octets
+ICAL_LINE_OCTETS = 75
+
+
+def naive_utc(value: datetime):
+    """Timezone-aware datetimes converted to the naive UTC stored in the database"""
+    if value is None or value.tzinfo is None:
+        return value
+    return value.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def _lesson_stream(db: Session, course_id: str, start: datetime, end: datetime):
+    # Range scan on ix_lessons_course_id_scheduled_time, already in time order
+    rows = db.query(
+        models.Lesson.id, models.Lesson.title, models.Lesson.scheduled_time
+    ).filter(
+        models.Lesson.course_id == course_id,
+        models.Lesson.scheduled_time >= start,
+        models.Lesson.scheduled_time < end
+    ).order_by(models.Lesson.scheduled_time).yield_per(STREAM_BATCH_SIZE)
+    for lesson_id, title, scheduled_time in rows:
+        yield scheduled_time, "lesson", lesson_id, title, course_id
+
+
+def _assignment_stream(db: Session, course_id: str, start: datetime, end: datetime):
+    # Range scan on ix_assignments_course_id_due_date, already in time order
+    rows = db.query(
+        models.Assignment.id, models.Assignment.title, models.Assignment.due_date
+    ).filter(
+        models.Assignment.course_id == course_id,
+        models.Assignment.due_date >= start,
+        models.Assignment.due_date < end
+    ).order_by(models.Assignment.due_date).yield_per(STREAM_BATCH_SIZE)
+    for assignment_id, title, due_date in rows:
+        yield due_date, "assignment", assignment_id, title, course_id
+
+
+def iter_events(db: Session, course_ids, start: datetime, end: datetime):
+    """Lessons and assignment due dates in [start, end), merged in time order
+
+    Each course contributes two index-ordered streams; heapq.merge does a
+    k-way merge so nothing is materialised and re-sorted in Python.
+    """
+    streams = []
+    for course_id in course_ids:
+        streams.append(_lesson_stream(db, course_id, start, end))
+        streams.append(_assignment_stream(db, course_id, start, end))
+    return heapq.merge(*streams, key=lambda event: event[0])
+
+
+def _ical_escape(text):
+    return (
+        (text or "")
+        .replace("\\", "\\\\")
+        .replace(";", "\\;")
+        .replace(",", "\\,")
+        .replace("\n", "\\n")
+    )
+
+
+def _ical_fold(line: str):
+    """Split a content line into CRLF-joinable pieces of at most 75 octets
+
+    Continuation lines start with a space, and multi-byte UTF-8 characters
+    are never split.
+    """
+    pieces = []
+    current, size = [], 0
+    for char in line:
+        octets = len(char.encode("utf-8"))
+        if size + octets > ICAL_LINE_OCTETS:
+            pieces.append("".join(current))
+            current, size = [" "], 1
+        current.append(char)
+        size += octets
+    pieces.append("".join(current))
+    return pieces
+
+
+def _ical_time(value: datetime):
+    return value.strftime("%Y%m%dT%H%M%SZ")
+
+
+def to_ical(events, course_titles, calendar_name="E-Mentoring"):
+    """Render calendar events (as produced by iter_events) as an iCalendar feed"""
+    stamp = _ical_time(datetime.utcnow())
+    lines = [
+        "BEGIN:VCALENDAR",
+        "VERSION:2.0",
+        "PRODID:-//e-mentoring//lms calendar//EN",
+        "CALSCALE:GREGORIAN",
+        f"X-WR-CALNAME:{_ical_escape(calendar_name)}",
+    ]
+    for when, kind, item_id, title, course_id in events:
+        summary = title if kind == "lesson" else f"Due: {title}"
+        lines += [
+            "BEGIN:VEVENT",
+            f"UID:{kind}-{item_id}@e-mentoring",
+            f"DTSTAMP:{stamp}",
+            f"DTSTART:{_ical_time(when)}",
+            f"SUMMARY:{_ical_escape(summary)}",
+            f"DESCRIPTION:{_ical_escape(course_titles.get(course_id, ''))}",
+            f"CATEGORIES:{kind.upper()}",
+            "END:VEVENT",
+        ]
+    lines.append("END:VCALENDAR")
+    return "".join(piece + "\r\n" for line in lines for piece in _ical_fold(line))
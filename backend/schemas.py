@@ -0,0 +1,337 @@
+from datetime import date, datetime
+from typing import List, Optional
+
+from pydantic import BaseModel, ConfigDict
+
+import models
+
+
+def from_rows(model, rows):
+    """Build response models straight from query row tuples, without ORM objects
+
+    FastAPI still dumps and re-validates them against the route's
+    response_model; validating plain row mappings here is cheap enough.
+    """
+    validate = model.model_validate
+    return [validate(row._mapping) for row in rows]
+
+
+class ORMModel(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+
+# Requests
+
+class UserCreate(BaseModel):
+    email: str
+    password: str
+    role: models.UserRole
+    first_name: str
+    last_name: str
+
+class EnrollmentCreate(BaseModel):
+    course_id: str
+
+
+# Auth and users
+
+class TokenResponse(BaseModel):
+    access_token: str
+    token_type: str
+    role: models.UserRole
+
+class UserResponse(ORMModel):
+    id: str
+    email: str
+    role: models.UserRole
+    first_name: str
+    last_name: str
+    created_at: datetime
+
+class MessageResponse(BaseModel):
+    message: str
+
+
+# Courses and enrollments
+
+class CourseResponse(ORMModel):
+    id: str
+    title: Optional[str] = None
+    description: Optional[str] = None
+    image_url: Optional[str] = None
+    duration: Optional[str] = None
+    level: Optional[str] = None
+    created_at: Optional[datetime] = None
+    admin_id: Optional[str] = None
+
+class EnrollmentResponse(ORMModel):
+    id: str
+    student_id: str
+    course_id: str
+    enrolled_at: Optional[datetime] = None
+    progress: Optional[float] = None
+
+class EnrolledCourse(BaseModel):
+    enrollment_id: str
+    course_id: str
+    title: Optional[str] = None
+    description: Optional[str] = None
+    image_url: Optional[str] = None
+    duration: Optional[str] = None
+    level: Optional[str] = None
+    enrolled_at: Optional[datetime] = None
+
+class RecommendedCourse(BaseModel):
+    course_id: str
+    title: Optional[str] = None
+    description: Optional[str] = None
+    image_url: Optional[str] = None
+    duration: Optional[str] = None
+    level: Optional[str] = None
+    score: float
+
+
+# Assignments
+
+class AssignmentResponse(ORMModel):
+    id: str
+    course_id: str
+    title: Optional[str] = None
+    description: Optional[str] = None
+    due_date: Optional[datetime] = None
+    total_points: Optional[int] = None
+
+class AdminAssignmentStats(BaseModel):
+    id: str
+    title: Optional[str] = None
+    description: Optional[str] = None
+    due_date: Optional[datetime] = None
+    total_points: Optional[int] = None
+    course_id: str
+    course_title: Optional[str] = None
+    total_submissions: int
+    graded_submissions: int
+    average_grade: float
+
+class AdminAssignmentSummary(BaseModel):
+    assignment_id: str
+    title: Optional[str] = None
+    description: Optional[str] = None
+    due_date: Optional[datetime] = None
+    total_points: Optional[int] = None
+    course_id: str
+    course_title: Optional[str] = None
+    submission_count: int
+    graded_count: int
+    status: str
+
+class StudentAssignment(BaseModel):
+    assignment_id: str
+    title: Optional[str] = None
+    description: Optional[str] = None
+    due_date: Optional[datetime] = None
+    total_points: Optional[int] = None
+    course_id: str
+    course_title: Optional[str] = None
+    status: str
+    submitted: Optional[bool] = None
+    submission_id: Optional[str] = None
+    grade: Optional[float] = None
+    feedback: Optional[str] = None
+
+class UpcomingAssignment(BaseModel):
+    assignment_id: str
+    title: Optional[str] = None
+    description: Optional[str] = None
+    due_date: Optional[datetime] = None
+    total_points: Optional[int] = None
+    course_id: str
+    course_title: Optional[str] = None
+    submitted: bool
+    submission_id: Optional[str] = None
+    grade: Optional[float] = None
+
+
+# Submissions
+
+class SubmissionReceipt(BaseModel):
+    id: str
+    assignment_id: str
+    student_id: str
+    submitted_at: datetime
+    content_ref: str
+    content_size: int
+    content_encoding: Optional[str] = None
+    content_type: str
+
+class SubmissionResponse(ORMModel):
+    id: str
+    assignment_id: str
+    student_id: str
+    submitted_at: Optional[datetime] = None
+    content: Optional[str] = None
+    content_ref: Optional[str] = None
+    content_size: Optional[int] = None
+    content_encoding: Optional[str] = None
+    content_type: Optional[str] = None
+    grade: Optional[float] = None
+    feedback: Optional[str] = None
+    graded_at: Optional[datetime] = None
+
+class SubmissionDetail(BaseModel):
+    submission_id: str
+    student_id: str
+    student_name: str
+    student_email: str
+    submitted_at: Optional[datetime] = None
+    content: Optional[str] = None
+    content_url: str
+    content_size: Optional[int] = None
+    grade: Optional[float] = None
+    feedback: Optional[str] = None
+    graded: bool
+
+class PendingSubmission(BaseModel):
+    assignment_id: str
+    submitted: bool
+    course_title: Optional[str] = None
+    assignment_title: Optional[str] = None
+    due_date: Optional[datetime] = None
+    total_points: Optional[int] = None
+    overdue: bool
+
+class StudentSubmission(BaseModel):
+    submission_id: str
+    assignment_id: str
+    submitted: bool
+    submitted_at: Optional[datetime] = None
+    content: Optional[str] = None
+    content_url: str
+    content_size: Optional[int] = None
+    grade: Optional[float] = None
+    feedback: Optional[str] = None
+    graded: bool
+    course_title: Optional[str] = None
+    assignment_title: Optional[str] = None
+    due_date: Optional[datetime] = None
+    total_points: Optional[int] = None
+
+class SimilarSubmission(BaseModel):
+    submission_id: str
+    student_id: str
+    student_name: str
+    student_email: str
+
+class SimilarPair(BaseModel):
+    similarity: float
+    submissions: List[SimilarSubmission]
+
+class SimilarityReport(BaseModel):
+    assignment_id: str
+    submissions_compared: int
+    threshold: float
+    pairs: List[SimilarPair]
+
+
+# Dashboards and schedules
+
+class CourseEnrollmentCount(BaseModel):
+    course_id: str
+    course_title: Optional[str] = None
+    enrollment_count: int
+
+class DashboardStats(BaseModel):
+    total_students: int
+    total_courses: int
+    total_enrollments: int
+    total_assignments: int
+    total_submissions: int
+    pending_submissions: int
+    upcoming_assignments: int
+    recent_enrollments: int
+    course_enrollments: List[CourseEnrollmentCount]
+
+class DailyActivity(BaseModel):
+    date: date
+    enrollments: int
+    submissions: int
+    graded: int
+
+class CalendarEvent(BaseModel):
+    type: str
+    id: str
+    title: Optional[str] = None
+    course_id: str
+    course_title: Optional[str] = None
+    time: datetime
+
+class AtRiskStudent(BaseModel):
+    student_id: str
+    student_name: str
+    student_email: str
+    risk_score: float
+    risk_level: str
+    enrolled_courses: int
+    due_assignments: int
+    overdue_assignments: int
+    average_grade: Optional[float] = None
+    average_progress: float
+    days_inactive: float
+    scored_at: datetime
+
+class AtRiskPage(BaseModel):
+    total: int
+    page: int
+    page_size: int
+    items: List[AtRiskStudent]
+
+
+# Operations
+
+class SubmissionLogStats(BaseModel):
+    worker: int
+    commits: int
+    failures: int
+    consecutive_failures: int
+    dead_lettered: int
+    last_error: Optional[str] = None
+    last_error_at: Optional[datetime] = None
+
+class CompressionRouteStats(BaseModel):
+    route: str
+    responses: int
+    compressed: int
+    cache_hits: int
+    bytes_in: int
+    bytes_out: int
+    bytes_saved: int
+    ratio: float
+    cpu_ms: float
+    cpu_us_per_compression: float
+
+class ProfilerRun(BaseModel):
+    run_id: str
+    seconds: float
+    interval_ms: float
+    workers: int
+    started_at: float
+    ends_at: float
+
+class TracedStatement(BaseModel):
+    statement: str
+    duration_ms: float
+    rows: int
+
+class RequestTrace(BaseModel):
+    id: str
+    method: str
+    path: str
+    status: Optional[int] = None
+    started_at: datetime
+    total_ms: Optional[float] = None
+    dependencies_ms: Optional[float] = None
+    handler_ms: Optional[float] = None
+    serialization_ms: Optional[float] = None
+    send_ms: Optional[float] = None
+    sql_ms: float
+    sql: List[TracedStatement]
@@ -0,0 +1,152 @@
+"""Serve the API from several worker processes
+
+    python serve.py --workers 4 --port 8000
+
+Workers default to WEB_CONCURRENCY, or the number of cores. The parent
+process imports the app, runs migrations, recovers every worker's
+submission log and binds the socket before forking, so workers start
+with the heavy imports already loaded and no schema work to race on.
+
+Per-worker state is kept consistent as follows:
+
+- rate limit buckets live in a shared SQLite file (RATE_LIMIT_STORE,
+  ./ratelimit.db unless set)
+- the recommendation index and the read-your-writes window are updated
+  from other workers' notifications (cluster.Notifier, NOTIFY_DB)
+- each worker appends to its own submission log and event log directory;
+  a submission is accepted by one worker only, through claims kept in
+  a shared SQLite file (SUBMISSION_CLAIMS_DB)
+- risk scoring and persisting the rebuilt recommendation index run in
+  worker 0 only
+- /admin/compression/stats reports the counters of whichever worker
+  answers; they are not aggregated
+
+Workers that exit unexpectedly are restarted. SIGINT or SIGTERM stops
+them all.
+"""
+import argparse
+import os
+import signal
+import socket
+import sys
+import time
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument(
+        "--workers", type=int,
+        default=int(os.getenv("WEB_CONCURRENCY", "0")) or os.cpu_count() or 1,
+    )
+    parser.add_argument("--log-level", default="info")
+    return parser.parse_args()
+
+
+def prepare(workers: int):
+    """Pre-fork initialization, done once in the parent"""
+    if workers > 1:
+        os.environ.setdefault("RATE_LIMIT_STORE", "./ratelimit.db")
+    import cluster, database, main, migrate, submission_log  # noqa: F401
+
+    migrate.migrate()
+    migrate.AUTO_CREATE_SCHEMA = False
+
+    # Flush records left by any previous run, whatever its worker count
+    root = submission_log.SUBMISSION_LOG_DIR
+    directories = [root]
+    if os.path.isdir(root):
+        directories += [
+            os.path.join(root, name) for name in sorted(os.listdir(root))
+            if name.startswith("worker-")
+        ]
+    for directory in directories:
+        log = submission_log.SubmissionLog(directory, on_flush=submission_log.log.on_flush)
+        log.open()
+        log.close()
+
+    # Connections opened so far must not be shared with the workers
+    database.engine.dispose()
+    database.read_engine.dispose()
+
+
+def bind(host: str, port: int):
+    sock = socket.socket(socket.AF_INET6 if ":" in host else socket.AF_INET)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.set_inheritable(True)
+    return sock
+
+
+def run_worker(index: int, workers: int, sock, log_level: str):
+    import uvicorn
+
+    import cluster, events, main, submission_log
+
+    cluster.set_worker(index, workers)
+    submission_log.log.directory = os.path.join(submission_log.SUBMISSION_LOG_DIR, f"worker-{index}")
+    events.log.directory = os.path.join(events.EVENT_LOG_DIR, f"worker-{index}")
+    config = uvicorn.Config(main.app, lifespan="on", log_level=log_level)
+    uvicorn.Server(config).run(sockets=[sock])
+
+
+def spawn(index: int, workers: int, sock, log_level: str):
+    pid = os.fork()
+    if pid == 0:
+        signal.signal(signal.SIGINT, signal.SIG_DFL)
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        code = 0
+        try:
+            run_worker(index, workers, sock, log_level)
+        except BaseException as e:
+            print(f"Worker {index} failed: {e}", file=sys.stderr)
+            code = 1
+        finally:
+            os._exit(code)
+    return pid
+
+
+def main():
+    args = parse_args()
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    prepare(args.workers)
+    sock = bind(args.host, args.port)
+    print(f"Serving on http://{args.host}:{args.port} with {args.workers} workers", file=sys.stderr)
+
+    stopping = False
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+
+    children = {spawn(i, args.workers, sock, args.log_level): i for i in range(args.workers)}
+    while not stopping:
+        try:
+            pid, status = os.waitpid(-1, os.WNOHANG)
+        except ChildProcessError:
+            break
+        if pid == 0:
+            time.sleep(0.2)
+            continue
+        index = children.pop(pid)
+        print(f"Worker {index} exited with status {status}, restarting", file=sys.stderr)
+        children[spawn(index, args.workers, sock, args.log_level)] = index
+
+    for pid in children:
+        try:
+            os.kill(pid, signal.SIGTERM)
+        except ProcessLookupError:
+            pass
+    for pid in children:
+        try:
+            os.waitpid(pid, 0)
+        except ChildProcessError:
+            pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,181 @@
+import hashlib
+import re
+from collections import defaultdict
+from functools import lru_cache
+
+from sqlalchemy import or_
+from sqlalchemy.orm import Session
+
+import database, models, storage
+
+# 128 permutations split into 32 bands of 4 rows: pairs with Jaccard
+# similarity around 0.42 and above have a >50% chance of sharing a bucket
+NUM_PERM = 128
+BANDS = 32
+ROWS = NUM_PERM // BANDS
+
+SHINGLE_SIZE = 5
+DEFAULT_THRESHOLD = 0.5
+
+_TOKEN = re.compile(r"\w+")
+_CHUNK = 4096
+
+
+@lru_cache(maxsize=None)
+def _permutations():
+    """Hash parameters, built on first use so numpy loads outside startup
+
+    Returns (a, b, prime, max_hash, empty_signature).
+    """
+    import numpy as np
+
+    # Fixed seed so signatures stay comparable across processes and restarts
+    rng = np.random.RandomState(1)
+    a = rng.randint(1, 1 << 32, size=NUM_PERM, dtype=np.uint64)
+    b = rng.randint(0, 1 << 32, size=NUM_PERM, dtype=np.uint64)
+    max_hash = np.uint64(0xFFFFFFFF)
+    empty = np.full(NUM_PERM, max_hash, dtype=np.uint32)
+    empty.flags.writeable = False
+    return a, b, np.uint64((1 << 61) - 1), max_hash, empty
+
+
+def shingles(text: str, k: int = SHINGLE_SIZE):
+    """Word k-grams, falling back to character k-grams for very short texts"""
+    tokens = _TOKEN.findall(text.lower())
+    if len(tokens) >= k:
+        return {" ".join(tokens[i:i + k]) for i in range(len(tokens) - k + 1)}
+    compact = " ".join(tokens)
+    if len(compact) <= k:
+        return {compact} if compact else set()
+    return {compact[i:i + k] for i in range(len(compact) - k + 1)}
+
+
+def signature(text: str):
+    """MinHash signature as NUM_PERM uint32 values"""
+    import numpy as np
+
+    a, b, prime, max_hash, empty = _permutations()
+    items = shingles(text)
+    if not items:
+        return empty.copy()
+    hashes = np.fromiter(
+        (int.from_bytes(hashlib.blake2b(s.encode("utf-8"), digest_size=4).digest(), "little") for s in items),
+        dtype=np.uint64,
+        count=len(items),
+    )
+    # (a * x + b) mod p for every permutation at once, then min over shingles,
+    # in chunks to bound the temporary matrix for large submissions
+    result = np.full(NUM_PERM, max_hash, dtype=np.uint64)
+    for start in range(0, len(hashes), _CHUNK):
+        chunk = hashes[start:start + _CHUNK]
+        permuted = (np.outer(chunk, a) + b) % prime & max_hash
+        np.minimum(result, permuted.min(axis=0), out=result)
+    return result.astype(np.uint32)
+
+
+def estimated_jaccard(a, b):
+    import numpy as np
+
+    return float(np.count_nonzero(a == b)) / NUM_PERM
+
+
+def near_duplicates(signatures, threshold: float = DEFAULT_THRESHOLD):
+    """Candidate pairs from LSH banding, verified against the full signature
+
+    signatures maps an id to its MinHash signature. Only ids that collide in
+    at least one band are compared, so the cost follows the number of similar
+    pairs rather than n^2.
+    """
+    import numpy as np
+
+    empty = _permutations()[4]
+    # Empty submissions would all collide with each other, leave them out
+    ids = [i for i in signatures if not np.array_equal(signatures[i], empty)]
+    if len(ids) < 2:
+        return []
+    matrix = np.vstack([signatures[i] for i in ids])
+
+    candidates = set()
+    for band in range(BANDS):
+        buckets = defaultdict(list)
+        rows = matrix[:, band * ROWS:(band + 1) * ROWS]
+        for position, key in enumerate(map(bytes, rows)):
+            buckets[key].append(position)
+        for members in buckets.values():
+            for i in range(len(members)):
+                for j in range(i + 1, len(members)):
+                    candidates.add((members[i], members[j]))
+
+    pairs = []
+    for i, j in candidates:
+        score = estimated_jaccard(matrix[i], matrix[j])
+        if score >= threshold:
+            pairs.append((ids[i], ids[j], score))
+    return sorted(pairs, key=lambda pair: pair[2], reverse=True)
+
+
+def submission_text(submission: models.AssignmentSubmission):
+    if submission.content_ref is None:
+        return submission.content or ""
+    if submission.content_type and not submission.content_type.startswith("text/"):
+        return None
+    data = b"".join(storage.blobs.iter_decoded(submission.content_ref, submission.content_encoding))
+    return data.decode("utf-8", errors="replace")
+
+
+def index_submission(db: Session, submission: models.AssignmentSubmission):
+    """Compute and store the signature for one submission, None for binary uploads"""
+    text = submission_text(submission)
+    if text is None:
+        return None
+    sig = signature(text)
+    db.merge(models.SubmissionSignature(
+        submission_id=submission.id,
+        assignment_id=submission.assignment_id,
+        signature=sig.tobytes()
+    ))
+    return sig
+
+
+def index_submissions(submission_ids):
+    """Sign a batch of freshly stored submissions in one transaction"""
+    db = database.SessionLocal()
+    try:
+        submissions = db.query(models.AssignmentSubmission).filter(
+            models.AssignmentSubmission.id.in_(list(submission_ids))
+        ).all()
+        for submission in submissions:
+            index_submission(db, submission)
+        db.commit()
+    finally:
+        db.close()
+
+
+def assignment_signatures(db: Session, assignment_id: str):
+    """Stored signatures for an assignment, backfilling any that are missing"""
+    import numpy as np
+
+    signatures = {
+        row.submission_id: np.frombuffer(row.signature, dtype=np.uint32)
+        for row in db.query(models.SubmissionSignature).filter(
+            models.SubmissionSignature.assignment_id == assignment_id
+        )
+    }
+    missing = db.query(models.AssignmentSubmission).outerjoin(
+        models.SubmissionSignature,
+        models.SubmissionSignature.submission_id == models.AssignmentSubmission.id
+    ).filter(
+        models.AssignmentSubmission.assignment_id == assignment_id,
+        models.SubmissionSignature.submission_id == None,
+        or_(
+            models.AssignmentSubmission.content_type == None,
+            models.AssignmentSubmission.content_type.like("text/%")
+        )
+    ).all()
+    for submission in missing:
+        sig = index_submission(db, submission)
+        if sig is not None:
+            signatures[submission.id] = sig
+    if missing:
+        db.commit()
+    return signatures
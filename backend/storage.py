@@ -0,0 +1,151 @@
+import gzip
+import hashlib
+import os
+import tempfile
+import zlib
+
+from starlette.exceptions import HTTPException
+from starlette.responses import JSONResponse
+
+# Content-addressed blob store for submission bodies
+SUBMISSION_STORAGE_DIR = os.getenv("SUBMISSION_STORAGE_DIR", "./submission_blobs")
+MAX_SUBMISSION_BYTES = int(os.getenv("MAX_SUBMISSION_BYTES", str(20 * 1024 * 1024)))
+SUBMISSION_COMPRESSION = os.getenv("SUBMISSION_COMPRESSION", "1") not in ("0", "false", "False")
+
+CHUNK_SIZE = 64 * 1024
+
+# Allowance for multipart framing and the form fields sent with the file
+UPLOAD_OVERHEAD_BYTES = 64 * 1024
+
+# Formats that are already compressed and don't benefit from gzip
+INCOMPRESSIBLE_TYPES = {
+    "application/gzip",
+    "application/zip",
+    "application/x-7z-compressed",
+    "application/pdf",
+    "image/jpeg",
+    "image/png",
+    "image/gif",
+    "image/webp",
+    "video/mp4",
+}
+
+
+class BlobTooLarge(Exception):
+    pass
+
+
+class BlobStore:
+    def __init__(self, root=SUBMISSION_STORAGE_DIR, max_bytes=MAX_SUBMISSION_BYTES,
+                 compression=SUBMISSION_COMPRESSION):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.compression = compression
+
+    def path(self, digest: str, encoding: str = None):
+        name = digest + (".gz" if encoding == "gzip" else "")
+        return os.path.join(self.root, digest[:2], digest[2:4], name)
+
+    def put(self, stream, content_type: str = None):
+        """Stream a file-like object into the store
+
+        Returns (digest, size, encoding) where digest is the sha256 of the
+        uncompressed bytes. Identical content is only stored once.
+        """
+        encoding = "gzip" if self.compression and content_type not in INCOMPRESSIBLE_TYPES else None
+        os.makedirs(self.root, exist_ok=True)
+        hasher = hashlib.sha256()
+        size = 0
+
+        fd, tmp_path = tempfile.mkstemp(dir=self.root, prefix=".upload-")
+        try:
+            with os.fdopen(fd, "wb") as raw:
+                # mtime=0 keeps the gzip output deterministic for identical input
+                out = gzip.GzipFile(fileobj=raw, mode="wb", mtime=0) if encoding else raw
+                while True:
+                    chunk = stream.read(CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    if isinstance(chunk, str):
+                        chunk = chunk.encode("utf-8")
+                    size += len(chunk)
+                    if size > self.max_bytes:
+                        raise BlobTooLarge(f"Submission exceeds {self.max_bytes} bytes")
+                    hasher.update(chunk)
+                    out.write(chunk)
+                if encoding:
+                    out.close()
+                raw.flush()
+                os.fsync(raw.fileno())
+
+            digest = hasher.hexdigest()
+            final_path = self.path(digest, encoding)
+            if os.path.exists(final_path):
+                os.unlink(tmp_path)
+            else:
+                os.makedirs(os.path.dirname(final_path), exist_ok=True)
+                os.replace(tmp_path, final_path)
+            return digest, size, encoding
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+
+    def iter_decoded(self, digest: str, encoding: str = None):
+        """Yield the original bytes of a blob in chunks"""
+        decompressor = zlib.decompressobj(wbits=31) if encoding == "gzip" else None
+        with open(self.path(digest, encoding), "rb") as f:
+            while True:
+                chunk = f.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                yield decompressor.decompress(chunk) if decompressor else chunk
+        if decompressor:
+            tail = decompressor.flush()
+            if tail:
+                yield tail
+
+
+blobs = BlobStore()
+
+
+class UploadLimitMiddleware:
+    """Refuse oversized submission uploads before they are received
+
+    Starlette spools a multipart body to disk while parsing the form, which
+    happens before the handler or its dependencies run. A Content-Length
+    over the limit gets a 413 without reading the body; bodies without one
+    are counted as they arrive and cut off once they pass it.
+    """
+
+    def __init__(self, app, max_bytes: int = MAX_SUBMISSION_BYTES + UPLOAD_OVERHEAD_BYTES,
+                 path_suffix: str = "/submit"):
+        self.app = app
+        self.max_bytes = max_bytes
+        self.path_suffix = path_suffix
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "POST" or not scope["path"].endswith(self.path_suffix):
+            await self.app(scope, receive, send)
+            return
+
+        detail = f"Submission exceeds {self.max_bytes - UPLOAD_OVERHEAD_BYTES} bytes"
+        for name, value in scope["headers"]:
+            if name == b"content-length":
+                if not value.isdigit() or int(value) > self.max_bytes:
+                    await JSONResponse({"detail": detail}, status_code=413)(scope, receive, send)
+                    return
+                break
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_bytes:
+                    raise HTTPException(status_code=413, detail=detail)
+            return message
+
+        await self.app(scope, limited_receive, send)
@@ -0,0 +1,436 @@
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+from sqlalchemy import exc
+from sqlalchemy.dialects.sqlite import insert
+from starlette.concurrency import run_in_threadpool
+
+import database, models, rollups, similarity
+
+logger = logging.getLogger(__name__)
+
+# Durable append-only log that absorbs deadline-minute submission bursts.
+# Requests are acknowledged once their record is fsynced to the log; a
+# background writer moves records into assignment_submissions in batches.
+SUBMISSION_LOG_DIR = os.getenv("SUBMISSION_LOG_DIR", "./submission_log")
+SEGMENT_BYTES = int(os.getenv("SUBMISSION_LOG_SEGMENT_BYTES", str(16 * 1024 * 1024)))
+FLUSH_INTERVAL = float(os.getenv("SUBMISSION_LOG_FLUSH_INTERVAL", "0.05"))
+# Shared by every worker, so only one of them can accept a given submission
+SUBMISSION_CLAIMS_DB = os.getenv("SUBMISSION_CLAIMS_DB", "./submission_claims.db")
+MAX_APPEND_BATCH = 1024
+# Retry delay after a failed flush doubles up to this many seconds
+MAX_FLUSH_BACKOFF = float(os.getenv("SUBMISSION_LOG_MAX_FLUSH_BACKOFF", "30"))
+
+CHECKPOINT_FILE = "checkpoint"
+# Records that can never be inserted are moved here, one per line, so they
+# do not hold back the rest of the log
+DEAD_LETTER_FILE = "dead-letter.log"
+
+
+class DuplicateSubmission(Exception):
+    pass
+
+
+def _segment_name(number: int):
+    return f"submissions-{number:08d}.log"
+
+
+class SubmissionClaims:
+    """(assignment, student) keys accepted but not yet in the database
+
+    A worker claims the key before acknowledging a submission and releases
+    it once the row is committed, after which the unique index takes over.
+    Claims live in a SQLite file shared by the workers; every call may
+    wait on its lock, so callers on the event loop use the threadpool.
+    """
+
+    def __init__(self, path: str = SUBMISSION_CLAIMS_DB):
+        self.path = path
+        self._local = threading.local()
+        # SQLite connections must not be shared with forked workers
+        os.register_at_fork(after_in_child=self._reset)
+
+    def _reset(self):
+        self._local = threading.local()
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS claims (assignment_id TEXT NOT NULL, student_id TEXT NOT NULL, "
+                "owner TEXT NOT NULL, claimed REAL NOT NULL, PRIMARY KEY (assignment_id, student_id))"
+            )
+            self._local.conn = conn
+        return conn
+
+    def claim(self, key, owner: str):
+        """Claim key for owner; False if another submission holds it"""
+        cursor = self._connect().execute(
+            "INSERT OR IGNORE INTO claims (assignment_id, student_id, owner, claimed) VALUES (?, ?, ?, ?)",
+            (key[0], key[1], owner, time.time()),
+        )
+        return cursor.rowcount == 1
+
+    def release(self, keys, owner: str):
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.executemany(
+                "DELETE FROM claims WHERE assignment_id = ? AND student_id = ? AND owner = ?",
+                [(assignment_id, student_id, owner) for assignment_id, student_id in keys],
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def release_owner(self, owner: str):
+        self._connect().execute("DELETE FROM claims WHERE owner = ?", (owner,))
+
+
+shared_claims = SubmissionClaims()
+
+
+class SubmissionLog:
+    def __init__(self, directory=SUBMISSION_LOG_DIR, segment_bytes=SEGMENT_BYTES,
+                 flush_interval=FLUSH_INTERVAL, on_flush=None, claims=None):
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.flush_interval = flush_interval
+        self.on_flush = on_flush
+        self.claims = claims or shared_claims
+        self.commits = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.dead_lettered = 0
+        self.last_error = None
+        self.last_error_at = None
+        self._pending = set()
+        self._file = None
+        self._segment = 0
+        self._checkpoint = (0, 0)
+        self._queue = None
+        self._flush_wanted = None
+        self._tasks = []
+        self._flush_lock = threading.Lock()
+
+    # Recovery
+
+    def _segments(self):
+        names = sorted(n for n in os.listdir(self.directory) if n.startswith("submissions-"))
+        return [int(n[len("submissions-"):-len(".log")]) for n in names]
+
+    def _load_checkpoint(self):
+        try:
+            with open(os.path.join(self.directory, CHECKPOINT_FILE)) as f:
+                segment, offset = f.read().split()
+                return int(segment), int(offset)
+        except FileNotFoundError:
+            return 0, 0
+
+    def _save_checkpoint(self, position):
+        path = os.path.join(self.directory, CHECKPOINT_FILE)
+        with open(path + ".tmp", "w") as f:
+            f.write(f"{position[0]} {position[1]}")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(path + ".tmp", path)
+        self._checkpoint = position
+
+    def _open_segment(self, number: int):
+        if self._file:
+            self._file.close()
+        self._segment = number
+        self._file = open(os.path.join(self.directory, _segment_name(number)), "ab")
+
+    def _owner(self):
+        # The directory, since serve.py only assigns it after the fork
+        return os.path.abspath(self.directory)
+
+    def open(self):
+        """Prepare the log and flush anything left over from a previous run"""
+        os.makedirs(self.directory, exist_ok=True)
+        self._checkpoint = self._load_checkpoint()
+        segments = self._segments()
+        self._open_segment(max(segments + [self._checkpoint[0]]))
+        self.flush()
+        # Everything this log acknowledged is in the database now; claims
+        # left over were taken by a process that died before logging them
+        self.claims.release_owner(self._owner())
+
+    # Accepting submissions
+
+    def is_pending(self, assignment_id: str, student_id: str):
+        return (assignment_id, student_id) in self._pending
+
+    def _write(self, data: bytes):
+        if self._file.tell() >= self.segment_bytes:
+            self._open_segment(self._segment + 1)
+        self._file.write(data)
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def _submitted(self, key):
+        Submission = models.AssignmentSubmission
+        db = database.SessionLocal()
+        try:
+            return db.query(Submission.id).filter(
+                Submission.assignment_id == key[0], Submission.student_id == key[1]
+            ).first() is not None
+        finally:
+            db.close()
+
+    def _claim(self, key):
+        if not self.claims.claim(key, self._owner()):
+            raise DuplicateSubmission(key)
+        try:
+            if self._submitted(key):
+                raise DuplicateSubmission(key)
+        except Exception:
+            self.claims.release([key], self._owner())
+            raise
+
+    async def append(self, record: dict):
+        """Durably log a submission; returns once it has been fsynced
+
+        Raises DuplicateSubmission when any worker has already accepted the
+        same (assignment, student). The key is claimed, in this process and
+        in the shared claims, before the database is checked. A flush only
+        releases keys after committing their rows, so a copy racing the
+        flush of an earlier one either finds the claim or finds the row.
+        """
+        key = (record["assignment_id"], record["student_id"])
+        if key in self._pending:
+            raise DuplicateSubmission(key)
+        self._pending.add(key)
+        try:
+            await run_in_threadpool(self._claim, key)
+        except Exception:
+            self._pending.discard(key)
+            raise
+        try:
+            future = asyncio.get_running_loop().create_future()
+            line = (json.dumps(record, separators=(",", ":")) + "\n").encode("utf-8")
+            await self._queue.put((line, future))
+            await future
+        except Exception:
+            self._pending.discard(key)
+            await run_in_threadpool(self.claims.release, [key], self._owner())
+            raise
+
+    async def _append_loop(self):
+        # Group commit: every record queued while the previous fsync ran
+        # is written and synced together
+        while True:
+            batch = [await self._queue.get()]
+            while not self._queue.empty() and len(batch) < MAX_APPEND_BATCH:
+                batch.append(self._queue.get_nowait())
+            try:
+                await run_in_threadpool(self._write, b"".join(line for line, _ in batch))
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            for _, future in batch:
+                future.set_result(None)
+            self._flush_wanted.set()
+
+    # Moving records into the database
+
+    def _dead_letter(self, lines):
+        with open(os.path.join(self.directory, DEAD_LETTER_FILE), "ab") as f:
+            f.write(b"".join(lines))
+            f.flush()
+            os.fsync(f.fileno())
+        self.dead_lettered += len(lines)
+
+    def _read_unflushed(self):
+        """Complete records after the checkpoint, lines that are not valid JSON, and the end position"""
+        records, unreadable = [], []
+        segment, offset = self._checkpoint
+        for number in self._segments():
+            if number < segment:
+                continue
+            start = offset if number == segment else 0
+            with open(os.path.join(self.directory, _segment_name(number)), "rb") as f:
+                f.seek(start)
+                data = f.read()
+            # A record still being written has no trailing newline yet
+            complete = data[:data.rfind(b"\n") + 1]
+            for line in complete.splitlines(keepends=True):
+                try:
+                    records.append(json.loads(line))
+                except ValueError:
+                    unreadable.append(line)
+            segment, offset = number, start + len(complete)
+        return records, unreadable, (segment, offset)
+
+    def _insert(self, records, rejected):
+        """Insert records, skipping ids already inserted
+
+        Rows inserted before a crash are replayed with the same id and
+        skipped silently. Claims keep two workers from accepting the same
+        (assignment, student), so a record that still collides with another
+        row (say, from a log written before claims existed) is not dropped
+        but added to `rejected`.
+        """
+        Submission = models.AssignmentSubmission
+        db = database.SessionLocal()
+        try:
+            rows = [dict(record, submitted_at=datetime.fromisoformat(record["submitted_at"])) for record in records]
+            inserted = set(db.execute(
+                insert(Submission).on_conflict_do_nothing().returning(Submission.id), rows
+            ).scalars())
+            skipped = [row for row in rows if row["id"] not in inserted]
+            if skipped:
+                replayed = {submission_id for (submission_id,) in db.query(Submission.id).filter(
+                    Submission.id.in_([row["id"] for row in skipped])
+                )}
+                conflicting = [row for row in skipped if row["id"] not in replayed]
+            else:
+                conflicting = []
+
+            rows = [row for row in rows if row["id"] in inserted]
+            courses = dict(db.query(models.Assignment.id, models.Assignment.course_id).filter(
+                models.Assignment.id.in_({row["assignment_id"] for row in rows})
+            ).all())
+            rollups.record_many(db, [
+                (courses[row["assignment_id"]], row["submitted_at"], {"submissions": 1})
+                for row in rows if row["assignment_id"] in courses
+            ])
+            db.commit()
+            self.commits += 1
+        finally:
+            db.close()
+
+        for row in conflicting:
+            logger.error(
+                "Submission %s conflicts with another submission of assignment %s by student %s",
+                row["id"], row["assignment_id"], row["student_id"]
+            )
+            rejected.append(dict(row, submitted_at=row["submitted_at"].isoformat()))
+        return [row["id"] for row in rows]
+
+    def _insert_isolating(self, records, rejected):
+        """Insert records, adding the ones that fail on their own to `rejected`
+
+        A failing batch is split in half until the bad records are found, so
+        one of them cannot block the others. Operational errors (a locked or
+        unreachable database) say nothing about the records and propagate,
+        leaving the whole batch to be retried.
+        """
+        try:
+            return self._insert(records, rejected)
+        except exc.OperationalError:
+            raise
+        except Exception:
+            if len(records) == 1:
+                logger.exception("Submission %s cannot be inserted", records[0].get("id"))
+                rejected.append(records[0])
+                return []
+        middle = len(records) // 2
+        return self._insert_isolating(records[:middle], rejected) + self._insert_isolating(records[middle:], rejected)
+
+    def flush(self):
+        """Insert every complete logged record, in one transaction unless a bad record splits it
+
+        on_flush runs after the lock is released, so the next batch can be
+        written while the previous one is being indexed.
+        """
+        with self._flush_lock:
+            count, inserted = self._flush()
+        if self.on_flush and inserted:
+            try:
+                self.on_flush(inserted)
+            except Exception:
+                logger.exception("Submission flush callback failed")
+        return count
+
+    def _flush(self):
+        records, unreadable, position = self._read_unflushed()
+        if position == self._checkpoint:
+            return 0, []
+        rejected = []
+        inserted = self._insert_isolating(records, rejected) if records else []
+        # Set aside only once the batch is through, so a retried flush does
+        # not write them twice
+        dead = unreadable + [(json.dumps(r, separators=(",", ":")) + "\n").encode("utf-8") for r in rejected]
+        if dead:
+            logger.error("Moved %d submission log records to %s", len(dead), DEAD_LETTER_FILE)
+            self._dead_letter(dead)
+        self._save_checkpoint(position)
+
+        for number in self._segments():
+            if number < position[0]:
+                os.unlink(os.path.join(self.directory, _segment_name(number)))
+        keys = {(record["assignment_id"], record["student_id"]) for record in records}
+        self.claims.release(keys, self._owner())
+        self._pending.difference_update(keys)
+        return len(records), inserted
+
+    async def _flush_loop(self):
+        while True:
+            await self._flush_wanted.wait()
+            # Let concurrent submissions accumulate into one transaction
+            await asyncio.sleep(self.flush_interval)
+            self._flush_wanted.clear()
+            try:
+                await run_in_threadpool(self.flush)
+            except Exception as e:
+                self.failures += 1
+                self.consecutive_failures += 1
+                self.last_error = repr(e)
+                self.last_error_at = datetime.utcnow()
+                logger.exception("Submission log flush failed (%d in a row)", self.consecutive_failures)
+                self._flush_wanted.set()
+                await asyncio.sleep(self.retry_delay())
+            else:
+                self.consecutive_failures = 0
+
+    def retry_delay(self):
+        return min(self.flush_interval * 2 ** self.consecutive_failures, MAX_FLUSH_BACKOFF)
+
+    def stats(self):
+        return {
+            "commits": self.commits,
+            "failures": self.failures,
+            "consecutive_failures": self.consecutive_failures,
+            "dead_lettered": self.dead_lettered,
+            "last_error": self.last_error,
+            "last_error_at": self.last_error_at,
+        }
+
+    # Lifecycle
+
+    async def start(self):
+        self._queue = asyncio.Queue()
+        self._flush_wanted = asyncio.Event()
+        await run_in_threadpool(self.open)
+        self._tasks = [
+            asyncio.create_task(self._append_loop()),
+            asyncio.create_task(self._flush_loop()),
+        ]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        self._tasks = []
+        await run_in_threadpool(self.close)
+
+    def close(self):
+        self.flush()
+        if self._file:
+            self._file.close()
+            self._file = None
+
+
+log = SubmissionLog(on_flush=similarity.index_submissions)
@@ -0,0 +1,12 @@
+import os
+import sys
+import tempfile
+
+# The backend modules are flat and open ./lms.db relative to the working
+# directory, so run the tests from a scratch directory
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.chdir(tempfile.mkdtemp(prefix="lms-tests-"))
+
+import migrate
+
+migrate.migrate()
@@ -0,0 +1,71 @@
+import pytest
+from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse
+from fastapi.testclient import TestClient
+
+import compression
+
+
+@pytest.mark.parametrize("header, expected", [
+    ("gzip, deflate, br", "br"),
+    ("gzip", "gzip"),
+    ("br;q=0.5, gzip", "gzip"),
+    ("br;q=0, gzip;q=0.1", "gzip"),
+    ("*", "br"),
+    ("*;q=0.5, br;q=0", "gzip"),
+    ("gzip;q=0, br;q=0", None),
+    ("identity", None),
+    ("", None),
+    ("br;q=oops, gzip", "gzip"),
+])
+def test_negotiate(header, expected):
+    assert compression.negotiate(header) == expected
+
+
+def test_negotiate_without_brotli(monkeypatch):
+    monkeypatch.setattr(compression, "brotli", None)
+    assert compression.negotiate("br, gzip;q=0.1") == "gzip"
+    assert compression.negotiate("br") is None
+
+
+def test_accepts_honours_q_zero_and_wildcard():
+    assert compression.accepts("GZIP", "gzip")
+    assert not compression.accepts("gzip;q=0", "gzip")
+    assert compression.accepts("*", "gzip")
+    assert not compression.accepts("*, gzip;q=0", "gzip")
+    assert not compression.accepts("br", "gzip")
+
+
+@pytest.fixture
+def client():
+    app = FastAPI()
+    app.add_middleware(compression.CompressionMiddleware, minimum_size=100, cacheable_paths=["/big"])
+
+    @app.get("/big")
+    def big():
+        return PlainTextResponse("lorem ipsum " * 200)
+
+    @app.get("/small")
+    def small():
+        return PlainTextResponse("tiny")
+
+    return TestClient(app)
+
+
+def test_middleware_compresses_and_caches(client):
+    for _ in range(2):
+        response = client.get("/big", headers={"Accept-Encoding": "br"})
+        assert response.headers["content-encoding"] == "br"
+        assert response.headers["vary"] == "Accept-Encoding"
+        assert int(response.headers["content-length"]) < 100
+        assert response.text == "lorem ipsum " * 200
+    report = {r["route"]: r for r in compression.stats.report()}
+    assert report["/big"]["cache_hits"] >= 1
+
+
+def test_middleware_skips_small_and_refused_bodies(client):
+    small = client.get("/small", headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in small.headers
+    refused = client.get("/big", headers={"Accept-Encoding": "gzip;q=0"})
+    assert "content-encoding" not in refused.headers
+    assert refused.text == "lorem ipsum " * 200
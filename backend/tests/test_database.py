@@ -0,0 +1,83 @@
+from datetime import timedelta
+
+import pytest
+from starlette.requests import Request
+
+import auth
+import database
+
+
+def make_request(method="GET", token=None, host="192.0.2.1"):
+    headers = [(b"authorization", f"Bearer {token}".encode())] if token else []
+    return Request({
+        "type": "http",
+        "method": method,
+        "path": "/",
+        "headers": headers,
+        "client": (host, 5000),
+    })
+
+
+def session_for(request):
+    dependency = database.get_db(request)
+    db = next(dependency)
+    dependency.close()
+    return db
+
+
+@pytest.fixture(autouse=True)
+def clean_writes(monkeypatch):
+    monkeypatch.setattr(database, "_last_write", {})
+    monkeypatch.setattr(database, "_notifier", None)
+
+
+def test_client_key_follows_the_user_across_tokens():
+    first = auth.create_access_token({"sub": "user-1"})
+    second = auth.create_access_token({"sub": "user-1"}, expires_delta=timedelta(hours=1))
+    keys = {database._client_key(make_request(token=t, host=h)) for t, h in ((first, "192.0.2.1"), (second, "192.0.2.2"))}
+    assert keys == {database.client_key("user-1")}
+
+
+def test_client_key_falls_back_to_the_address():
+    anonymous = database._client_key(make_request(host="192.0.2.1"))
+    assert anonymous == database._client_key(make_request(token="not-a-jwt", host="192.0.2.1"))
+    assert anonymous != database._client_key(make_request(host="192.0.2.2"))
+    assert "192.0.2.1" not in anonymous
+
+
+def test_reads_go_to_the_replica_until_the_client_writes(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(database.time, "monotonic", lambda: now[0])
+    token = auth.create_access_token({"sub": "user-1"})
+
+    assert session_for(make_request(token=token)).get_bind() is database.read_engine
+    writer = session_for(make_request("POST", token=token))
+    assert writer.get_bind() is database.engine
+    writer.commit()
+
+    assert session_for(make_request(token=token)).get_bind() is database.engine
+    assert session_for(make_request(host="192.0.2.9")).get_bind() is database.read_engine
+    now[0] += database.READ_YOUR_WRITES_SECONDS
+    assert session_for(make_request(token=token)).get_bind() is database.read_engine
+
+
+class Notifier:
+    def __init__(self):
+        self.handlers = {}
+        self.published = []
+
+    def subscribe(self, channel, handler):
+        self.handlers[channel] = handler
+
+    def publish(self, channel, payload):
+        self.published.append((channel, payload))
+
+
+def test_writes_are_shared_with_other_workers():
+    notifier = Notifier()
+    database.share_writes(notifier)
+    database.note_write("local")
+    assert notifier.published == [("client_write", "local")]
+
+    notifier.handlers["client_write"](["remote"])
+    assert database._recently_wrote("remote")
@@ -0,0 +1,66 @@
+import json
+import os
+
+import events
+
+
+def write_events(directory, number, items):
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, events._segment_name(number)), "ab") as f:
+        for ts, type in items:
+            f.write((json.dumps({"ts": ts, "type": type}) + "\n").encode())
+
+
+def test_write_rotates_segments_and_never_reopens_old_ones(tmp_path):
+    directory = str(tmp_path)
+    log = events.EventLog(directory, segment_bytes=1)
+    log.open()
+    for batch in range(3):
+        log.emit("course.created", batch=batch)
+        assert log.write() == 1
+    log.close()
+    assert events._segment_numbers(directory) == [0, 1, 2]
+
+    log.open()
+    log.close()
+    assert events._segment_numbers(directory) == [0, 1, 2, 3]
+    assert [e["batch"] for e in events.replay(directory)] == [0, 1, 2]
+
+
+def test_buffer_overflow_is_counted(tmp_path, monkeypatch):
+    monkeypatch.setattr(events, "MAX_BUFFERED_EVENTS", 2)
+    log = events.EventLog(str(tmp_path))
+    for _ in range(3):
+        log.emit("x")
+    assert log.dropped == 1
+
+
+def test_consumer_merges_workers_by_timestamp(tmp_path):
+    directory = str(tmp_path)
+    write_events(os.path.join(directory, "worker-0"), 0, [("2026-01-01T00:00:01", "a"), ("2026-01-01T00:00:04", "d")])
+    write_events(os.path.join(directory, "worker-1"), 0, [("2026-01-01T00:00:02", "b")])
+    write_events(os.path.join(directory, "worker-1"), 1, [("2026-01-01T00:00:03", "c")])
+    assert [e["type"] for e in events.replay(directory)] == ["a", "b", "c", "d"]
+    assert [e["type"] for e in events.replay(directory, types={"b", "d"})] == ["b", "d"]
+
+
+def test_consumer_resumes_from_its_cursor(tmp_path):
+    directory = str(tmp_path)
+    write_events(directory, 0, [("2026-01-01T00:00:01", "a"), ("2026-01-01T00:00:02", "b")])
+
+    consumer = events.Consumer("report", directory)
+    stream = consumer.events()
+    assert next(stream)["type"] == "a"
+    consumer.commit()
+
+    # A line still being written is left for the next run
+    with open(os.path.join(directory, events._segment_name(0)), "ab") as f:
+        f.write(b'{"ts": "2026-01-01T00:00:03", "ty')
+    consumer = events.Consumer("report", directory)
+    assert [e["type"] for e in consumer.events()] == ["b"]
+    consumer.commit()
+
+    with open(os.path.join(directory, events._segment_name(0)), "ab") as f:
+        f.write(b'pe": "c"}\n')
+    assert [e["type"] for e in events.Consumer("report", directory).events()] == ["c"]
+    assert [e["type"] for e in events.Consumer("other", directory).events()] == ["a", "b", "c"]
@@ -0,0 +1,55 @@
+import uuid
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import inspect, text
+
+import database, migrate, models
+
+
+def unique_index_exists():
+    names = {index["name"] for index in inspect(database.engine).get_indexes("assignment_submissions")}
+    return migrate.UNIQUE_SUBMISSION_INDEX in names
+
+
+@pytest.fixture
+def duplicates():
+    """Two copies of one submission, as in a database from before the unique index"""
+    with database.engine.begin() as conn:
+        conn.execute(text(f"DROP INDEX IF EXISTS {migrate.UNIQUE_SUBMISSION_INDEX}"))
+    db = database.SessionLocal()
+    db.query(models.AssignmentSubmission).delete()
+    now = datetime.utcnow()
+    ids = [str(uuid.uuid4()), str(uuid.uuid4())]
+    db.add_all([
+        models.AssignmentSubmission(id=ids[0], assignment_id="a1", student_id="s1", submitted_at=now),
+        models.AssignmentSubmission(
+            id=ids[1], assignment_id="a1", student_id="s1", submitted_at=now + timedelta(minutes=1), grade=7
+        ),
+    ])
+    db.commit()
+    db.close()
+    yield ids
+    migrate.migrate(drop_duplicates=True)
+
+
+def remaining():
+    db = database.SessionLocal()
+    try:
+        return [row.id for row in db.query(models.AssignmentSubmission.id)]
+    finally:
+        db.close()
+
+
+def test_migrate_reports_duplicates_without_deleting(duplicates, caplog):
+    migrate.migrate()
+    assert sorted(remaining()) == sorted(duplicates)
+    assert not unique_index_exists()
+    assert "a1/s1 (2)" in caplog.text
+    assert "--drop-duplicate-submissions" in caplog.text
+
+
+def test_drop_duplicates_keeps_the_graded_copy(duplicates):
+    migrate.migrate(drop_duplicates=True)
+    assert remaining() == [duplicates[1]]
+    assert unique_index_exists()
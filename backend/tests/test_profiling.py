@@ -0,0 +1,82 @@
+import os
+import sys
+import uuid
+
+import pytest
+from fastapi.testclient import TestClient
+
+import auth, database, main, models, profiling
+
+
+@pytest.fixture
+def profile_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(profiling.profiler, "directory", str(tmp_path))
+    return tmp_path
+
+
+def test_collapsed_stacks_merges_workers(profile_dir):
+    run = profile_dir / "run1"
+    run.mkdir()
+    (run / "worker-0-1.folded").write_text("main;a;b 3\nmain;c 1\n")
+    (run / "worker-1-2.folded").write_text("main;c 4\nmain;a;b 1\n")
+    (run / "run.json").write_text("{}")
+    assert profiling.collapsed_stacks("run1") == "main;c 5\nmain;a;b 4\n"
+
+
+def test_collapse_reads_root_first():
+    def inner():
+        return profiling._collapse("worker", sys._getframe())
+
+    stack = inner().split(";")
+    assert stack[0] == "worker"
+    assert stack[-1].startswith("inner (test_profiling.py:")
+
+
+def test_sampling_run_writes_folded_stacks(profile_dir):
+    profiler = profiling.SamplingProfiler(str(profile_dir))
+    assert profiler.start("run2", 0.05, 5)
+    assert not profiler.start("run3", 0.05, 5)
+    profiler._thread.join()
+    (folded,) = os.listdir(profile_dir / "run2")
+    lines = (profile_dir / "run2" / folded).read_text().splitlines()
+    assert lines and all(line.rpartition(" ")[2].isdigit() for line in lines)
+
+
+def test_server_timing_and_report():
+    trace = profiling.Trace("GET", "/courses/")
+    start = trace.marks["start"]
+    trace.marks.update(
+        route_start=start + 0.001, endpoint_start=start + 0.003,
+        endpoint_end=start + 0.010, route_end=start + 0.012, end=start + 0.013,
+    )
+    trace.statements = [{"statement": "SELECT 1", "duration_ms": 1.5, "rows": 1}] * 2
+    assert trace.server_timing() == (
+        'deps;dur=2.0, handler;dur=7.0, serialize;dur=2.0, sql;dur=3.0;desc="2 statements"'
+    )
+    report = trace.report()
+    assert (report["total_ms"], report["send_ms"], report["sql_ms"]) == (13.0, 1.0, 3.0)
+
+    untimed = profiling.Trace("GET", "/")
+    assert untimed.server_timing() == 'sql;dur=0;desc="0 statements"'
+
+
+def make_user(role):
+    user_id = str(uuid.uuid4())
+    db = database.SessionLocal()
+    db.add(models.User(id=user_id, email=f"{user_id}@example.com", role=role, first_name="A", last_name="B"))
+    db.commit()
+    db.close()
+    return {"Authorization": f"Bearer {auth.create_access_token({'sub': user_id})}", "X-Trace": "1"}
+
+
+def test_admin_requests_are_traced():
+    client = TestClient(main.app)
+
+    response = client.get("/courses/", headers=make_user(models.UserRole.ADMIN))
+    assert "sql;dur=" in response.headers["server-timing"]
+    trace = profiling.load_trace(response.headers["x-trace-id"])
+    assert trace["path"] == "/courses/" and trace["status"] == 200
+    assert any(s["statement"].startswith("SELECT") for s in trace["sql"])
+
+    response = client.get("/courses/", headers=make_user(models.UserRole.STUDENT))
+    assert "x-trace-id" not in response.headers
@@ -0,0 +1,79 @@
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+import ratelimit
+
+
+class Clock:
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(ratelimit.time, "monotonic", clock)
+    monkeypatch.setattr(ratelimit.time, "time", clock)
+    return clock
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def store(request, tmp_path):
+    if request.param == "memory":
+        return ratelimit.MemoryBucketStore()
+    return ratelimit.SQLiteBucketStore(str(tmp_path / "buckets.db"))
+
+
+def test_burst_then_wait(store, clock):
+    rate = ratelimit.Rate(2, 10, burst=3)
+    assert [store.consume("k", rate) for _ in range(3)] == [0.0, 0.0, 0.0]
+    assert store.consume("k", rate) == pytest.approx(5.0)
+
+
+def test_bucket_refills_over_time(store, clock):
+    rate = ratelimit.Rate(1, 1)
+    assert store.consume("k", rate) == 0.0
+    assert store.consume("k", rate) > 0
+    clock.now += 1
+    assert store.consume("k", rate) == 0.0
+
+
+def test_refill_is_capped_at_burst(store, clock):
+    rate = ratelimit.Rate(2, 1)
+    store.consume("k", rate)
+    clock.now += 60
+    assert [store.consume("k", rate) for _ in range(2)] == [0.0, 0.0]
+    assert store.consume("k", rate) > 0
+
+
+def test_buckets_are_per_key(store, clock):
+    rate = ratelimit.Rate(1, 60)
+    assert store.consume("a", rate) == 0.0
+    assert store.consume("b", rate) == 0.0
+    assert store.consume("a", rate) > 0
+
+
+def test_latency_average_decays(clock):
+    monitor = ratelimit.DBLatencyMonitor(ratelimit.database.engine, half_life=5)
+    monitor._average_ms = 400.0
+    monitor._updated = clock.now
+    assert monitor.overloaded()
+    clock.now += 5
+    assert monitor.average_ms == pytest.approx(200.0)
+    assert not monitor.overloaded()
+
+
+def test_login_lockout_is_per_client(monkeypatch):
+    monkeypatch.setattr(ratelimit, "store", ratelimit.MemoryBucketStore())
+    monkeypatch.setattr(ratelimit, "TRUST_PROXY_HEADERS", True)
+    client = TestClient(main.app)
+    form = {"username": "victim@example.com", "password": "wrong"}
+    attacker = {"X-Forwarded-For": "203.0.113.5"}
+    codes = [client.post("/token", data=form, headers=attacker).status_code for _ in range(6)]
+    assert codes == [401] * 5 + [429]
+    victim = {"X-Forwarded-For": "198.51.100.7"}
+    assert client.post("/token", data=form, headers=victim).status_code == 401
@@ -0,0 +1,74 @@
+import uuid
+
+import pytest
+
+import database, models, recommendations
+
+
+@pytest.fixture
+def db():
+    db = database.SessionLocal()
+    for model in (models.CourseNeighbor, models.AssignmentSubmission, models.Enrollment):
+        db.query(model).delete()
+    db.commit()
+    yield db
+    db.close()
+
+
+def enroll(db, pairs):
+    for student_id, course_id in pairs:
+        db.add(models.Enrollment(id=str(uuid.uuid4()), student_id=student_id, course_id=course_id))
+    db.commit()
+
+
+ENROLLMENTS = [
+    ("s1", "python"), ("s1", "data"),
+    ("s2", "python"), ("s2", "data"), ("s2", "ml"),
+    ("s3", "data"), ("s3", "ml"),
+    ("s4", "art"),
+]
+
+
+def rounded(neighbors):
+    return {course: [(n, round(score, 9)) for n, score in items] for course, items in neighbors.items()}
+
+
+def test_recommends_courses_taken_by_similar_students(db):
+    enroll(db, ENROLLMENTS)
+    index = recommendations.RecommendationIndex()
+    index.rebuild(db)
+
+    ranked = [course for course, _ in index.recommend("s1")]
+    assert ranked[0] == "ml"
+    # Unrelated courses only appear as popularity top-ups with no score
+    assert dict(index.recommend("s1"))["art"] == 0.0
+
+
+def test_load_serves_persisted_neighbours(db):
+    enroll(db, ENROLLMENTS)
+    built = recommendations.RecommendationIndex()
+    built.rebuild(db)
+
+    loaded = recommendations.RecommendationIndex()
+    assert loaded.load(db)
+    assert rounded(loaded.neighbors) == rounded({c: n for c, n in built.neighbors.items() if n})
+    assert loaded.recommend("s1") == built.recommend("s1")
+
+
+def test_load_without_persisted_neighbours(db):
+    assert not recommendations.RecommendationIndex().load(db)
+
+
+def test_refresh_matches_rebuild_for_enrolling_students_courses(db):
+    enroll(db, ENROLLMENTS)
+    index = recommendations.RecommendationIndex()
+    index.rebuild(db)
+
+    enroll(db, [("s4", "python")])
+    index.record_enrollment("s4", "python")
+    index.refresh(db)
+
+    full = recommendations.RecommendationIndex()
+    full.rebuild(db, persist=False)
+    for course in ("python", "art"):
+        assert rounded({course: index.neighbors[course]}) == rounded({course: full.neighbors[course]})
@@ -0,0 +1,84 @@
+import uuid
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+
+import database, models, risk
+
+
+def features(due=0, overdue=0, grade=np.nan, progress=0.0, days_inactive=0.0):
+    return {
+        "due_assignments": np.array([due]),
+        "overdue_assignments": np.array([overdue]),
+        "average_grade": np.array([grade]),
+        "average_progress": np.array([progress]),
+        "progress_recorded": np.array([progress > 0]),
+        "days_inactive": np.array([days_inactive]),
+    }
+
+
+def level(**kwargs):
+    scores = risk.score(features(**kwargs))
+    return float(scores[0]), str(risk.risk_levels(scores)[0])
+
+
+def test_just_enrolled_student_is_low_risk():
+    assert level(days_inactive=0.01) == (pytest.approx(0.0, abs=1e-3), "low")
+
+
+def test_inactivity_alone_stays_low():
+    score, label = level(days_inactive=60)
+    assert score == pytest.approx(risk.INACTIVITY_WEIGHT / (risk.OVERDUE_WEIGHT + risk.INACTIVITY_WEIGHT))
+    assert label == "low"
+
+
+def test_missing_work_and_weak_grades_are_medium():
+    assert level(due=4, overdue=2, grade=0.7, days_inactive=5)[1] == "medium"
+    assert level(due=4, overdue=1, grade=0.7, days_inactive=5)[1] == "low"
+
+
+def test_inactive_student_missing_work_is_high():
+    assert level(due=2, overdue=1, days_inactive=30)[1] == "high"
+    assert level(due=2, overdue=2, days_inactive=30) == (pytest.approx(1.0), "high")
+
+
+def test_unknown_features_are_left_out_rather_than_neutral():
+    graded = risk.score(features(due=1, grade=1.0))[0]
+    ungraded = risk.score(features(due=1))[0]
+    assert graded == ungraded == 0.0
+    # Recorded progress counts once it is there
+    assert risk.score(features(due=1, grade=1.0, progress=50.0))[0] > 0
+
+
+def test_thresholds_are_ordered():
+    scores = np.array([0.0, risk.MEDIUM_RISK_THRESHOLD, risk.HIGH_RISK_THRESHOLD, 1.0])
+    assert list(risk.risk_levels(scores)) == ["low", "medium", "high", "high"]
+
+
+def test_run_batch_scores_every_enrolled_student():
+    db = database.SessionLocal()
+    try:
+        for model in (models.StudentRiskScore, models.AssignmentSubmission, models.Enrollment, models.Assignment):
+            db.query(model).delete()
+        course_id = str(uuid.uuid4())
+        db.add(models.Assignment(
+            id=str(uuid.uuid4()), course_id=course_id, title="A", description="",
+            due_date=datetime.utcnow() - timedelta(days=1), total_points=10,
+        ))
+        # "late" missed the only assignment of a course; "fresh" just joined one with none
+        db.add(models.Enrollment(
+            id=str(uuid.uuid4()), student_id="late", course_id=course_id,
+            enrolled_at=datetime.utcnow() - timedelta(days=40),
+        ))
+        db.add(models.Enrollment(
+            id=str(uuid.uuid4()), student_id="fresh", course_id=str(uuid.uuid4()),
+            enrolled_at=datetime.utcnow(),
+        ))
+        db.commit()
+
+        assert risk.run_batch(db) == 2
+        levels = dict(db.query(models.StudentRiskScore.student_id, models.StudentRiskScore.risk_level))
+        assert levels == {"fresh": "low", "late": "high"}
+    finally:
+        db.close()
@@ -0,0 +1,105 @@
+import uuid
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi.testclient import TestClient
+
+import auth, database, main, models, rollups
+
+NOW = datetime(2026, 3, 10, 15, 30)
+
+
+@pytest.fixture
+def db():
+    db = database.SessionLocal()
+    for model in (models.CourseActivity, models.AssignmentSubmission, models.Enrollment, models.Assignment):
+        db.query(model).delete()
+    db.commit()
+    yield db
+    db.close()
+
+
+def activity(db, *criteria):
+    Activity = models.CourseActivity
+    return {
+        (row.course_id, row.period, row.bucket): (row.submissions, row.graded, row.grade_total)
+        for row in db.query(Activity).filter(*criteria)
+    }
+
+
+def totals(db, *criteria):
+    Activity = models.CourseActivity
+    return db.query(
+        Activity.period, Activity.bucket, Activity.submissions
+    ).filter(*criteria).order_by(Activity.period, Activity.bucket).all()
+
+
+def test_compact_folds_old_hours_into_days(db):
+    old = NOW - timedelta(days=rollups.HOURLY_RETENTION_DAYS + 1)
+    rollups.record_many(db, [
+        ("c1", old.replace(hour=9), {"submissions": 2}),
+        ("c1", old.replace(hour=17), {"submissions": 3}),
+        ("c1", NOW, {"submissions": 1}),
+    ])
+    db.commit()
+
+    assert rollups.compact(db, now=NOW) == 1
+    assert totals(db) == [
+        ("day", rollups.day_bucket(old), 5),
+        ("hour", rollups.hour_bucket(NOW), 1),
+    ]
+    # Compacting again adds nothing
+    assert rollups.compact(db, now=NOW) == 0
+    assert totals(db)[0] == ("day", rollups.day_bucket(old), 5)
+
+
+def test_since_takes_hours_from_the_hour_and_days_from_the_day(db):
+    old = NOW - timedelta(days=rollups.HOURLY_RETENTION_DAYS + 1)
+    rollups.record_many(db, [
+        ("c1", old.replace(hour=9), {"submissions": 2}),
+        ("c1", NOW - timedelta(hours=2), {"submissions": 4}),
+        ("c1", NOW, {"submissions": 1}),
+    ])
+    db.commit()
+    rollups.compact(db, now=NOW)
+
+    assert [row.submissions for row in totals(db, rollups.since(NOW - timedelta(minutes=10)))] == [1]
+    # The daily row counts from the start of its day, hourly rows from their hour
+    window = rollups.since(old.replace(hour=12))
+    assert sum(row.submissions for row in totals(db, window)) == 7
+
+
+def test_grades_count_in_the_grading_hour_live_and_rebuilt(db):
+    admin = models.User(
+        id=str(uuid.uuid4()), email=f"{uuid.uuid4()}@example.com", role=models.UserRole.ADMIN,
+        first_name="A", last_name="B",
+    )
+    course = models.Course(id=str(uuid.uuid4()), title="Algebra")
+    assignment = models.Assignment(id=str(uuid.uuid4()), course_id=course.id, title="Quiz", total_points=10)
+    submitted_at = datetime.utcnow() - timedelta(hours=5)
+    submission = models.AssignmentSubmission(
+        id=str(uuid.uuid4()), assignment_id=assignment.id, student_id="s1", submitted_at=submitted_at
+    )
+    db.add_all([admin, course, assignment, submission])
+    db.commit()
+    rollups.record(db, course.id, at=submitted_at, submissions=1)
+    db.commit()
+
+    client = TestClient(main.app)
+    headers = {"Authorization": f"Bearer {auth.create_access_token({'sub': admin.id})}"}
+    for grade in (6, 8):
+        response = client.post(
+            f"/assignments/{assignment.id}/grade", headers=headers,
+            params={"submission_id": submission.id, "grade": grade, "feedback": "ok"},
+        )
+        assert response.status_code == 200
+    graded_at = datetime.fromisoformat(response.json()["graded_at"])
+    assert graded_at > submitted_at
+
+    Activity = models.CourseActivity
+    live = activity(db, Activity.course_id == course.id)
+    assert live[(course.id, "hour", rollups.hour_bucket(graded_at))][1:] == (1, 8)
+
+    rollups.rebuild(db)
+    db.expire_all()
+    assert activity(db, Activity.course_id == course.id) == live
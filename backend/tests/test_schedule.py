@@ -0,0 +1,49 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from fastapi import HTTPException
+
+import main, schedule
+
+
+def test_window_accepts_aware_start_with_default_end():
+    start, end = main._calendar_window(datetime(2024, 1, 1, tzinfo=timezone.utc))
+    assert start == datetime(2024, 1, 1)
+    assert end == datetime(2024, 1, 1) + timedelta(days=main.CALENDAR_DEFAULT_DAYS)
+
+
+def test_window_converts_offsets_to_naive_utc():
+    start, end = main._calendar_window(
+        datetime(2024, 1, 1, 2, tzinfo=timezone(timedelta(hours=2))),
+        datetime(2024, 1, 2),
+    )
+    assert (start, end) == (datetime(2024, 1, 1), datetime(2024, 1, 2))
+    assert start.tzinfo is None
+
+
+def test_window_rejects_end_before_start_across_timezones():
+    with pytest.raises(HTTPException) as error:
+        main._calendar_window(
+            datetime(2024, 1, 1, 12),
+            datetime(2024, 1, 1, 13, tzinfo=timezone(timedelta(hours=2))),
+        )
+    assert error.value.status_code == 400
+
+
+def test_window_is_capped():
+    with pytest.raises(HTTPException):
+        main._calendar_window(datetime(2024, 1, 1), datetime(2025, 6, 1))
+
+
+def test_ical_lines_are_folded_at_75_octets():
+    title = "Überlange Aufgabe " * 20
+    feed = schedule.to_ical([(datetime(2024, 1, 1), "assignment", "a1", title, "c1")], {"c1": "Course"})
+    lines = feed.split("\r\n")[:-1]
+    assert all(len(line.encode("utf-8")) <= 75 for line in lines)
+    # Unfolding restores the original content line
+    unfolded = feed.replace("\r\n ", "").split("\r\n")
+    assert f"SUMMARY:Due: {title}" in unfolded
+
+
+def test_short_ical_lines_are_not_folded():
+    assert schedule._ical_fold("SUMMARY:Short") == ["SUMMARY:Short"]
@@ -0,0 +1,50 @@
+import uuid
+from datetime import datetime, timedelta
+
+import pytest
+from pydantic import ValidationError
+
+import database, main, models, schemas
+
+
+@pytest.fixture
+def db():
+    db = database.SessionLocal()
+    for model in (models.AssignmentSubmission, models.Assignment, models.Enrollment, models.Course):
+        db.query(model).delete()
+    db.commit()
+    yield db
+    db.close()
+
+
+def add_course(db, title):
+    course = models.Course(id=str(uuid.uuid4()), title=title, created_at=datetime.utcnow())
+    db.add(course)
+    db.commit()
+    return course.id
+
+
+def test_from_rows_validates_row_mappings(db):
+    add_course(db, "Algebra")
+    courses = schemas.from_rows(schemas.CourseResponse, db.query(*main.COURSE_COLUMNS).all())
+    assert [type(c) for c in courses] == [schemas.CourseResponse]
+    assert courses[0].title == "Algebra"
+
+    row = db.query(models.Course.title.label("id")).first()
+    with pytest.raises(ValidationError):
+        schemas.from_rows(schemas.EnrollmentResponse, [row])
+
+
+def test_duplicate_enrollments_do_not_repeat_assignments(db):
+    course_id = add_course(db, "Algebra")
+    due = datetime.utcnow() + timedelta(days=1)
+    db.add_all([
+        models.Assignment(id=str(uuid.uuid4()), course_id=course_id, title=title, due_date=due, total_points=10)
+        for title in ("Quiz", "Essay")
+    ])
+    db.add_all([models.Enrollment(id=str(uuid.uuid4()), student_id="s1", course_id=course_id) for _ in range(2)])
+    db.commit()
+
+    assignments = main._enrolled_assignments(db, "s1")
+    assert sorted(a.title for a in assignments) == ["Essay", "Quiz"]
+    assert main._enrolled_assignments(db, "someone-else") == []
@@ -0,0 +1,44 @@
+import numpy as np
+
+import similarity
+
+ESSAY = (
+    "Photosynthesis converts light energy into chemical energy stored in glucose. "
+    "Chlorophyll in the chloroplasts absorbs mostly blue and red light, and the "
+    "light reactions split water, releasing oxygen as a by-product."
+)
+
+
+def test_identical_texts_have_identical_signatures():
+    assert np.array_equal(similarity.signature(ESSAY), similarity.signature(ESSAY))
+
+
+def test_estimated_jaccard_tracks_shingle_overlap():
+    edited = ESSAY.replace("mostly blue and red", "mainly red and blue")
+    a, b = similarity.shingles(ESSAY), similarity.shingles(edited)
+    exact = len(a & b) / len(a | b)
+    estimate = similarity.estimated_jaccard(similarity.signature(ESSAY), similarity.signature(edited))
+    assert abs(estimate - exact) < 0.15
+
+
+def test_near_duplicates_finds_copied_submissions_only():
+    signatures = {
+        "original": similarity.signature(ESSAY),
+        "copy": similarity.signature(ESSAY + " Thanks for reading."),
+        "unrelated": similarity.signature(
+            "The French Revolution began in 1789 and ended the absolute monarchy, "
+            "leading to the rise of Napoleon and sweeping changes across Europe."
+        ),
+    }
+    pairs = similarity.near_duplicates(signatures, threshold=0.5)
+    assert [{a, b} for a, b, _ in pairs] == [{"original", "copy"}]
+    assert pairs[0][2] >= 0.5
+
+
+def test_empty_submissions_are_not_flagged():
+    empty = similarity.signature("")
+    assert similarity.near_duplicates({"a": empty, "b": empty.copy()}) == []
+
+
+def test_short_texts_fall_back_to_character_shingles():
+    assert similarity.shingles("hi there") == {"hi th", "i the", " ther", "there"}
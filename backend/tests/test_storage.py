@@ -0,0 +1,74 @@
+import io
+
+import pytest
+from fastapi import FastAPI, File, UploadFile
+from fastapi.testclient import TestClient
+
+import storage
+
+
+@pytest.fixture
+def blobs(tmp_path):
+    return storage.BlobStore(root=str(tmp_path), max_bytes=1000)
+
+
+def test_text_is_gzipped_and_decoded_back(blobs):
+    data = b"hello world " * 50
+    digest, size, encoding = blobs.put(io.BytesIO(data), "text/plain")
+    assert (size, encoding) == (len(data), "gzip")
+    assert b"".join(blobs.iter_decoded(digest, encoding)) == data
+
+
+def test_compressed_formats_are_stored_as_is(blobs):
+    digest, _, encoding = blobs.put(io.BytesIO(b"\x89PNG...."), "image/png")
+    assert encoding is None
+    with open(blobs.path(digest), "rb") as f:
+        assert f.read() == b"\x89PNG...."
+
+
+def test_identical_content_is_stored_once(blobs, tmp_path):
+    first = blobs.put(io.BytesIO(b"same"), "text/plain")
+    second = blobs.put(io.BytesIO(b"same"), "text/plain")
+    assert first == second
+    stored = [p for p in tmp_path.rglob("*") if p.is_file()]
+    assert len(stored) == 1
+
+
+def test_oversized_blob_leaves_nothing_behind(blobs, tmp_path):
+    with pytest.raises(storage.BlobTooLarge):
+        blobs.put(io.BytesIO(b"x" * 1001), "text/plain")
+    assert not [p for p in tmp_path.rglob("*") if p.is_file()]
+
+
+@pytest.fixture
+def client():
+    app = FastAPI()
+
+    @app.post("/assignments/a1/submit")
+    async def submit(file: UploadFile = File(...)):
+        return {"size": len(await file.read())}
+
+    app.add_middleware(storage.UploadLimitMiddleware, max_bytes=2000)
+    return TestClient(app)
+
+
+def test_upload_over_content_length_limit_is_rejected(client):
+    response = client.post("/assignments/a1/submit", files={"file": ("a.txt", b"x" * 5000)})
+    assert response.status_code == 413
+
+
+def test_chunked_upload_is_cut_off(client):
+    def body():
+        for _ in range(10):
+            yield b"y" * 500
+
+    response = client.post(
+        "/assignments/a1/submit", content=body(),
+        headers={"Content-Type": "multipart/form-data; boundary=b"},
+    )
+    assert response.status_code == 413
+
+
+def test_upload_within_limit_passes(client):
+    response = client.post("/assignments/a1/submit", files={"file": ("a.txt", b"x" * 500)})
+    assert response.json() == {"size": 500}
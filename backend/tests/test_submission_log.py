@@ -0,0 +1,241 @@
+import asyncio
+import json
+import os
+import uuid
+from datetime import datetime
+
+import pytest
+
+import database, models, submission_log
+
+
+def make_record(assignment_id=None, student_id=None):
+    return {
+        "id": str(uuid.uuid4()),
+        "assignment_id": assignment_id or str(uuid.uuid4()),
+        "student_id": student_id or str(uuid.uuid4()),
+        "submitted_at": datetime.utcnow().isoformat(),
+        "content_ref": None,
+        "content_size": 0,
+        "content_encoding": None,
+        "content_type": "text/plain",
+    }
+
+
+def stored(records):
+    db = database.SessionLocal()
+    try:
+        return db.query(models.AssignmentSubmission).filter(
+            models.AssignmentSubmission.id.in_([r["id"] for r in records])
+        ).count()
+    finally:
+        db.close()
+
+
+def write_segment(directory, number, data: bytes):
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, submission_log._segment_name(number)), "ab") as f:
+        f.write(data)
+
+
+def encode(records):
+    return b"".join((json.dumps(r) + "\n").encode() for r in records)
+
+
+def dead_letters(directory):
+    with open(os.path.join(directory, submission_log.DEAD_LETTER_FILE), "rb") as f:
+        return f.read().splitlines()
+
+
+@pytest.fixture
+def directory(tmp_path):
+    return str(tmp_path / "log")
+
+
+def test_append_is_flushed_on_stop(directory):
+    records = [make_record() for _ in range(3)]
+
+    async def run():
+        log = submission_log.SubmissionLog(directory)
+        await log.start()
+        await asyncio.gather(*(log.append(r) for r in records))
+        await log.stop()
+        return log
+
+    log = asyncio.run(run())
+    assert stored(records) == 3
+    assert log.commits == 1
+    size = os.path.getsize(os.path.join(directory, submission_log._segment_name(0)))
+    assert log._load_checkpoint() == (0, size)
+
+
+def test_recovery_skips_partial_record(directory):
+    records = [make_record() for _ in range(2)]
+    complete = encode(records)
+    write_segment(directory, 0, complete + b'{"id": "half-writ')
+
+    log = submission_log.SubmissionLog(directory)
+    log.open()
+    assert stored(records) == 2
+    assert log._load_checkpoint() == (0, len(complete))
+    log._file.close()
+
+
+def test_replay_after_lost_checkpoint_does_not_duplicate(directory):
+    records = [make_record() for _ in range(2)]
+    write_segment(directory, 0, encode(records))
+    log = submission_log.SubmissionLog(directory)
+    log.open()
+    log.close()
+
+    # Crash between the insert and the checkpoint: the records are replayed
+    os.unlink(os.path.join(directory, submission_log.CHECKPOINT_FILE))
+    log = submission_log.SubmissionLog(directory)
+    log.open()
+    log.close()
+    assert stored(records) == 2
+
+
+def test_flushed_segments_are_deleted(directory):
+    records = [make_record() for _ in range(3)]
+    for number, record in enumerate(records):
+        write_segment(directory, number, encode([record]))
+
+    log = submission_log.SubmissionLog(directory)
+    log.open()
+    log.close()
+    assert stored(records) == 3
+    assert log._segments() == [2]
+    assert log._load_checkpoint()[0] == 2
+
+
+def test_flush_resumes_from_checkpoint(directory):
+    first, second = make_record(), make_record()
+    write_segment(directory, 0, encode([first]))
+    log = submission_log.SubmissionLog(directory)
+    log.open()
+    write_segment(directory, 0, encode([second]))
+    assert log.flush() == 1
+    log.close()
+    assert stored([first, second]) == 2
+
+
+def test_duplicate_rejected_after_first_copy_flushed(directory):
+    record = make_record()
+
+    async def run():
+        log = submission_log.SubmissionLog(directory)
+        await log.start()
+        await log.append(record)
+        await asyncio.get_running_loop().run_in_executor(None, log.flush)
+        assert not log.is_pending(record["assignment_id"], record["student_id"])
+        with pytest.raises(submission_log.DuplicateSubmission):
+            await log.append(make_record(record["assignment_id"], record["student_id"]))
+        await log.stop()
+
+    asyncio.run(run())
+    assert stored([record]) == 1
+
+
+def test_only_one_worker_accepts_a_submission(tmp_path):
+    claims = submission_log.SubmissionClaims(str(tmp_path / "claims.db"))
+    first = make_record()
+    second = make_record(first["assignment_id"], first["student_id"])
+
+    async def run():
+        logs = [
+            submission_log.SubmissionLog(str(tmp_path / f"worker-{index}"), claims=claims)
+            for index in range(2)
+        ]
+        for log in logs:
+            await log.start()
+        await logs[0].append(first)
+        with pytest.raises(submission_log.DuplicateSubmission):
+            await logs[1].append(second)
+        # Once flushed the claim is released and the row rejects it instead
+        await asyncio.get_running_loop().run_in_executor(None, logs[0].flush)
+        with pytest.raises(submission_log.DuplicateSubmission):
+            await logs[1].append(second)
+        for log in logs:
+            await log.stop()
+
+    asyncio.run(run())
+    assert stored([first, second]) == 1
+    assert claims.claim((first["assignment_id"], first["student_id"]), "anyone")
+
+
+def test_open_releases_claims_of_a_dead_process(directory, tmp_path):
+    claims = submission_log.SubmissionClaims(str(tmp_path / "claims.db"))
+    log = submission_log.SubmissionLog(directory, claims=claims)
+    key = ("assignment", "student")
+    assert claims.claim(key, log._owner())
+    assert claims.claim(("other", "student"), "another worker")
+
+    log.open()
+    log.close()
+    assert claims.claim(key, "anyone")
+    assert not claims.claim(("other", "student"), "anyone")
+
+
+def test_conflicting_record_is_set_aside_not_dropped(tmp_path):
+    first = make_record()
+    second = make_record(first["assignment_id"], first["student_id"])
+    logs = []
+    # Logs written before claims existed can still hold both copies
+    for name, record in (("worker-0", first), ("worker-1", second)):
+        directory = str(tmp_path / name)
+        write_segment(directory, 0, encode([record]))
+        log = submission_log.SubmissionLog(directory)
+        log.open()
+        log.close()
+        logs.append(log)
+
+    assert stored([first, second]) == 1
+    assert [log.dead_lettered for log in logs] == [0, 1]
+    assert json.loads(dead_letters(str(tmp_path / "worker-1"))[0])["id"] == second["id"]
+
+
+def test_bad_record_is_dead_lettered_without_blocking_others(directory):
+    records = [make_record() for _ in range(5)]
+    bad = dict(records[2], submitted_at="not a date")
+    records[2] = bad
+    write_segment(directory, 0, encode(records) + b"{not json\n")
+
+    log = submission_log.SubmissionLog(directory)
+    log.open()
+    log.close()
+    assert stored(records) == 4
+    assert log.dead_lettered == 2
+    unreadable, rejected = dead_letters(directory)
+    assert unreadable == b"{not json"
+    assert json.loads(rejected)["id"] == bad["id"]
+    assert log._load_checkpoint()[1] > 0
+
+
+def test_operational_error_keeps_the_batch_for_a_retry(directory, monkeypatch):
+    record = make_record()
+    write_segment(directory, 0, encode([record]))
+    log = submission_log.SubmissionLog(directory)
+
+    def locked(records, rejected):
+        raise submission_log.exc.OperationalError("INSERT", {}, Exception("database is locked"))
+
+    monkeypatch.setattr(log, "_insert", locked)
+    with pytest.raises(submission_log.exc.OperationalError):
+        log.open()
+    assert log.dead_lettered == 0
+    assert log._load_checkpoint() == (0, 0)
+
+    monkeypatch.undo()
+    log.flush()
+    log.close()
+    assert stored([record]) == 1
+
+
+def test_retry_delay_backs_off_up_to_the_cap(directory):
+    log = submission_log.SubmissionLog(directory, flush_interval=0.05)
+    delays = []
+    for failures in (1, 2, 3, 20):
+        log.consecutive_failures = failures
+        delays.append(log.retry_delay())
+    assert delays == [0.1, 0.2, 0.4, submission_log.MAX_FLUSH_BACKOFF]